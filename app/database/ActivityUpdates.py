@@ -0,0 +1,171 @@
+"""MongoDB updates that edit a single activity of a stored trip in place.
+
+Each builder returns the keyword arguments of ``update_one``, which are also
+those of ``pymongo.UpdateOne``, so an edit can be run on its own
+(``collection.update_one(**edit)``) or queued in a ``bulk_write``
+(``UpdateOne(**edit)``). Activities are found by id in either slot of any
+day through ``$[]`` and the filtered positional operator ``$[a]``, so the
+itinerary never has to be read back or rewritten to change one of them.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+from bson import ObjectId
+
+from app.schemas.trips_schema import Activity
+
+ACTIVITY_SLOTS = ("morning_activities", "afternoon_activities")
+
+ActivityId = Union[int, str]
+TripUpdate = Dict[str, Any]
+
+
+def activity_id(value: ActivityId) -> ActivityId:
+    """Activity ids are stored as ints; path parameters arrive as str."""
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)
+    return value
+
+
+def _activity_document(activity: Union[Activity, dict]) -> dict:
+    if isinstance(activity, dict):
+        activity = Activity(**activity)
+    return activity.model_dump()
+
+
+def _check_slot(slot: str):
+    if slot not in ACTIVITY_SLOTS:
+        raise ValueError(f"Unknown activity slot: {slot}")
+
+
+def replace_activity(trip_id: str, id: ActivityId, activity: Union[Activity, dict]) -> TripUpdate:
+    """Replace the activity with this id, wherever it is in the trip."""
+    document = _activity_document(activity)
+    return {
+        "filter": {"_id": ObjectId(trip_id)},
+        "update": {"$set": {f"days.$[].{slot}.$[a]": document for slot in ACTIVITY_SLOTS}},
+        "array_filters": [{"a.id": activity_id(id)}],
+    }
+
+
+def delete_activity(trip_id: str, id: ActivityId) -> TripUpdate:
+    """Remove the activity with this id from every day."""
+    return {
+        "filter": {"_id": ObjectId(trip_id)},
+        "update": {"$pull": {f"days.$[].{slot}": {"id": activity_id(id)} for slot in ACTIVITY_SLOTS}},
+    }
+
+
+def delete_place(trip_id: str, place_id: str) -> TripUpdate:
+    """Remove every activity taking place at this place."""
+    return {
+        "filter": {"_id": ObjectId(trip_id)},
+        "update": {"$pull": {f"days.$[].{slot}": {"place.id": place_id} for slot in ACTIVITY_SLOTS}},
+    }
+
+
+def insert_activity(
+    trip_id: str,
+    day_index: int,
+    slot: str,
+    activity: Union[Activity, dict],
+    position: Optional[int] = None,
+) -> TripUpdate:
+    """Insert an activity into one slot of a day, at ``position`` or last."""
+    _check_slot(slot)
+    push: Dict[str, Any] = {"$each": [_activity_document(activity)]}
+    if position is not None:
+        push["$position"] = position
+    return {
+        "filter": {"_id": ObjectId(trip_id)},
+        "update": {"$push": {f"days.{day_index}.{slot}": push}},
+    }
+
+
+def reorder_activities(
+    trip_id: str, day_index: int, slot: str, ids: List[ActivityId]
+) -> TripUpdate:
+    """Put the activities of one slot of a day in the order of ``ids``.
+
+    Runs as an update pipeline so the reordering happens on the server in
+    one atomic write. ``ids`` must list every activity of the slot; the
+    filter makes the update a no-op when it does not.
+    """
+    _check_slot(slot)
+    ids = [activity_id(id) for id in ids]
+    day = {"$arrayElemAt": ["$days", day_index]}
+    current = {"$let": {"vars": {"day": day}, "in": f"$$day.{slot}"}}
+    reordered = {
+        "$map": {
+            "input": {"$literal": ids},
+            "as": "id",
+            "in": {
+                "$arrayElemAt": [
+                    {"$filter": {"input": current, "cond": {"$eq": ["$$this.id", "$$id"]}}},
+                    0,
+                ]
+            },
+        }
+    }
+    return {
+        "filter": {
+            "_id": ObjectId(trip_id),
+            f"days.{day_index}.{slot}": {"$size": len(ids)},
+            f"days.{day_index}.{slot}.id": {"$all": ids},
+        },
+        "update": [
+            {
+                "$set": {
+                    "days": {
+                        "$map": {
+                            "input": {"$range": [0, {"$size": "$days"}]},
+                            "as": "i",
+                            "in": {
+                                "$cond": [
+                                    {"$eq": ["$$i", day_index]},
+                                    {"$mergeObjects": [day, {slot: reordered}]},
+                                    {"$arrayElemAt": ["$days", "$$i"]},
+                                ]
+                            },
+                        }
+                    }
+                }
+            }
+        ],
+    }
+
+
+def find_activity(itinerary: dict, id: ActivityId) -> Optional[dict]:
+    id = activity_id(id)
+    for day in itinerary.get("days") or []:
+        for slot in ACTIVITY_SLOTS:
+            for activity in day.get(slot) or []:
+                if activity.get("id") == id:
+                    return activity
+    return None
+
+
+def _map_activities(itinerary: dict, id: ActivityId, replacement: Optional[dict]) -> dict:
+    # rebuilds only the containers on the way, ``itinerary`` may be shared
+    id = activity_id(id)
+    days = []
+    for day in itinerary.get("days") or []:
+        day = dict(day)
+        for slot in ACTIVITY_SLOTS:
+            if slot in day:
+                day[slot] = [
+                    a if a.get("id") != id else replacement
+                    for a in day[slot]
+                    if a.get("id") != id or replacement is not None
+                ]
+        days.append(day)
+    return {**itinerary, "days": days}
+
+
+def without_activity(itinerary: dict, id: ActivityId) -> dict:
+    """What ``delete_activity`` turns this (JSON-mode) itinerary into."""
+    return _map_activities(itinerary, id, None)
+
+
+def with_activity(itinerary: dict, id: ActivityId, activity: dict) -> dict:
+    """What ``replace_activity`` turns this (JSON-mode) itinerary into."""
+    return _map_activities(itinerary, id, activity)
@@ -1,22 +1,92 @@
 import redis.asyncio as redis
+from typing import Dict, Iterable, List, Optional, Union
 import os
 
 REDIS_HOST = os.getenv("REDIS_TRIP_HOST", "trip-cache")
-REDIS_PORT = int(os.getenv("REDIS_TRIP_PORT", 6379)) 
+REDIS_PORT = int(os.getenv("REDIS_TRIP_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_TRIP_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_TRIP_SOCKET_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_TRIP_HEALTH_CHECK_INTERVAL", 30))
+
+# pools shared by every RedisClient in the process, keyed by decode_responses
+_pools: Dict[bool, redis.BlockingConnectionPool] = {}
+
+
+def _connection_pool(decode_responses: bool = True) -> redis.BlockingConnectionPool:
+    if decode_responses not in _pools:
+        _pools[decode_responses] = redis.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            decode_responses=decode_responses,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+    return _pools[decode_responses]
+
+
+async def close_redis_pool():
+    """Disconnect the shared connection pools (called on application shutdown)."""
+    for pool in _pools.values():
+        await pool.disconnect()
+    _pools.clear()
+
 
 class RedisClient:
-    def __init__(self):
-        self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    def __init__(self, decode_responses: bool = True):
+        """Values come back as str, or as raw bytes with ``decode_responses=False``."""
+        self.redis = redis.Redis(connection_pool=_connection_pool(decode_responses))
 
-    async def set(self, key: str, value: str, expire: int = 604800):
-        """Set a key-value pair in Redis with an expiration time."""
-        await self.redis.set(key, value, ex=expire)
+    async def set(self, key: str, value: Union[str, bytes], expire: int = 604800, nx: bool = False) -> bool:
+        """Set a key-value pair in Redis with an expiration time; with ``nx``
+        only if the key does not exist. Returns whether it was set."""
+        return bool(await self.redis.set(key, value, ex=expire, nx=nx))
 
     async def get(self, key: str):
         """Retrieve a value from Redis by key."""
         return await self.redis.get(key)
 
+    async def getex(self, key: str, expire: int = 604800):
+        """Retrieve a value and refresh its expiration time in one round trip."""
+        return await self.redis.getex(key, ex=expire)
+
     async def delete(self, key: str):
         """Delete a key from Redis."""
         await self.redis.delete(key)
 
+    async def mget(self, keys: Iterable[str]) -> List[Optional[Union[str, bytes]]]:
+        """Retrieve several values in one round trip, None for missing keys."""
+        keys = list(keys)
+        if not keys:
+            return []
+        return await self.redis.mget(keys)
+
+    async def mset(self, mapping: Dict[str, Union[str, bytes]], expire: int = 604800, nx: bool = False):
+        """Set several key-value pairs with an expiration time in one round
+        trip; with ``nx`` only the keys that do not exist."""
+        if not mapping:
+            return
+        # MSET has no expiry option, so pipeline one SET EX per key instead
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=expire, nx=nx)
+            await pipe.execute()
+
+    async def delete_many(self, keys: Iterable[str]):
+        """Delete several keys in one round trip."""
+        keys = list(keys)
+        if keys:
+            await self.redis.delete(*keys)
+
+    def pipeline(self, transaction: bool = True):
+        """Queue several commands and send them in one round trip.
+
+        With ``transaction=True`` the commands run atomically (MULTI/EXEC):
+
+            async with redis_client.pipeline() as pipe:
+                pipe.set(key, value, ex=3600)
+                pipe.incr(counter)
+                await pipe.execute()
+        """
+        return self.redis.pipeline(transaction=transaction)
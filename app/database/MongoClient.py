@@ -1,8 +1,10 @@
-from app.schemas.trips_schema import Trip, RoadItinerary
-from pymongo import MongoClient
+from app.database import ActivityUpdates
+from app.schemas.trips_schema import Trip, RoadItinerary, TripSummary
+from app.services.trip_diff import partial_update
+from pymongo import ASCENDING, AsyncMongoClient, IndexModel, MongoClient, UpdateOne
 from bson import ObjectId
-from typing import List, Union
-from pymongo.errors import PyMongoError
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from pymongo.errors import BulkWriteError, PyMongoError
 from dotenv import load_dotenv
 from bson import ObjectId
 import os
@@ -16,6 +18,92 @@ mongoPort = os.getenv("MONGO_PORT", 27017)
 mongoUser = os.getenv("MONGO_USER")
 mongoPwd = os.getenv("MONGOPASSWORD")
 mongoDatabase = os.getenv("MONGO_DATABASE", "voyage-db")
+# connection pool settings for the async client
+mongoMaxPoolSize = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+mongoMinPoolSize = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+mongoMaxIdleTimeMS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+mongoWaitQueueTimeoutMS = os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+mongoServerSelectionTimeoutMS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+# documents fetched per round trip when paging or streaming the whole collection
+TRIP_PAGE_SIZE = int(os.getenv("TRIP_PAGE_SIZE", 100))
+MAX_TRIP_PAGE_SIZE = int(os.getenv("MAX_TRIP_PAGE_SIZE", 500))
+
+
+# secondary indexes created at startup, for filtering and sorting trip lists
+TRIP_INDEXES = [
+    IndexModel([("trip_type", ASCENDING)], name="trip_type"),
+    IndexModel([("city", ASCENDING)], name="city"),
+    IndexModel([("country", ASCENDING)], name="country"),
+    IndexModel([("start_date", ASCENDING)], name="start_date"),
+]
+
+# fields of TripSummary; the days themselves never leave the server
+SUMMARY_PROJECTION = {
+    "name": 1,
+    "start_date": 1,
+    "end_date": 1,
+    "trip_type": 1,
+    "country": 1,
+    "city": 1,
+    "is_group": 1,
+    "day_count": {"$size": {"$ifNull": ["$days", []]}},
+}
+
+
+def _mongo_url() -> str:
+    return f"mongodb://{mongoUser}:{mongoPwd}@{mongoHost}:{mongoPort}/voyage-db?authSource=admin"
+
+
+def _pool_options() -> dict:
+    options = {
+        "maxPoolSize": mongoMaxPoolSize,
+        "minPoolSize": mongoMinPoolSize,
+        "serverSelectionTimeoutMS": mongoServerSelectionTimeoutMS,
+    }
+    if mongoMaxIdleTimeMS:
+        options["maxIdleTimeMS"] = int(mongoMaxIdleTimeMS)
+    if mongoWaitQueueTimeoutMS:
+        options["waitQueueTimeoutMS"] = int(mongoWaitQueueTimeoutMS)
+    return options
+
+
+def _prepare_documents(
+    trips: List[Union[Trip, RoadItinerary]], ids: List[str]
+) -> List[dict]:
+    documents = []
+    for i, t in enumerate(trips):
+        if ids:
+            documents.append({"_id": ObjectId(ids[i]), **t.model_dump()})
+        else:
+            documents.append(t.model_dump())
+    return documents
+
+
+def _cast_trip(result: dict) -> Union[Trip, RoadItinerary]:
+    """Cast a raw trip document into the model matching its trip_type."""
+    result["id"] = str(result.pop("_id"))
+    if result.get("trip_type", "") == "road":
+        return RoadItinerary(**result)
+    return Trip(**result)
+
+
+def _page_filter(after: Optional[str]) -> dict:
+    """Keyset filter for the page following the trip id ``after``."""
+    return {"_id": {"$gt": ObjectId(after)}} if after else {}
+
+
+def _page_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_TRIP_PAGE_SIZE))
+
+
+def _parse_document(doc: dict) -> dict:
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+def _cast_summary(result: dict) -> TripSummary:
+    result["id"] = str(result.pop("_id"))
+    return TripSummary(**result)
 
 
 class DBClient:
@@ -35,8 +123,7 @@ class DBClient:
             return
 
         try:
-            url = f"mongodb://{mongoUser}:{mongoPwd}@{mongoHost}:{mongoPort}/voyage-db?authSource=admin"
-            self.client = MongoClient(url)
+            self.client = MongoClient(_mongo_url())
             self.db = self.client[str(mongoDatabase)]
             self.collection = self.db["trips"]
             self._initialized = True
@@ -96,10 +183,19 @@ class DBClient:
             print(f"Error fetching trip by id: {e}")
             return None
 
-    def put_trip_by_doc_id(self, id: str, trip: Union[Trip, RoadItinerary]):
+    def put_trip_by_doc_id(
+        self, id: str, trip: Union[Trip, RoadItinerary], previous: Optional[dict] = None
+    ):
+        """See AsyncDBClient.put_trip_by_doc_id."""
         try:
+            document = trip.model_dump()
+            update = None
+            if previous is not None:
+                update = partial_update(previous, trip.model_dump(mode="json"), document)
+                if update == {}:
+                    return False
             update_result = self.collection.update_one(
-                {"_id": ObjectId(id)}, {"$set": trip.model_dump()}
+                {"_id": ObjectId(id)}, update or {"$set": document}
             )
             return update_result.modified_count > 0
         except Exception as e:
@@ -114,15 +210,274 @@ class DBClient:
 
     def delete_place_from_trip(self, trip_id: str, place_id: str):
         try:
-            result = self.collection.update_one(
-                {"_id": ObjectId(trip_id)},
-                {"$pull": {"days.$[].places": {"placeId": place_id}}},
-            )
+            result = self.collection.update_one(**ActivityUpdates.delete_place(trip_id, place_id))
             return result.modified_count > 0
         except Exception as e:
             return f"Error deleting place from trip: {e}"
 
+    def update_activities(self, edit: ActivityUpdates.TripUpdate):
+        """Run one of the ActivityUpdates edits; True if the trip changed."""
+        try:
+            result = self.collection.update_one(**edit)
+            return result.modified_count > 0
+        except Exception as e:
+            return f"Error updating activities: {e}"
+
+    def get_trips_page(
+        self, after: Optional[str] = None, limit: int = TRIP_PAGE_SIZE
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of trips in _id order, after the trip id ``after``.
+
+        Returns the documents and the cursor for the next page, None on the
+        last one. Seeks on the _id index, so every page costs the same.
+        """
+        limit = _page_limit(limit)
+        cursor = self.collection.find(_page_filter(after)).sort("_id", ASCENDING).limit(limit)
+        documents = [_parse_document(doc) for doc in cursor]
+        next_after = documents[-1]["_id"] if len(documents) == limit else None
+        return documents, next_after
+
+    def iter_trips(self, batch_size: int = TRIP_PAGE_SIZE) -> Iterator[dict]:
+        """Yield every trip while the cursor reads it, ``batch_size`` at a time."""
+        for doc in self.collection.find({}, batch_size=batch_size):
+            yield _parse_document(doc)
+
     def get_all_trips(self):
-        result = list(self.collection.find({}))
-        parsed_documents = [{**doc, "_id": str(doc["_id"])} for doc in result]
-        return parsed_documents
+        """Every trip as a list; prefer iter_trips or get_trips_page, this one
+        holds the whole collection in memory."""
+        return list(self.iter_trips())
+
+
+class AsyncDBClient:
+    """Non-blocking counterpart of DBClient, backed by pymongo's asyncio driver.
+
+    The routers await these methods so a slow query only suspends the
+    handler that issued it instead of stalling the whole event loop.
+    Pool sizing is configured through the MONGO_*_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS and MONGO_WAIT_QUEUE_TIMEOUT_MS variables.
+    """
+
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._lock:
+                if not cls._instance:
+                    cls._instance = super(AsyncDBClient, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # Prevent reinitialization on multiple instantiations
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        try:
+            self.client = AsyncMongoClient(_mongo_url(), **_pool_options())
+            self.db = self.client[str(mongoDatabase)]
+            self.collection = self.db["trips"]
+            self._initialized = True
+        except PyMongoError as e:
+            raise ConnectionError(f"Failed to connect to MongoDB: {e}")
+
+    async def close(self):
+        """Close the connection pool and drop the singleton."""
+        await self.client.close()
+        self._initialized = False
+        AsyncDBClient._instance = None
+
+    async def post_trip(
+        self, trips: List[Union[Trip, RoadItinerary]], ids: List[str] = []
+    ) -> Union[List[str], str]:
+        assert (
+            len(trips) == len(ids) or not ids
+        ), "Length of trips and ids must match or ids must be empty"
+        assert len(trips) != 0, "Trips list must not be empty"
+        try:
+            documents = _prepare_documents(trips, ids)
+        except Exception as e:
+            return f"Error preparing document for insertion: {e}"
+
+        try:
+            r = await self.collection.insert_many(documents)
+            return [str(_id) for _id in r.inserted_ids]
+        except PyMongoError as e:
+            return f"Error inserting into the database: {e}"
+
+    async def upsert_trip(self, id: str, trip: Union[Trip, RoadItinerary]) -> Union[bool, str]:
+        """Insert or overwrite a trip in one round trip; True if it was created."""
+        try:
+            result = await self.collection.update_one(
+                {"_id": ObjectId(id)}, {"$set": trip.model_dump()}, upsert=True
+            )
+            return result.upserted_id is not None
+        except Exception as e:
+            return f"Error saving trip: {e}"
+
+    async def upsert_trips(
+        self, trips: Dict[str, Union[Trip, RoadItinerary]]
+    ) -> Dict[str, Union[bool, str]]:
+        """upsert_trip for many trips with one unordered bulk_write.
+
+        Maps each trip id to True (created), False (overwritten) or the
+        error that kept it from being saved.
+        """
+        ids = list(trips)
+        results: Dict[str, Union[bool, str]] = {}
+        operations = []
+        for id in ids:
+            if not ObjectId.is_valid(id):
+                results[id] = f"Invalid trip id: {id}"
+                continue
+            operations.append(
+                UpdateOne({"_id": ObjectId(id)}, {"$set": trips[id].model_dump()}, upsert=True)
+            )
+        written = [id for id in ids if id not in results]
+        if not operations:
+            return results
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            created = result.upserted_ids
+        except BulkWriteError as e:
+            created = {op["index"]: op["_id"] for op in e.details.get("upserted", [])}
+            for error in e.details.get("writeErrors", []):
+                results[written[error["index"]]] = f"Error saving trip: {error.get('errmsg')}"
+        except PyMongoError as e:
+            return {id: results.get(id, f"Error saving trips: {e}") for id in ids}
+        for index, id in enumerate(written):
+            results.setdefault(id, index in created)
+        return {id: results[id] for id in ids}
+
+    async def get_trip_by_id(self, id: str) -> Union[Trip, RoadItinerary, None]:
+        try:
+            result = await self.collection.find_one({"_id": ObjectId(id)})
+            if result is None:
+                return None
+            return _cast_trip(result)
+        except Exception as e:
+            print(f"Error fetching trip by id: {e}")
+            return None
+
+    async def get_trips_by_ids(
+        self, ids: List[str]
+    ) -> Dict[str, Union[Trip, RoadItinerary]]:
+        """Fetch several trips with a single $in query, keyed by trip id.
+
+        Ids that are not valid ObjectIds or have no document are left out.
+        """
+        object_ids = [ObjectId(id) for id in ids if ObjectId.is_valid(id)]
+        if not object_ids:
+            return {}
+        trips = {}
+        try:
+            async for doc in self.collection.find({"_id": {"$in": object_ids}}):
+                id = str(doc["_id"])
+                trips[id] = _cast_trip(doc)
+        except Exception as e:
+            print(f"Error fetching trips by ids: {e}")
+        return trips
+
+    async def get_trip_summary(self, id: str) -> Optional[TripSummary]:
+        """Fetch only the fields of TripSummary, projected server side."""
+        try:
+            result = await self.collection.find_one({"_id": ObjectId(id)}, SUMMARY_PROJECTION)
+            if result is None:
+                return None
+            return _cast_summary(result)
+        except Exception as e:
+            print(f"Error fetching trip summary by id: {e}")
+            return None
+
+    async def get_trip_summaries(self, ids: List[str]) -> Dict[str, TripSummary]:
+        """Summaries of several trips with a single $in query, keyed by trip id."""
+        object_ids = [ObjectId(id) for id in ids if ObjectId.is_valid(id)]
+        if not object_ids:
+            return {}
+        summaries = {}
+        try:
+            async for doc in self.collection.find(
+                {"_id": {"$in": object_ids}}, SUMMARY_PROJECTION
+            ):
+                summary = _cast_summary(doc)
+                summaries[summary.id] = summary
+        except Exception as e:
+            print(f"Error fetching trip summaries by ids: {e}")
+        return summaries
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create TRIP_INDEXES; a no-op for indexes that already exist."""
+        try:
+            return await self.collection.create_indexes(TRIP_INDEXES)
+        except PyMongoError as e:
+            print(f"Error creating trip indexes: {e}")
+            return []
+
+    async def put_trip_by_doc_id(
+        self, id: str, trip: Union[Trip, RoadItinerary], previous: Optional[dict] = None
+    ):
+        """Store a new version of a trip.
+
+        With ``previous`` (the JSON-mode dump of the stored version) only the
+        paths that changed are written; otherwise, or when that update would
+        be larger than the document, every field is rewritten.
+        """
+        try:
+            document = trip.model_dump()
+            update = None
+            if previous is not None:
+                update = partial_update(previous, trip.model_dump(mode="json"), document)
+                if update == {}:
+                    return False
+            update_result = await self.collection.update_one(
+                {"_id": ObjectId(id)}, update or {"$set": document}
+            )
+            return update_result.modified_count > 0
+        except Exception as e:
+            return f"Error updating trip: {e}"
+
+    async def delete_trip(self, id: str):
+        try:
+            result = await self.collection.delete_one({"_id": ObjectId(id)})
+            return result.deleted_count == 1
+        except Exception as e:
+            return f"Error deleting trip: {e}"
+
+    async def bulk_write(self, operations: list, ordered: bool = False):
+        """Run several writes in one round trip.
+
+        Unlike the other methods, errors are raised (BulkWriteError carries
+        which operations failed) so callers can retry them.
+        """
+        return await self.collection.bulk_write(operations, ordered=ordered)
+
+    async def update_activities(self, edit: ActivityUpdates.TripUpdate):
+        """Run one of the ActivityUpdates edits; True if the trip changed."""
+        try:
+            result = await self.collection.update_one(**edit)
+            return result.modified_count > 0
+        except Exception as e:
+            return f"Error updating activities: {e}"
+
+    async def get_trips_page(
+        self, after: Optional[str] = None, limit: int = TRIP_PAGE_SIZE
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of trips in _id order, after the trip id ``after``.
+
+        Returns the documents and the cursor for the next page, None on the
+        last one. Seeks on the _id index, so every page costs the same.
+        """
+        limit = _page_limit(limit)
+        cursor = self.collection.find(_page_filter(after)).sort("_id", ASCENDING).limit(limit)
+        documents = [_parse_document(doc) async for doc in cursor]
+        next_after = documents[-1]["_id"] if len(documents) == limit else None
+        return documents, next_after
+
+    async def iter_trips(self, batch_size: int = TRIP_PAGE_SIZE) -> AsyncIterator[dict]:
+        """Yield every trip while the cursor reads it, ``batch_size`` at a time."""
+        async for doc in self.collection.find({}, batch_size=batch_size):
+            yield _parse_document(doc)
+
+    async def get_all_trips(self):
+        """Every trip as a list; prefer iter_trips or get_trips_page, this one
+        holds the whole collection in memory."""
+        return [doc async for doc in self.iter_trips()]
@@ -0,0 +1,109 @@
+"""Versioned binary encoding for itineraries stored in Redis.
+
+An encoded value is an 8 byte header followed by the payload::
+
+    magic (2) | version (1) | format (1) | flags (1) | payload size (3)
+
+The magic bytes can never start a JSON document, so values written before
+the header existed (plain ``json.dumps`` output) are still decoded as JSON.
+The payload size is the uncompressed length, which callers use to account
+for memory without decompressing.
+"""
+from typing import Any, Callable, Dict, Tuple
+import json
+import os
+import zlib
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # optional dependency, TRIP_CACHE_FORMAT=msgpack needs it
+    msgpack = None
+
+MAGIC = b"\x00\xa7"
+VERSION = 1
+HEADER_SIZE = 8
+MAX_PAYLOAD_SIZE = 2 ** 24 - 1
+
+FORMAT_JSON = 1
+FORMAT_MSGPACK = 2
+FLAG_ZLIB = 1
+
+Serializer = Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]
+
+SERIALIZERS: Dict[int, Serializer] = {
+    FORMAT_JSON: (orjson.dumps, orjson.loads),
+}
+if msgpack is not None:
+    SERIALIZERS[FORMAT_MSGPACK] = (msgpack.packb, msgpack.unpackb)
+
+FORMAT_NAMES = {"json": FORMAT_JSON, "msgpack": FORMAT_MSGPACK}
+
+
+class TripCodec:
+    """Encode itinerary dicts with a pluggable serializer and optional zlib.
+
+    Payloads larger than ``compress_threshold`` bytes are compressed;
+    ``compress_threshold=None`` disables compression.
+    """
+
+    def __init__(self, format: str = "json", compress_threshold: int = 4096, compress_level: int = 1):
+        if format not in FORMAT_NAMES:
+            raise ValueError(f"Unknown cache format: {format}")
+        self.format = FORMAT_NAMES[format]
+        if self.format not in SERIALIZERS:
+            raise ValueError(f"Cache format {format} needs the {format} package installed")
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def encode(self, value: Any) -> bytes:
+        dumps, _ = SERIALIZERS[self.format]
+        return self._frame(dumps(value))
+
+    def encode_json(self, payload: bytes) -> bytes:
+        """Encode a value that is already serialized as JSON, without re-serializing
+        it when the codec's format is JSON."""
+        if self.format == FORMAT_JSON:
+            return self._frame(payload)
+        return self.encode(orjson.loads(payload))
+
+    def _frame(self, payload: bytes) -> bytes:
+        size = len(payload)
+        if size > MAX_PAYLOAD_SIZE:
+            size = MAX_PAYLOAD_SIZE  # only used for accounting, saturate
+        flags = 0
+        if self.compress_threshold is not None and len(payload) > self.compress_threshold:
+            payload = zlib.compress(payload, self.compress_level)
+            flags |= FLAG_ZLIB
+        header = MAGIC + bytes((VERSION, self.format, flags)) + size.to_bytes(3, "big")
+        return header + payload
+
+    @staticmethod
+    def decode(data: bytes) -> Any:
+        if not data.startswith(MAGIC):
+            return json.loads(data)  # legacy plain-JSON entry
+        version, format, flags = data[2], data[3], data[4]
+        if version != VERSION or format not in SERIALIZERS:
+            raise ValueError(f"Unsupported cache entry (version {version}, format {format})")
+        payload = data[HEADER_SIZE:]
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        _, loads = SERIALIZERS[format]
+        return loads(payload)
+
+    @staticmethod
+    def decoded_size(data: bytes) -> int:
+        """Uncompressed payload size of an encoded value, read from its header."""
+        if not data.startswith(MAGIC):
+            return len(data)
+        return int.from_bytes(data[5:HEADER_SIZE], "big")
+
+
+def codec_from_env() -> TripCodec:
+    threshold = int(os.getenv("TRIP_CACHE_COMPRESS_THRESHOLD", 4096))
+    return TripCodec(
+        format=os.getenv("TRIP_CACHE_FORMAT", "json"),
+        compress_threshold=threshold if threshold >= 0 else None,
+        compress_level=int(os.getenv("TRIP_CACHE_COMPRESS_LEVEL", 1)),
+    )
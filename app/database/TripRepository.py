@@ -0,0 +1,313 @@
+from app.database.ActivityUpdates import TripUpdate
+from app.database.CacheClient import RedisClient
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripCodec import TripCodec, codec_from_env
+from app.database.WriteBehind import WriteBehindQueue
+from app.schemas.trips_schema import Trip, RoadItinerary
+from app.services.single_flight import SingleFlight
+from app.services.ttl_cache import TTLCache
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional, Union
+from uuid import uuid4
+from weakref import WeakValueDictionary
+import asyncio
+import os
+
+TRIP_CACHE_TTL = int(os.getenv("TRIP_CACHE_TTL", 3600))
+
+# in-process (L1) cache in front of Redis
+TRIP_L1_TTL = float(os.getenv("TRIP_L1_TTL", 30))
+TRIP_L1_MAX_ENTRIES = int(os.getenv("TRIP_L1_MAX_ENTRIES", 1000))
+TRIP_L1_MAX_BYTES = int(os.getenv("TRIP_L1_MAX_BYTES", 64 * 1024 * 1024))
+
+INVALIDATION_CHANNEL = "trip-invalidations"
+
+# lock cache misses across replicas too, not only within the process
+TRIP_LOAD_LOCK = os.getenv("TRIP_LOAD_LOCK", "1") == "1"
+
+
+def parse_itinerary(data: dict) -> Union[Trip, RoadItinerary]:
+    """Validate an itinerary dict into the model matching its trip_type."""
+    if data.get("trip_type") == "road":
+        return RoadItinerary(**data)
+    return Trip(**data)
+
+
+class TripRepository:
+    """Single access point for itineraries, with Redis in front of MongoDB.
+
+    Reads are read-through: a Redis miss falls back to MongoDB and the
+    result is written back to Redis, so a trip read twice costs Mongo once.
+    The write-back only fills an empty key (SET NX): a read that overlapped
+    an update must not replace the newer version the update cached.
+    Concurrent misses of one trip are coalesced into a single MongoDB read
+    (``single_flight``), across replicas while TRIP_LOAD_LOCK is set.
+    Writes are write-through: MongoDB is updated first and Redis only after
+    it succeeded, so a cached itinerary is never older than the stored one.
+    Unsaved trips (drafts) only live in Redis until they are saved.
+    Cached values are encoded with a TripCodec (see TRIP_CACHE_FORMAT).
+
+    Decoded itineraries are also kept in a size-bounded in-process LRU
+    (``local``). Every write drops the local entry and publishes the trip id
+    on INVALIDATION_CHANNEL so the other replicas drop theirs. The local
+    cache is only used while ``listen_for_invalidations`` is subscribed.
+    Itineraries returned by ``get``/``get_many`` may be shared between
+    requests and must be treated as read-only.
+
+    ``update_later`` is write-behind instead: the cache is updated at once and
+    MongoDB by ``write_behind``, which the application starts and drains.
+    """
+
+    def __init__(self, cache: Optional[RedisClient] = None, codec: Optional[TripCodec] = None):
+        self.cache = cache or RedisClient(decode_responses=False)
+        self.codec = codec or codec_from_env()
+        self.local = TTLCache(
+            ttl=TRIP_L1_TTL, max_entries=TRIP_L1_MAX_ENTRIES, max_bytes=TRIP_L1_MAX_BYTES
+        )
+        self.local_enabled = False
+        # identifies this replica in invalidation messages so it can skip its own
+        self.replica_id = uuid4().hex
+        # bumped on every invalidation, so a read that raced with a write
+        # does not put the version it loaded into the local cache
+        self._epoch = 0
+        # serializes updates of the same trip; entries go away with their last user
+        self._write_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        self.single_flight = SingleFlight(self.cache)
+        self.write_behind = WriteBehindQueue(
+            lambda operations: self.db.bulk_write(operations), self._write_lock
+        )
+
+    @property
+    def db(self) -> AsyncDBClient:
+        return AsyncDBClient()
+
+    async def get(self, trip_id: str) -> Optional[dict]:
+        """Return the itinerary as a dict, or None if the trip does not exist."""
+        epoch = self._epoch
+        if self.local_enabled:
+            itinerary = self.local.get(trip_id)
+            if itinerary is not None:
+                return itinerary
+
+        cached = await self.cache.getex(trip_id, expire=TRIP_CACHE_TTL)
+        if cached is not None:
+            itinerary = self.codec.decode(cached)
+            self._remember(epoch, trip_id, itinerary, self.codec.decoded_size(cached))
+            return itinerary
+
+        # concurrent misses of the same trip share one MongoDB read
+        return await self.single_flight.do(
+            trip_id,
+            lambda: self._load(epoch, trip_id),
+            (lambda: self._cached(trip_id)) if TRIP_LOAD_LOCK else None,
+        )
+
+    async def _load(self, epoch: int, trip_id: str) -> Optional[dict]:
+        trip = await self.db.get_trip_by_id(trip_id)
+        if trip is None:
+            return None
+        itinerary = trip.model_dump(mode="json")
+        encoded = self.codec.encode(itinerary)
+        if await self.cache.set(trip_id, encoded, expire=TRIP_CACHE_TTL, nx=True):
+            self._remember(epoch, trip_id, itinerary, self.codec.decoded_size(encoded))
+        return itinerary
+
+    async def get_many(self, trip_ids: List[str]) -> Dict[str, dict]:
+        """Read-through for several trips: one MGET, one $in query, one backfill."""
+        epoch = self._epoch
+        itineraries = {}
+        remote_ids = []
+        for trip_id in trip_ids:
+            itinerary = self.local.get(trip_id) if self.local_enabled else None
+            if itinerary is None:
+                remote_ids.append(trip_id)
+            else:
+                itineraries[trip_id] = itinerary
+
+        misses = []
+        for trip_id, cached in zip(remote_ids, await self.cache.mget(remote_ids)):
+            if cached is None:
+                misses.append(trip_id)
+            else:
+                itineraries[trip_id] = self.codec.decode(cached)
+                self._remember(
+                    epoch, trip_id, itineraries[trip_id], self.codec.decoded_size(cached)
+                )
+
+        if misses:
+            found = await self.db.get_trips_by_ids(misses)
+            backfill = {}
+            for trip_id, trip in found.items():
+                itineraries[trip_id] = trip.model_dump(mode="json")
+                backfill[trip_id] = self.codec.encode(itineraries[trip_id])
+                self._remember(
+                    epoch, trip_id, itineraries[trip_id], self.codec.decoded_size(backfill[trip_id])
+                )
+            await self.cache.mset(backfill, expire=TRIP_CACHE_TTL, nx=True)
+        return itineraries
+
+    async def cache_draft(
+        self, trip_id: str, trip: Union[Trip, RoadItinerary], itinerary_json: Optional[bytes] = None
+    ):
+        """Store a freshly generated, not yet saved trip in Redis only.
+
+        ``itinerary_json`` is the trip's JSON encoding when the caller already has it.
+        """
+        encoded = self.codec.encode_json(itinerary_json) if itinerary_json else self._encode(trip)
+        await self._write_cache(trip_id, encoded)
+
+    async def save(self, trip_id: str, trip: Union[Trip, RoadItinerary]) -> bool:
+        """Store a trip in MongoDB, whether or not it was saved before, then
+        refresh its cached copy. Returns whether it was newly created; raises
+        if MongoDB fails."""
+        async with self._write_lock(trip_id):
+            self.write_behind.discard(trip_id)
+            created = await self.db.upsert_trip(trip_id, trip)
+            if isinstance(created, str):
+                raise RuntimeError(created)
+            await self._write_cache(trip_id, self._encode(trip))
+        return created
+
+    async def save_many(
+        self, trips: Dict[str, Union[Trip, RoadItinerary]]
+    ) -> Dict[str, Union[bool, str]]:
+        """``save`` for many trips: one bulk write, one cache round trip.
+
+        Maps each trip id to whether it was created, or to the error that
+        kept it from being saved.
+        """
+        async with AsyncExitStack() as locks:
+            for trip_id in sorted(trips):
+                await locks.enter_async_context(self._write_lock(trip_id))
+                self.write_behind.discard(trip_id)
+            results = await self.db.upsert_trips(trips)
+            saved = {
+                trip_id: self._encode(trips[trip_id])
+                for trip_id, result in results.items()
+                if not isinstance(result, str)
+            }
+            await self._write_cache_many(saved)
+        return results
+
+    async def update(
+        self, trip_id: str, trip: Union[Trip, RoadItinerary], edit: Optional[TripUpdate] = None
+    ) -> bool:
+        """Write a new version of a trip to MongoDB, then to Redis.
+
+        Returns whether a stored document was modified; drafts that were never
+        saved only get their cached copy replaced. Raises if MongoDB fails, in
+        which case the cached copy is left untouched. When the current version
+        is cached, MongoDB only receives the paths that changed; the cache is
+        only trusted as that base while the trip has no pending write-behind,
+        so a version MongoDB did not take must be cached with ``update_later``
+        (never ``cache_draft``).
+
+        ``edit`` is an ActivityUpdates edit that turns the stored version into
+        ``trip``; it is sent to MongoDB instead of a diff.
+        """
+        # the cached version is the base of the diff, so it must not change
+        # between reading it and writing the new one
+        async with self._write_lock(trip_id):
+            if self.write_behind.discard(trip_id):
+                # MongoDB is behind the cache, neither an edit nor a diff
+                # against the cache would bring it up to date
+                result = await self.db.put_trip_by_doc_id(trip_id, trip)
+            elif edit is not None:
+                result = await self.db.update_activities(edit)
+            else:
+                previous = await self._cached(trip_id)
+                result = await self.db.put_trip_by_doc_id(trip_id, trip, previous)
+            if isinstance(result, str):
+                raise RuntimeError(result)
+            await self._write_cache(trip_id, self._encode(trip))
+        return result
+
+    async def update_later(
+        self, trip_id: str, trip: Union[Trip, RoadItinerary], edit: Optional[TripUpdate] = None
+    ):
+        """Cache a new version of a trip now and write it to MongoDB in the
+        background (see WriteBehindQueue); for frequent, small edits."""
+        # an update() in progress would cache its version over this one
+        # while this one is still flushed over it
+        async with self._write_lock(trip_id):
+            await self._write_cache(trip_id, self._encode(trip))
+            self.write_behind.mark(trip_id, trip, edit)
+
+    async def invalidate(self, trip_id: str):
+        """Drop the cached copies so the next read reloads it from MongoDB."""
+        self._forget(trip_id)
+        async with self.cache.pipeline(transaction=False) as pipe:
+            pipe.delete(trip_id)
+            pipe.publish(INVALIDATION_CHANNEL, f"{self.replica_id}:{trip_id}")
+            await pipe.execute()
+
+    async def listen_for_invalidations(self, retry_delay: float = 1.0):
+        """Drop local entries written by other replicas; runs until cancelled.
+
+        While the subscription is down invalidations could be missed, so the
+        local cache is cleared and bypassed until it is re-established.
+        """
+        while True:
+            pubsub = self.cache.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.local_enabled = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    origin, _, trip_id = message["data"].decode().partition(":")
+                    if origin != self.replica_id:
+                        self._forget(trip_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Trip invalidation listener error: {e}")
+            finally:
+                self.local_enabled = False
+                self.local.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(retry_delay)
+
+    async def _cached(self, trip_id: str) -> Optional[dict]:
+        """The cached version of a trip, without falling back to MongoDB."""
+        if self.local_enabled:
+            itinerary = self.local.get(trip_id)
+            if itinerary is not None:
+                return itinerary
+        cached = await self.cache.get(trip_id)
+        return None if cached is None else self.codec.decode(cached)
+
+    def _write_lock(self, trip_id: str) -> asyncio.Lock:
+        lock = self._write_locks.get(trip_id)
+        if lock is None:
+            lock = self._write_locks[trip_id] = asyncio.Lock()
+        return lock
+
+    def _remember(self, epoch: int, trip_id: str, itinerary: dict, size: int):
+        if self.local_enabled and epoch == self._epoch:
+            self.local.set(trip_id, itinerary, size=size)
+
+    def _forget(self, trip_id: str):
+        self._epoch += 1
+        self.local.invalidate(trip_id)
+
+    def _encode(self, trip: Union[Trip, RoadItinerary]) -> bytes:
+        return self.codec.encode_json(trip.model_dump_json().encode())
+
+    async def _write_cache(self, trip_id: str, encoded: bytes):
+        await self._write_cache_many({trip_id: encoded})
+
+    async def _write_cache_many(self, encoded: Dict[str, bytes]):
+        # store the new versions and tell the other replicas in one round trip
+        if not encoded:
+            return
+        for trip_id in encoded:
+            self._forget(trip_id)
+        async with self.cache.pipeline(transaction=False) as pipe:
+            for trip_id, value in encoded.items():
+                pipe.set(trip_id, value, ex=TRIP_CACHE_TTL)
+                pipe.publish(INVALIDATION_CHANNEL, f"{self.replica_id}:{trip_id}")
+            await pipe.execute()
+
+
+trip_repository = TripRepository()
@@ -0,0 +1,145 @@
+"""Write-behind persistence of itinerary edits.
+
+Edits are applied to the cache right away and only marked dirty here; a
+background task writes them to MongoDB in unordered ``bulk_write`` batches
+every WRITE_BEHIND_FLUSH_INTERVAL seconds, or as soon as
+WRITE_BEHIND_BATCH_SIZE trips are dirty.
+
+Edits to the same trip are coalesced: a trip edited once is flushed with
+that edit (e.g. an ActivityUpdates ``$pull``), a trip edited several times
+before a flush is written once, as a ``$set`` of its latest version.
+"""
+from app.database.ActivityUpdates import TripUpdate
+from app.schemas.trips_schema import Trip, RoadItinerary
+from bson import ObjectId
+from contextlib import AsyncExitStack
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import os
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 1.0))
+
+TripModel = Union[Trip, RoadItinerary]
+# (edit to send, or None for a $set of the trip; latest version of the trip)
+PendingWrite = Tuple[Optional[TripUpdate], TripModel]
+
+
+class WriteBehindQueue:
+    """Dirty trips waiting to be written to MongoDB.
+
+    ``write`` runs a list of UpdateOne (AsyncDBClient.bulk_write); ``lock``
+    returns the per-trip lock that direct updates hold, so a flush never
+    overtakes or is overtaken by a write-through of the same trip.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[UpdateOne]], Awaitable],
+        lock: Optional[Callable[[str], asyncio.Lock]] = None,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+    ):
+        self.write = write
+        self.lock = lock
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, PendingWrite] = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, trip_id: str) -> bool:
+        return trip_id in self._pending
+
+    def mark(self, trip_id: str, trip: TripModel, edit: Optional[TripUpdate] = None):
+        """Queue the new version of a trip, produced by ``edit`` if given."""
+        if not ObjectId.is_valid(trip_id):
+            return  # cannot have a stored document
+        if trip_id in self._pending:
+            edit = None  # the pending edit and this one are written as one $set
+        self._pending[trip_id] = (edit, trip)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def discard(self, trip_id: str) -> bool:
+        """Forget a pending write, superseded by a full write of the trip."""
+        return self._pending.pop(trip_id, None) is not None
+
+    async def flush(self) -> bool:
+        """Write one batch of dirty trips; False if it has to be retried."""
+        trip_ids = [trip_id for trip_id, _ in zip(self._pending, range(self.batch_size))]
+        if not trip_ids:
+            return True
+        async with AsyncExitStack() as locks:
+            if self.lock is not None:
+                # in a fixed order, like every other holder of several locks
+                for trip_id in sorted(trip_ids):
+                    await locks.enter_async_context(self.lock(trip_id))
+            batch = [
+                (trip_id, *self._pending.pop(trip_id))
+                for trip_id in trip_ids
+                if trip_id in self._pending
+            ]
+            operations = [self._operation(trip_id, edit, trip) for trip_id, edit, trip in batch]
+            try:
+                await self.write(operations)
+                return True
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                print(f"Write-behind flush: {len(failed)} of {len(batch)} writes failed")
+            except Exception as e:
+                # unknown which writes were applied, retry all of them
+                failed = set(range(len(batch)))
+                print(f"Write-behind flush failed: {e}")
+            for index in failed:
+                trip_id, _, trip = batch[index]
+                self._retry(trip_id, trip)
+            return False
+
+    async def run(self):
+        """Flush periodically until ``close``; started by ``start``."""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending and await self.flush():
+                pass
+
+    def start(self):
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def close(self, attempts: int = 3):
+        """Stop the worker and write everything still pending."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        while self._pending and attempts:
+            if not await self.flush():
+                attempts -= 1
+        if self._pending:
+            print(f"Write-behind: {len(self._pending)} trips could not be persisted: {list(self._pending)}")
+
+    def _retry(self, trip_id: str, trip: TripModel):
+        # the failed write may have been an edit the newer version builds on,
+        # so whatever is retried is a full $set
+        if trip_id in self._pending:
+            trip = self._pending[trip_id][1]
+        self._pending[trip_id] = (None, trip)
+
+    @staticmethod
+    def _operation(trip_id: str, edit: Optional[TripUpdate], trip: TripModel) -> UpdateOne:
+        if edit is not None:
+            return UpdateOne(**edit)
+        return UpdateOne({"_id": ObjectId(trip_id)}, {"$set": trip.model_dump()})
@@ -1,11 +1,43 @@
+from contextlib import asynccontextmanager, suppress
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.database.CacheClient import close_redis_pool
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import trip_repository
 from app.routes import base_router
+from app.routes import job_router
 from app.routes import trip_router
 from app.routes import websocket_router
+from app.services.http_client import http_clients
+from app.services.trip_jobs import trip_jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_clients.start()
+    trip_repository.write_behind.start()
+    trip_jobs.start()
+    invalidation_listener = asyncio.create_task(trip_repository.listen_for_invalidations())
+    # in the background, so an unreachable MongoDB does not hold up startup
+    index_creation = asyncio.create_task(AsyncDBClient().ensure_indexes())
+    yield
+    # before the clients the running jobs use are closed
+    await trip_jobs.close()
+    for task in (invalidation_listener, index_creation):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # write pending edits while MongoDB is still connected
+    await trip_repository.write_behind.close()
+    await http_clients.close()
+    await AsyncDBClient().close()
+    await close_redis_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,4 +49,5 @@ app.add_middleware(
 
 app.include_router(base_router.router)
 app.include_router(trip_router.router)
+app.include_router(job_router.router)
 app.include_router(websocket_router.router)
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 
+from app.database.TripRepository import trip_repository
+from app.services.admission import upstream_admission
+from app.services.http_client import http_clients
+
 router = APIRouter(
     prefix="/api",
     tags=["base"],
@@ -10,3 +14,21 @@ router = APIRouter(
 @router.get("/")
 async def read_root():
     return {"Hello": "World!"}
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Counters of the in-process itinerary cache, for tuning its bounds."""
+    return {"enabled": trip_repository.local_enabled, **trip_repository.local.stats()}
+
+
+@router.get("/upstreams")
+async def upstream_stats():
+    """Circuit breaker state and latency percentiles of each upstream service."""
+    return http_clients.stats()
+
+
+@router.get("/admission")
+async def admission_stats():
+    """Slots in use, queue depth and wait times of the upstream admission limiter."""
+    return upstream_admission.stats()
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, status
+from redis.exceptions import RedisError
+import orjson
+
+from app.schemas.response import ResponseBody
+from app.services.trip_jobs import trip_jobs
+
+router = APIRouter(
+    prefix="/api",
+    tags=["jobs"],
+    responses={404: {"description": "Job not found"}},
+)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background trip creation (POST /api/trips?job=true); once
+    it succeeded, ``result`` holds the created trip."""
+    try:
+        job = await trip_jobs.get(job_id)
+    except RedisError as e:
+        print(f"Error reading job {job_id}: {e}")
+        return ResponseBody({"error": str(e)}, "Job status unavailable", status.HTTP_503_SERVICE_UNAVAILABLE)
+    if job is None:
+        return ResponseBody({}, "Job not found", status.HTTP_404_NOT_FOUND)
+    # the stored record is sent as is
+    return ResponseBody(orjson.Fragment(job))
@@ -1,14 +1,27 @@
-from app.database.CacheClient import RedisClient
-from app.schemas.response import ResponseBody
-from fastapi import APIRouter, status,Request
+from app.database import ActivityUpdates
+from app.database.TripRepository import parse_itinerary, trip_repository
+from app.schemas.response import FastJSONResponse, ResponseBody
+from fastapi import APIRouter, Query, status,Request
+from fastapi.responses import StreamingResponse
 from app.schemas.trips_schema import RoadItinerary, Trip, TripSaveRequest,TripResponse
 from app.schemas.forms_schema import Form
-from app.database.MongoClient import DBClient
-import requests as request
+from app.database.MongoClient import MAX_TRIP_PAGE_SIZE, TRIP_PAGE_SIZE, AsyncDBClient
+from app.services.admission import AdmissionRejected, upstream_admission
+from app.services.http_client import auth_headers, http_clients
+from app.services.resilience import CircuitOpenError, upstream_name
+from app.services.trip_jobs import JobQueueFull, trip_jobs
+from app.services.trip_updates import trip_updates
+from app.services.trip_pipeline import (
+    RecommendationsError, UserManagementError, build_recommendation_request, create_trip, restore_service_fields,
+)
+from app.services.ttl_cache import TTLCache
+import asyncio
 import json
-from pydantic import ValidationError
+import math
+import orjson
+import os
 from bson import ObjectId
-from typing import List, Union
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
 
 router = APIRouter(
@@ -17,165 +30,56 @@ router = APIRouter(
     responses={404: {"description": "Trips not found"}},
 )
 
-USER_MANAGEMENT_URL = "http://user-management:8080"
+# guest views only need to know whether a trip has participants
+participant_count_cache = TTLCache(ttl=float(os.getenv("PARTICIPANT_COUNT_TTL", 30)))
 
-# create global redis instance
-redis_client = RedisClient()
+MAX_BULK_TRIPS = int(os.getenv("MAX_BULK_TRIPS", 100))
+# seconds a client is asked to wait when the trip job queue is full
+TRIP_JOB_RETRY_AFTER = int(os.getenv("TRIP_JOB_RETRY_AFTER", 5))
 
 
 # Mock trips data
 @router.post("/trips")
-async def trip_creation(forms: Form,rq:Request):
+async def trip_creation(forms: Form, rq: Request, job: bool = False):
+    """Create a trip; with ``?job=true`` answer 202 right away and create it
+    in the background, see GET /api/jobs/{id}."""
     try:
         # generate document Id for itinerary document and cache
         documentID = ObjectId()
-        trip_type = forms.tripType
-        display_name = forms.display_name
-        country = forms.country
-        city = forms.city
         voyage_cookie = rq.cookies.get("voyage_at")
-        questionnaire = []
-        for q in forms.preferences.questions:
-            questionnaire.append(
-                {"question_id": q.question_id, "value": q.value, "type": "scale"}
-            )
-        # Ensure duration is at least 1 day
-        duration = max(1, forms.duration)
-        delta = timedelta(days=duration)
-        # Convert startDate string to datetime object with proper error handling
         try:
-            # Handle ISO format string with Z (UTC) timezone
-            if forms.startDate.endswith('Z'):
-                start_date = datetime.fromisoformat(forms.startDate.replace('Z', '+00:00'))
-            else:
-                start_date = datetime.fromisoformat(forms.startDate)
+            requestBody = build_recommendation_request(forms, str(documentID))
         except (ValueError, TypeError):
-            # Default to current date if parsing fails
-            print(f"Invalid date format: {forms.startDate}, using current date instead")
-            start_date = datetime.now()
+            print(f"Invalid date format: {forms.startDate}")
             return ResponseBody(
                 {},
                 "Error connecting to recommendations service",
                 status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-        end_date = start_date + delta
-
-        requestBody = {
-            "trip_id": str(documentID),
-            "questionnaire": questionnaire,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "budget": forms.budget,
-            # adding the display name as attribute to the trip
-            "name": display_name,
-            "must_visit_places": [mvp.model_dump() for mvp in forms.must_visit_places],
-            "keywords": forms.keywords,
-            "country": country,
-            "city": city,
-            "is_group": forms.is_group,
-        }
-
-        requestBody["data"] = forms.data_type.model_dump()
-        requestBody["tripType"] = trip_type.value
-        # Depuração
-        print("Sending to recommendations service:", json.dumps(requestBody))
-        response = request.post(
-            "http://recommendations:8080/trip", json=requestBody, timeout=40
-        )
-        if response.status_code != 200:
-            print(f"Error from recommendations service: {response.text}")
+        if job:
+            return await submit_trip_job(forms, requestBody, voyage_cookie)
+        try:
+            async with upstream_admission.admit():
+                current_trip = await create_trip(forms, requestBody, voyage_cookie, timeout=40)
+        except AdmissionRejected as e:
+            return too_many_requests(e)
+        except RecommendationsError as e:
+            print(f"Error from recommendations service: {e.text}")
             return ResponseBody(
-                {"error": response.text},
+                {"error": e.text},
                 "Error from recommendations service",
                 status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-        itinerary = response.json()["itinerary"]
-        print(response.json())
-        itinerary["trip_type"]=trip_type.value
-        itinerary["country"]=country
-        itinerary["city"]=city
-        
-        # Store original location data for regeneration
-        itinerary["original_place_data"] = forms.data_type.model_dump()
-        
-        # Extract and store coordinates based on trip type
-        if trip_type.value == "zone":
-            itinerary["center_coordinates"] = {
-                "latitude": forms.data_type.center.latitude,
-                "longitude": forms.data_type.center.longitude
-            }
-        elif trip_type.value == "place":
-            itinerary["place_coordinates"] = {
-                "latitude": forms.data_type.coordinates.latitude,
-                "longitude": forms.data_type.coordinates.longitude
-            }
-        elif trip_type.value == "road":
-            itinerary["origin_coordinates"] = {
-                "latitude": forms.data_type.origin.location.latitude,
-                "longitude": forms.data_type.origin.location.longitude
-            }
-            itinerary["destination_coordinates"] = {
-                "latitude": forms.data_type.destination.location.latitude,
-                "longitude": forms.data_type.destination.location.longitude
-            }
-        
-        # casting the dictionary to Trip BaseModel object
-        current_trip=dict()
-        current_trip["itinerary"]=RoadItinerary(**itinerary).model_dump() if trip_type.value=="road" else Trip(**itinerary).model_dump()
-        current_trip["tripId"]=str(documentID)
-        # casting the dictionary to Trip BaseModel object
-        await redis_client.set(
-            str(documentID), json.dumps(current_trip["itinerary"]), expire=3600
-        )
-        # save preferences if user is logged in
-        preference_id = None
-        if voyage_cookie:
-            # Check if an existing preference_id was provided (for reused preferences)
-            if hasattr(forms, 'preference_id') and forms.preference_id:
-                preference_id = forms.preference_id
-                current_trip["preference_id"] = preference_id
-                print(f"Using existing preference ID: {preference_id}")
-            else:
-                # Create new preferences
-                preferences={"name":forms.preferences.preferencesName,"answers":[{"answer":{"value":q["value"]},"question_id":q["question_id"]} for q in questionnaire]}
-                response = request.post(
-                    "http://user-management:8080/preferences", 
-                    json=preferences,
-                    timeout=10,
-                    cookies={"voyage_at": voyage_cookie} if voyage_cookie else None,
-                )
-                if response.status_code != 200 and response.status_code != 409:
-                    print(f"Error from user-management service: {response.text}")
-                    return ResponseBody(
-                        {"error": response.text},
-                        "User-management service error",
-                        status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    )
-                preference_id = response.json()["response"]["id"]
-                current_trip["preference_id"] = preference_id
-                print(f"Created new preference ID: {preference_id}")
-
-        # Add the creator as a participant
-        voyage_cookie = rq.cookies.get("voyage_at")
-        if voyage_cookie:
-            user_trip_data = {
-                "trip_id": str(documentID),
-                "is_group": bool(forms.is_group)
-            }
-            # Add preference_id if it exists
-            if preference_id:
-                user_trip_data["preference_id"] = preference_id
-                
-            user_trip_response = request.post(
-                f"{USER_MANAGEMENT_URL}/trips/save",
-                json=user_trip_data,
-                cookies={"voyage_at": voyage_cookie},
-                timeout=10,
+        except UserManagementError as e:
+            print(f"Error from user-management service: {e.text}")
+            return ResponseBody(
+                {"error": e.text},
+                "User-management service error",
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-            if user_trip_response.status_code != 200:
-                print(f"Failed to add creator as participant: {user_trip_response.text}")
-
-        return ResponseBody(TripResponse(**current_trip).model_dump())
+        except CircuitOpenError as e:
+            return service_unavailable(e)
+        return ResponseBody(current_trip)
     except Exception as e:
         print(f"Error making request to recommendations service: {str(e)}")
         return ResponseBody(
@@ -185,165 +89,296 @@ async def trip_creation(forms: Form,rq:Request):
         )
 
 
+async def submit_trip_job(forms: Form, request_body: dict, voyage_cookie: Optional[str]) -> ResponseBody:
+    try:
+        queued = await trip_jobs.submit(forms, request_body, voyage_cookie)
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+    except JobQueueFull:
+        response = ResponseBody(
+            {}, "Too many trips are being created, retry later", status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response.headers["Retry-After"] = str(TRIP_JOB_RETRY_AFTER)
+        return response
+    status_url = f"/api/jobs/{queued['job_id']}"
+    response = ResponseBody(
+        {"job_id": queued["job_id"], "trip_id": queued["trip_id"], "status_url": status_url},
+        "Trip creation queued",
+        status.HTTP_202_ACCEPTED,
+    )
+    response.headers["Location"] = status_url
+    return response
+
+
+def too_many_requests(e: AdmissionRejected) -> ResponseBody:
+    """Shed a request the upstream admission limiter has no room for."""
+    response = ResponseBody(
+        {"error": e.reason, "retry_after": e.retry_after},
+        "Too many requests, retry later",
+        status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def service_unavailable(e: CircuitOpenError) -> ResponseBody:
+    """Fail fast on a call the upstream's open circuit refused."""
+    retry_after = math.ceil(e.retry_after)
+    response = ResponseBody(
+        {"error": str(e), "retry_after": retry_after},
+        f"{upstream_name(e.upstream)} service unavailable",
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def prepare_save(trip: TripSaveRequest):
+    # add the trip_type onto the itinerary itself
+    trip.itinerary.trip_type = trip.trip_type
+    trip.itinerary.is_group = trip.is_group
+
+
+async def register_trip(trip: TripSaveRequest, voyage_cookie: Optional[str]):
+    """Tell user-management about a newly created trip; returns the error, if any."""
+    user_trip_data = {
+        "trip_id": str(trip.id),
+        "is_group": bool(trip.is_group)
+    }
+    # Add preference_id if it exists
+    if trip.preference_id is not None:
+        user_trip_data["preference_id"] = trip.preference_id
+
+    # Forward the cookie in the outgoing POST request
+    user_trip_response = await http_clients.user_management.post(
+        "/trips/save",
+        json=user_trip_data,
+        headers=auth_headers(voyage_cookie),
+        timeout=10,
+    )
+    participant_count_cache.invalidate(str(trip.id))
+    if user_trip_response.status_code != 200:
+        # the trip can't be reached by anyone without its participant; it
+        # stays a draft in the cache, so the save can be retried
+        await AsyncDBClient().delete_trip(trip.id)
+        await trip_repository.cache_draft(trip.id, trip.itinerary)
+        return user_trip_response.text
+    return None
+
+
 @router.post("/save")
 async def save_trip(trip: TripSaveRequest, rq: Request):
-    client = DBClient()
     try:
-        already_exists = False
+        prepare_save(trip)
+        created = await trip_repository.save(trip.id, trip.itinerary)
+        # a trip saved again is overwritten, it is only registered once
+        if created:
+            error = await register_trip(trip, rq.cookies.get("voyage_at"))
+            if error is not None:
+                return ResponseBody({}, error, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ResponseBody({"trip_id": trip.id, "created": created}, "Trips saved")
+    except Exception as e:
+        print(f"Error inserting trip into the database: {str(e)}")
+        return ResponseBody(
+            {"error": str(e)}, "", status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@router.post("/save/bulk")
+async def save_trips(trips: List[TripSaveRequest], rq: Request):
+    """Save many trips with a single bulk write."""
+    if len(trips) > MAX_BULK_TRIPS:
+        return too_many_trip_ids()
+    try:
+        requests = {trip.id: trip for trip in trips}
+        for trip in requests.values():
+            prepare_save(trip)
+        results = await trip_repository.save_many(
+            {id: trip.itinerary for id, trip in requests.items()}
+        )
+        failed = {id: result for id, result in results.items() if isinstance(result, str)}
+        created = [id for id, result in results.items() if result is True]
+
+        voyage_cookie = rq.cookies.get("voyage_at")
+        errors = await asyncio.gather(
+            *(register_trip(requests[id], voyage_cookie) for id in created)
+        )
+        failed.update({id: error for id, error in zip(created, errors) if error is not None})
+        return ResponseBody({
+            "created": [id for id in created if id not in failed],
+            "updated": [id for id, result in results.items() if result is False],
+            "failed": failed,
+        }, "Trips saved")
+    except Exception as e:
+        print(f"Error saving trips: {str(e)}")
+        return ResponseBody(
+            {"error": str(e)}, "", status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+async def fetch_participants(id: str, voyage_cookie: Optional[str]) -> list:
+    """Get the trip participants as seen by the caller.
+
+    Authenticated users get the full participant details. Guests only learn
+    whether the trip has participants; that answer is cached for a short
+    time since guest views of shared trips are by far the most frequent.
+    """
+    if voyage_cookie:
         try:
-            existing_trip = client.get_trip_by_id(str(trip.id))
-            if existing_trip is not None:
-                already_exists = True
-                print("Trip already exists in the database.")
-        except ValidationError as e:
-            print(f"Validation error: {str(e)}")
-            return ResponseBody(
-                {"error": str(e)},
-                "Error while validating trip data",
-                status.HTTP_400_BAD_REQUEST,
+            participants_response = await http_clients.user_management.get(
+                f"/trips/participants/{id}",
+                headers=auth_headers(voyage_cookie),
+                timeout=10
             )
-        # add the trip_type onto the itinerary itself
-        trip.itinerary.trip_type=trip.trip_type
-        trip.itinerary.country=trip.itinerary.country
-        trip.itinerary.city=trip.itinerary.city
-        trip.itinerary.is_group=trip.is_group
-        result = client.post_trip([trip.itinerary], [trip.id])
-        if len(result) != 0:
-            # forwarding the authentication cookie
-            voyage_cookie = rq.cookies.get("voyage_at")
-
-            # Forward the cookie in the outgoing POST request
-            if not already_exists:
-                user_trip_data = {
-                    "trip_id": str(trip.id),
-                    "is_group": bool(trip.is_group)
-                }
-                # Add preference_id if it exists
-                if trip.preference_id is not None:
-                    user_trip_data["preference_id"] = trip.preference_id
-                    
-                user_trip_response = request.post(
-                    f"http://user-management:8080/trips/save",
-                    json=user_trip_data,
-                    cookies={"voyage_at": voyage_cookie} if voyage_cookie else None,
-                    timeout=10,
-                )
+            if participants_response.status_code == 200:
+                return participants_response.json()
+            print(f"Failed to get participants: {participants_response.status_code}")
+        except Exception as e:
+            print(f"Error fetching participants: {str(e)}")
+        return []
+
+    has_participants = participant_count_cache.get(id)
+    if has_participants is None:
+        try:
+            count_response = await http_clients.user_management.get(
+                f"/trips/participants-count/{id}",
+                timeout=10
+            )
+            if count_response.status_code != 200:
+                print(f"Failed to get participant count: {count_response.status_code}")
+                return []
+            has_participants = bool(count_response.json().get("has_participants", False))
+            participant_count_cache.set(id, has_participants)
+        except Exception as e:
+            print(f"Error fetching participant count: {str(e)}")
+            return []
+    # Placeholder to indicate there are participants the guest can't see;
+    # no participants means the guest can edit
+    return [{"user_id": "hidden"}] if has_participants else []
+
+
+def split_trip_ids(ids: List[str]) -> List[str]:
+    """Accept ids=a,b,c as well as repeated ids=, without duplicates."""
+    return list(dict.fromkeys(i.strip() for raw in ids for i in raw.split(",") if i.strip()))
+
+
+def too_many_trip_ids() -> ResponseBody:
+    return ResponseBody(
+        {"error": f"At most {MAX_BULK_TRIPS} ids per request"},
+        "Too many trip ids",
+        status.HTTP_400_BAD_REQUEST,
+    )
+
+
+@router.get("/trips")
+async def get_trips(rq: Request, ids: List[str] = Query(...)):
+    """Fetch many trips at once: GET /api/trips?ids=a,b,c (or repeated ids=)."""
+    trip_ids = split_trip_ids(ids)
+    if len(trip_ids) > MAX_BULK_TRIPS:
+        return too_many_trip_ids()
+    try:
+        voyage_cookie = rq.cookies.get("voyage_at")
+        participants_task = asyncio.gather(
+            *(fetch_participants(id, voyage_cookie) for id in trip_ids)
+        )
 
-                if user_trip_response.status_code != 200:
-                    client.delete_trip(trip.id)
-                    return ResponseBody(
-                        {},
-                        user_trip_response.text,
-                        status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    )
-            return ResponseBody({"trip_id": trip.id}, "Trips saved")
-        raise Exception
+        itineraries = await trip_repository.get_many(trip_ids)
+        participants = dict(zip(trip_ids, await participants_task))
+        return ResponseBody({
+            "trips": [
+                {"tripId": id, "itinerary": itineraries[id], "participants": participants[id]}
+                for id in trip_ids if id in itineraries
+            ],
+            "missing": [id for id in trip_ids if id not in itineraries],
+        })
     except Exception as e:
-        print(f"Error inserting trip into the database: {str(e)}")
+        print(f"Error fetching trips: {str(e)}")
         return ResponseBody(
-            {"error": str(e)}, "", status.HTTP_500_INTERNAL_SERVER_ERROR
+            {"error": str(e)},
+            "Error while fetching trips by id.",
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
-@router.get("/trips/{id}")
-async def get_trip(id: str, rq: Request):
-    client = DBClient()
+@router.get("/trips/summaries")
+async def get_trip_summaries(ids: List[str] = Query(...)):
+    """Name, dates, type, location and day count of many trips, without their days."""
+    trip_ids = split_trip_ids(ids)
+    if len(trip_ids) > MAX_BULK_TRIPS:
+        return too_many_trip_ids()
     try:
-        result = await redis_client.get(str(id))
-        if result is not None:
-            trip_data = json.loads(result)
-            voyage_cookie = rq.cookies.get("voyage_at")
-            
-            # Get participants data based on authentication status
-            participants = []
-            if voyage_cookie:
-                # Authenticated user - get full participant details
-                try:
-                    participants_response = request.get(
-                        f"{USER_MANAGEMENT_URL}/trips/participants/{id}",
-                        cookies={"voyage_at": voyage_cookie},
-                        timeout=10
-                    )
-                    print(participants_response)
-                    if participants_response.status_code == 200:
-                        participants = participants_response.json()
-                        print(participants)
-                    else:
-                        print(f"Failed to get participants: {participants_response.status_code}")
-                        participants = []
-                except Exception as e:
-                    print(f"Error fetching participants: {str(e)}")
-                    participants = []
-            else:
-                # Guest user - check if trip has participants without getting details
-                try:
-                    count_response = request.get(
-                        f"{USER_MANAGEMENT_URL}/trips/participants-count/{id}",
-                        timeout=10
-                    )
-                    if count_response.status_code == 200:
-                        count_data = count_response.json()
-                        if count_data.get("has_participants", False):
-                            # Return a placeholder to indicate there are participants but we can't see them
-                            participants = [{"user_id": "hidden"}]  # Placeholder to indicate participants exist
-                        else:
-                            participants = []  # No participants - guest can edit
-                    else:
-                        print(f"Failed to get participant count: {count_response.status_code}")
-                        participants = []
-                except Exception as e:
-                    print(f"Error fetching participant count: {str(e)}")
-                    participants = []
-            
-            return ResponseBody({"itinerary": trip_data, "participants": participants})
+        summaries = await AsyncDBClient().get_trip_summaries(trip_ids)
+        return ResponseBody({
+            "summaries": [summaries[id].model_dump() for id in trip_ids if id in summaries],
+            "missing": [id for id in trip_ids if id not in summaries],
+        })
+    except Exception as e:
+        print(f"Error fetching trip summaries: {str(e)}")
+        return ResponseBody(
+            {"error": str(e)},
+            "Error while fetching trip summaries.",
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@router.get("/trips/all")
+async def get_all_trips(after: Optional[str] = None, limit: int = Query(TRIP_PAGE_SIZE, ge=1, le=MAX_TRIP_PAGE_SIZE)):
+    """Page through every trip: pass the returned ``next`` as ``after`` until it is null."""
+    if after is not None and not ObjectId.is_valid(after):
+        return ResponseBody({"error": "after must be a trip id"}, "Invalid cursor", status.HTTP_400_BAD_REQUEST)
+    try:
+        trips, next_after = await AsyncDBClient().get_trips_page(after, limit)
+        return ResponseBody({"trips": trips, "next": next_after})
+    except Exception as e:
+        print(f"Error fetching trips page: {str(e)}")
+        return ResponseBody(
+            {"error": str(e)},
+            "Error while fetching trips.",
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
-        result = client.get_trip_by_id(id)
-        if result is not None:
-            trip_data = result.model_dump() if isinstance(result, (Trip, RoadItinerary)) else json.loads(result) if isinstance(result, str) else result.model_dump()
-            voyage_cookie = rq.cookies.get("voyage_at")
-            
-            # Get participants data based on authentication status
-            participants = []
-            if voyage_cookie:
-                # Authenticated user - get full participant details
-                try:
-                    participants_response = request.get(
-                        f"{USER_MANAGEMENT_URL}/trips/participants/{id}",
-                        cookies={"voyage_at": voyage_cookie},
-                        timeout=10
-                    )
-                    if participants_response.status_code == 200:
-                        participants = participants_response.json()
-                    else:
-                        print(f"Failed to get participants: {participants_response.status_code}")
-                        participants = []
-                except Exception as e:
-                    print(f"Error fetching participants: {str(e)}")
-                    participants = []
-            else:
-                # Guest user - check if trip has participants without getting details
-                try:
-                    count_response = request.get(
-                        f"{USER_MANAGEMENT_URL}/trips/participants-count/{id}",
-                        timeout=10
-                    )
-                    if count_response.status_code == 200:
-                        count_data = count_response.json()
-                        if count_data.get("has_participants", False):
-                            # Return a placeholder to indicate there are participants but we can't see them
-                            participants = [{"user_id": "hidden"}]  # Placeholder to indicate participants exist
-                        else:
-                            participants = []  # No participants - guest can edit
-                    else:
-                        print(f"Failed to get participant count: {count_response.status_code}")
-                        participants = []
-                except Exception as e:
-                    print(f"Error fetching participant count: {str(e)}")
-                    participants = []
-                
-            return ResponseBody({"itinerary": trip_data, "participants": participants})
 
-        return ResponseBody({}, "No trip found for this id.", status.HTTP_404_NOT_FOUND)
+async def trips_ndjson():
+    try:
+        async for trip in AsyncDBClient().iter_trips():
+            yield orjson.dumps(trip) + b"\n"
+    except Exception as e:
+        # the status line is already sent, the client sees a truncated stream
+        print(f"Error streaming trips: {str(e)}")
+
+
+@router.get("/trips/all/stream")
+async def stream_all_trips():
+    """Every trip as newline-delimited JSON, written as the cursor reads it."""
+    return StreamingResponse(trips_ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/trips/{id}/summary")
+async def get_trip_summary(id: str):
+    try:
+        summary = await AsyncDBClient().get_trip_summary(id)
+        if summary is None:
+            return ResponseBody({}, "No trip found for this id.", status.HTTP_404_NOT_FOUND)
+        return ResponseBody(summary.model_dump())
+    except Exception as e:
+        print(f"Error fetching trip summary: {str(e)}")
+        return ResponseBody(
+            {"error": str(e)},
+            "Error while fetching the trip summary.",
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@router.get("/trips/{id}")
+async def get_trip(id: str, rq: Request):
+    try:
+        # the itinerary and participant lookups are independent, run them together
+        trip_data, participants = await asyncio.gather(
+            trip_repository.get(id), fetch_participants(id, rq.cookies.get("voyage_at"))
+        )
+        if trip_data is None:
+            return ResponseBody({}, "No trip found for this id.", status.HTTP_404_NOT_FOUND)
+        return ResponseBody({"itinerary": trip_data, "participants": participants})
     except Exception as e:
         print(f"Error fetching trip from the database: {str(e)}")
         return ResponseBody(
@@ -355,17 +390,16 @@ async def get_trip(id: str, rq: Request):
 
 @router.put("/trip/{id}")
 async def update_trip(id: str, trip: Union[Trip, RoadItinerary]):
-    client = DBClient()
     try:
-        if client.put_trip_by_doc_id(id, trip):
+        if await trip_repository.update(id, trip):
             return ResponseBody(
                 {"updated": True}, "Trip Updated with sucess!", status.HTTP_201_CREATED
             )
         return ResponseBody({}, "No trip updated!", status.HTTP_204_NO_CONTENT)
     except Exception as e:
-
+        print(f"Error updating trip {id}: {str(e)}")
         return ResponseBody(
-            {"error": e}, "Unexpected error!", status.HTTP_400_BAD_REQUEST
+            {"error": str(e)}, "Unexpected error!", status.HTTP_400_BAD_REQUEST
         )
 
 
@@ -373,15 +407,19 @@ async def update_trip(id: str, trip: Union[Trip, RoadItinerary]):
 async def regenerate_activity(trip_id: str, activity: dict):
     try:
         # First get the current trip to preserve trip_type
-        current_trip = await redis_client.get(str(trip_id))
-        if current_trip:
-            current_trip_data = json.loads(current_trip)
-            trip_type = current_trip_data.get('trip_type')
-            
-        recommendations_url = (
-            f"http://recommendations:8080/trip/{trip_id}/regenerate-activity"
+        current_trip_data = await trip_repository.get(str(trip_id))
+        if current_trip_data is None:
+            return ResponseBody(
+                {"error": "Trip not found"},
+                "Trip not found",
+                status.HTTP_404_NOT_FOUND,
+            )
+        trip_type = current_trip_data.get('trip_type')
+
+        recommendations_url = f"/trip/{trip_id}/regenerate-activity"
+        response = await http_clients.recommendations.post(
+            recommendations_url, json=activity, timeout=40
         )
-        response = request.post(recommendations_url, json=activity, timeout=40)
 
         if response.status_code != 200:
             return ResponseBody(
@@ -390,35 +428,36 @@ async def regenerate_activity(trip_id: str, activity: dict):
                 status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+        # the service does not send back what this service keeps about the
+        # trip (trip_type, location, ...), which would otherwise be lost
+        updated_itinerary = restore_service_fields(
+            response.json()["response"]["itinerary"], current_trip_data
+        )
 
-        updated_itinerary = response.json()["response"]["itinerary"]
-        
-        # Preserve the trip_type in the updated itinerary
-        if current_trip and trip_type:
-            updated_itinerary['trip_type'] = trip_type
-            updated_itinerary['tripId'] = trip_id
-
-            
-        # Ensure other required fields are present
-        if 'country' in current_trip_data:
-            updated_itinerary['country'] = current_trip_data.get('country')
-        if 'city' in current_trip_data:
-            updated_itinerary['city'] = current_trip_data.get('city')
-        if 'is_group' in current_trip_data:
-            updated_itinerary['is_group'] = current_trip_data.get('is_group')
-            
         # Create the appropriate trip object based on trip_type
         if trip_type == "road":
             trip = RoadItinerary(**updated_itinerary)
         else:
             trip = Trip(**updated_itinerary)
 
-        await redis_client.set(str(trip_id), json.dumps(trip.model_dump()), expire=3600)
-
-        print("trip", trip)
-
-        return TripResponse(itinerary=trip, tripId=trip_id).model_dump()
-
+        # when only the regenerated activity changed, replace it in place
+        edit = None
+        trip_json = trip.model_dump(mode="json")
+        regenerated_id = activity.get("id", activity.get("activity_id"))
+        # (the rest of the trip is this service's, restored above)
+        if regenerated_id is not None and ObjectId.is_valid(trip_id) and "days" in trip_json:
+            regenerated = ActivityUpdates.find_activity(trip_json, regenerated_id)
+            if regenerated is not None and ActivityUpdates.with_activity(
+                current_trip_data, regenerated_id, regenerated
+            ).get("days") == trip_json["days"]:
+                edit = ActivityUpdates.replace_activity(trip_id, regenerated_id, regenerated)
+        await trip_repository.update_later(str(trip_id), trip, edit)
+        await trip_updates.publish(str(trip_id), current_trip_data, trip_json)
+
+        return FastJSONResponse(TripResponse(itinerary=trip, tripId=trip_id).model_dump())
+
+    except CircuitOpenError as e:
+        return service_unavailable(e)
     except Exception as e:
         print(f"Error regenerating activity: {str(e)}")
         return ResponseBody(
@@ -432,18 +471,17 @@ async def regenerate_activity(trip_id: str, activity: dict):
 async def delete_activity(trip_id: str, activity_id: str):
     try:
         # First get the current trip to preserve trip_type
-        current_trip = await redis_client.get(str(trip_id))
-        if not current_trip:
+        current_trip_data = await trip_repository.get(str(trip_id))
+        if current_trip_data is None:
             return ResponseBody(
                 {"error": "Trip not found"},
                 "Trip not found",
                 status.HTTP_404_NOT_FOUND,
             )
-        current_trip_data = json.loads(current_trip)
         trip_type = current_trip_data.get('trip_type')
 
-        recommendations_url = f"http://recommendations:8080/trip/{trip_id}/delete-activity/{activity_id}"
-        response = request.delete(recommendations_url, timeout=40)
+        recommendations_url = f"/trip/{trip_id}/delete-activity/{activity_id}"
+        response = await http_clients.recommendations.delete(recommendations_url, timeout=40)
 
         if response.status_code != 200:
             return ResponseBody(
@@ -452,19 +490,28 @@ async def delete_activity(trip_id: str, activity_id: str):
                 status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        updated_itinerary = response.json()["response"]["itinerary"]
-        # Preserve the trip_type in the updated itinerary
-        if trip_type:
-            updated_itinerary['trip_type'] = trip_type
-        
+        # the service does not send back what this service keeps about the
+        # trip (trip_type, location, ...), which would otherwise be lost
+        updated_itinerary = restore_service_fields(
+            response.json()["response"]["itinerary"], current_trip_data
+        )
+
         # Create the appropriate trip object based on trip_type
         if trip_type == "road":
             trip = RoadItinerary(**updated_itinerary)
         else:
             trip = Trip(**updated_itinerary)
 
-        # Update in Redis cache
-        await redis_client.set(str(trip_id), json.dumps(trip.model_dump()), expire=3600)
+        # when the service only removed the activity, pull it in place
+        # (the rest of the trip is this service's, restored above)
+        edit = None
+        trip_json = trip.model_dump(mode="json")
+        if ObjectId.is_valid(trip_id) and "days" in trip_json and ActivityUpdates.without_activity(
+            current_trip_data, activity_id
+        ).get("days") == trip_json["days"]:
+            edit = ActivityUpdates.delete_activity(trip_id, activity_id)
+        await trip_repository.update_later(str(trip_id), trip, edit)
+        await trip_updates.publish(str(trip_id), current_trip_data, trip_json)
 
         # Return response in the same structure as regenerate_activity
         return ResponseBody(
@@ -473,6 +520,8 @@ async def delete_activity(trip_id: str, activity_id: str):
             status.HTTP_200_OK,
         )
 
+    except CircuitOpenError as e:
+        return service_unavailable(e)
     except Exception as e:
         print(f"Error deleting activity: {str(e)}")
         return ResponseBody(
@@ -484,7 +533,6 @@ async def delete_activity(trip_id: str, activity_id: str):
 @router.put("/trip/{trip_id}/preferences")
 async def update_trip_preferences(trip_id: str, preferences_data: dict, rq: Request):
     """Update trip preferences and regenerate the trip with new preferences"""
-    client = DBClient()
     try:
         voyage_cookie = rq.cookies.get("voyage_at")
         if not voyage_cookie:
@@ -494,35 +542,14 @@ async def update_trip_preferences(trip_id: str, preferences_data: dict, rq: Requ
                 status.HTTP_401_UNAUTHORIZED,
             )
 
-        # First try to get trip from Redis
-        current_trip = await redis_client.get(str(trip_id))
-        
-        # If not in Redis, try to get from database
-        if not current_trip:
-            print(f"Trip {trip_id} not found in Redis, checking database...")
-            db_trip = client.get_trip_by_id(trip_id)
-            if db_trip is not None:
-                print(f"Trip {trip_id} found in database")
-                if isinstance(db_trip, (Trip, RoadItinerary)):
-                    current_trip = json.dumps(db_trip.model_dump())
-                elif isinstance(db_trip, str):
-                    current_trip = db_trip
-                else:
-                    current_trip = json.dumps(db_trip.model_dump())
-                
-                # Cache the trip in Redis for future requests
-                await redis_client.set(str(trip_id), current_trip, expire=3600)
-            else:
-                print(f"Trip {trip_id} not found in database either")
-                return ResponseBody(
-                    {"error": "Trip not found"},
-                    "Trip not found",
-                    status.HTTP_404_NOT_FOUND,
-                )
-        else:
-            print(f"Trip {trip_id} found in Redis")
-        
-        current_trip_data = json.loads(current_trip)
+        current_trip_data = await trip_repository.get(str(trip_id))
+        if current_trip_data is None:
+            print(f"Trip {trip_id} not found")
+            return ResponseBody(
+                {"error": "Trip not found"},
+                "Trip not found",
+                status.HTTP_404_NOT_FOUND,
+            )
         
         print(f"Current trip data keys: {list(current_trip_data.keys())}")
         print(f"Current trip data sample: {json.dumps(current_trip_data, indent=2)[:500]}...")
@@ -641,11 +668,17 @@ async def update_trip_preferences(trip_id: str, preferences_data: dict, rq: Requ
         print(f"Calling recommendations service with data: {json.dumps(requestBody)[:200]}...")
         
         # Call recommendations service to regenerate trip
-        response = request.post(
-            "http://recommendations:8080/trip", 
-            json=requestBody, 
-            timeout=60
-        )
+        try:
+            async with upstream_admission.admit():
+                response = await http_clients.recommendations.post(
+                    "/trip",
+                    json=requestBody,
+                    timeout=60
+                )
+        except AdmissionRejected as e:
+            return too_many_requests(e)
+        except CircuitOpenError as e:
+            return service_unavailable(e)
         
         if response.status_code != 200:
             return ResponseBody(
@@ -660,20 +693,18 @@ async def update_trip_preferences(trip_id: str, preferences_data: dict, rq: Requ
         itinerary["country"] = country
         itinerary["city"] = city
         
-        # Update the trip in cache
-        updated_trip = RoadItinerary(**itinerary).model_dump() if trip_type == "road" else Trip(**itinerary).model_dump()
-        await redis_client.set(trip_id, json.dumps(updated_trip), expire=3600)
-        
-        # Also update the trip in the database
+        # Update the trip in the database and cache
+        trip = parse_itinerary(itinerary)
+        updated_trip = trip.model_dump()
         try:
-            if trip_type == "road":
-                db_updated = client.put_trip_by_doc_id(trip_id, RoadItinerary(**itinerary))
-            else:
-                db_updated = client.put_trip_by_doc_id(trip_id, Trip(**itinerary))
+            db_updated = await trip_repository.update(trip_id, trip)
             print(f"Database update result: {db_updated}")
         except Exception as db_error:
             print(f"Error updating trip in database: {str(db_error)}")
-            # Continue even if database update fails, since Redis has the updated trip
+            # Continue even if database update fails, keeping the new trip in the
+            # cache; marked dirty, so it is retried and never used as a diff base
+            await trip_repository.update_later(trip_id, trip)
+        await trip_updates.publish(trip_id, current_trip_data, trip.model_dump(mode="json"))
         
         # Return the updated trip
         return ResponseBody({
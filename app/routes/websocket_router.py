@@ -1,16 +1,26 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from fastapi.websockets import WebSocketState
-from app.database.CacheClient import RedisClient
+from app.database.TripRepository import parse_itinerary, trip_repository
 from app.schemas.response import ResponseBody
 from app.schemas.trips_schema import RoadItinerary, Trip, TripSaveRequest, TripResponse
 from app.schemas.forms_schema import Form
-from app.database.MongoClient import DBClient
-import requests as request
+from app.services.admission import AdmissionRejected, upstream_admission
+from app.services.http_client import http_clients
+from app.services.resilience import CircuitOpenError, upstream_name
+from app.services.trip_events import FINAL_EVENTS, TripEvents, trip_events
+from app.services.trip_jobs import TRIP_JOB_TIMEOUT, JobQueueFull, trip_jobs
+from app.services.trip_pipeline import build_recommendation_request
+from app.services.trip_updates import trip_updates
 import json
+import math
+import orjson
+import os
 import asyncio
+from collections import deque
 from pydantic import ValidationError
 from bson import ObjectId
 from datetime import datetime, timedelta
+from typing import Deque, Optional, Tuple
 import traceback
 
 router = APIRouter(
@@ -18,36 +28,177 @@ router = APIRouter(
     tags=["websockets"],
 )
 
-USER_MANAGEMENT_URL = "http://user-management:8080"
-redis_client = RedisClient()
+
+# events a socket may have waiting to be sent before it is dropped
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 32))
+# how long a creation socket waits for its trip's final event before it
+# reads the outcome from the job record instead
+WS_CREATION_TIMEOUT = float(os.getenv("WS_CREATION_TIMEOUT", TRIP_JOB_TIMEOUT + 30))
+# how often the job record is read once the trip's events are lost
+WS_JOB_POLL_INTERVAL = 1.0
+
+
+class Subscriber:
+    """A websocket watching a trip, with its own bounded queue of outgoing
+    events and the task writing them, so a slow client only delays itself.
+
+    When the queue is full, queued progress events are dropped (the newer
+    event supersedes them); if that frees no room the client is too slow
+    and ``offer`` refuses the event.
+    """
+
+    def __init__(self, websocket: WebSocket, trip_id: str, until_final: bool = False, max_queue: int = WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.trip_id = trip_id
+        self.until_final = until_final
+        self.max_queue = max_queue
+        self.pending: Deque[Tuple[Optional[str], str]] = deque()
+        self.coalesced = 0
+        # set once the final event is sent (with until_final) or the socket is dropped
+        self.finished = asyncio.Event()
+        self.final_sent = False
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, event_type: Optional[str], text: str) -> bool:
+        if len(self.pending) >= self.max_queue:
+            kept = deque(e for e in self.pending if e[0] != "progress")
+            if len(kept) >= self.max_queue:
+                return False
+            self.coalesced += len(self.pending) - len(kept)
+            self.pending = kept
+        self.pending.append((event_type, text))
+        self._ready.set()
+        return True
+
+    async def write(self):
+        while True:
+            await self._ready.wait()
+            while self.pending:
+                event_type, text = self.pending.popleft()
+                await self.websocket.send_text(text)
+                if self.until_final and event_type in FINAL_EVENTS:
+                    self.final_sent = True
+                    self.finished.set()
+                    return
+            self._ready.clear()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, trip_id: str):
-        await websocket.accept()
-        self.active_connections[trip_id] = websocket
-    
-    def disconnect(self, trip_id: str):
-        if trip_id in self.active_connections:
-            del self.active_connections[trip_id]
-    
+    """Websockets held by this process, by the trip they watch.
+
+    The events of a trip are not sent to its sockets directly: whichever
+    process produces them publishes them on the trip's Redis channel
+    (``send_message``). Every process with sockets watching the trip holds
+    one subscription to the channel and fans the events out to them
+    (``broadcast``), so a trip can be created by any worker or replica and
+    watched from any of them.
+
+    If a subscription drops, its relay ends the trip's subscribers: watchers
+    are closed (1013) to reconnect and resync, creation sockets fall back to
+    the job record. The next socket of the trip subscribes again.
+    """
+
+    def __init__(self, events: TripEvents = trip_events, max_queue: int = WS_SEND_QUEUE_SIZE):
+        self.subscribers: dict[str, set[Subscriber]] = {}
+        self.events = events
+        self.max_queue = max_queue
+        self._relays: dict[str, asyncio.Task] = {}
+        self.dropped = 0
+
+    async def connect(self, websocket: WebSocket, trip_id: str, until_final: bool = False) -> Subscriber:
+        """Start sending the trip's events to the socket. With ``until_final``
+        the subscriber finishes after the trip's success or error event."""
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept()
+        subscriber = Subscriber(websocket, trip_id, until_final, self.max_queue)
+        subscriber.task = asyncio.create_task(self._write(subscriber))
+        self.subscribers.setdefault(trip_id, set()).add(subscriber)
+        relay = self._relays.get(trip_id)
+        if relay is None or relay.done():
+            subscribed = asyncio.get_running_loop().create_future()
+            self._relays[trip_id] = asyncio.create_task(self._relay(trip_id, subscribed))
+            try:
+                # events published from now on reach the socket
+                await subscribed
+            except Exception:
+                self.disconnect(subscriber)
+                raise
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        subscriber.finished.set()
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+        subscribers = self.subscribers.get(subscriber.trip_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.trip_id]
+            relay = self._relays.pop(subscriber.trip_id, None)
+            if relay is not None:
+                relay.cancel()
+
     async def send_message(self, trip_id: str, message: dict):
-        if trip_id in self.active_connections:
-            websocket = self.active_connections[trip_id]
-            if websocket.client_state == WebSocketState.CONNECTED:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    print(f"Error sending message: {e}")
-                    self.disconnect(trip_id)
+        await self.events.publish(trip_id, message)
+
+    def broadcast(self, trip_id: str, event: bytes):
+        """Queue an event for every local socket watching the trip."""
+        subscribers = self.subscribers.get(trip_id)
+        if not subscribers:
+            return
+        # decoded once for every socket, the itinerary is not parsed again
+        text = event.decode()
+        event_type = orjson.loads(event).get("type")
+        for subscriber in list(subscribers):
+            if not subscriber.offer(event_type, text):
+                print(f"Dropping a websocket of trip {trip_id}, too slow to keep up")
+                self.dropped += 1
+                self.disconnect(subscriber)
+                asyncio.create_task(self._close(subscriber.websocket))
+
+    async def _relay(self, trip_id: str, subscribed: asyncio.Future):
+        try:
+            async with self.events.subscribe(trip_id, until_final=False) as events:
+                subscribed.set_result(None)
+                async for event in events:
+                    self.broadcast(trip_id, event)
+        except Exception as e:
+            if not subscribed.done():
+                subscribed.set_exception(e)
+            else:
+                print(f"Relay of trip {trip_id} events stopped: {e}")
+        # the subscription dropped (a cancelled relay does not get here), the
+        # trip's sockets would get no more events
+        if self._relays.get(trip_id) is asyncio.current_task():
+            del self._relays[trip_id]
+            for subscriber in list(self.subscribers.get(trip_id, ())):
+                self.disconnect(subscriber)
+                if not subscriber.until_final:
+                    asyncio.create_task(self._close(subscriber.websocket))
+
+    async def _write(self, subscriber: Subscriber):
+        try:
+            await subscriber.write()
+        except Exception as e:
+            print(f"Error sending message: {e}")
+        finally:
+            self.disconnect(subscriber)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            pass
 
 manager = ConnectionManager()
 
 @router.websocket("/trip-creation")
 async def websocket_trip_creation(websocket: WebSocket):
     trip_id = None
+    subscriber = None
     try:
         await websocket.accept()
         
@@ -70,7 +221,6 @@ async def websocket_trip_creation(websocket: WebSocket):
             return
         
         trip_id = str(ObjectId())
-        manager.active_connections[trip_id] = websocket
         
         await websocket.send_json({
             "type": "progress",
@@ -79,27 +229,10 @@ async def websocket_trip_creation(websocket: WebSocket):
             "trip_id": trip_id
         })
         
-        trip_type = forms.tripType
-        display_name = forms.display_name
-        country = forms.country
-        city = forms.city
-        questionnaire = []
-        for q in forms.preferences.questions:
-            questionnaire.append(
-                {"question_id": q.question_id, "value": q.value, "type": "scale"}
-            )
-        
-        duration = max(1, forms.duration)
-        delta = timedelta(days=duration)
-        
         try:
-            if forms.startDate.endswith('Z'):
-                start_date = datetime.fromisoformat(forms.startDate.replace('Z', '+00:00'))
-            else:
-                start_date = datetime.fromisoformat(forms.startDate)
+            requestBody = build_recommendation_request(forms, trip_id)
         except (ValueError, TypeError):
-            print(f"Invalid date format: {forms.startDate}, using current date instead")
-            start_date = datetime.now()
+            print(f"Invalid date format: {forms.startDate}")
             await websocket.send_json({
                 "type": "error",
                 "message": "Invalid date format",
@@ -107,184 +240,45 @@ async def websocket_trip_creation(websocket: WebSocket):
             })
             return
         
-        end_date = start_date + delta
-        
         await websocket.send_json({
             "type": "progress",
             "message": "Preparing request for recommendations service...",
             "progress": 20
         })
         
-        requestBody = {
-            "trip_id": trip_id,
-            "questionnaire": questionnaire,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "budget": forms.budget,
-            "name": display_name,
-            "must_visit_places": [mvp.model_dump() for mvp in forms.must_visit_places],
-            "keywords": forms.keywords,
-            "country": country,
-            "city": city,
-            "is_group": forms.is_group,
-        }
-        
-        requestBody["data"] = forms.data_type.model_dump()
-        requestBody["tripType"] = trip_type.value
-        
-        await websocket.send_json({
-            "type": "progress",
-            "message": "Calling recommendations service...",
-            "progress": 30
-        })
+        # preferences are only saved for logged-in users
+        voyage_cookie = None if guest else websocket.cookies.get("voyage_at")
         
-        response = request.post(
-            "http://recommendations:8080/trip", json=requestBody, timeout=60
-        )
-        
-        if response.status_code != 200:
+        # the trip is created by a job worker, which publishes the remaining
+        # events on the trip's channel; subscribed first so none is missed
+        subscriber = await manager.connect(websocket, trip_id, until_final=True)
+        try:
+            job = await trip_jobs.submit(forms, requestBody, voyage_cookie)
+        except AdmissionRejected as e:
             await websocket.send_json({
                 "type": "error",
-                "message": f"Error from recommendations service: {response.text}",
-                "progress": 30
+                "message": "Too many requests, retry later",
+                "progress": 20,
+                "retry_after": e.retry_after
             })
             return
-        
-        await websocket.send_json({
-            "type": "progress",
-            "message": "Processing recommendations response...",
-            "progress": 70
-        })
-        
-        itinerary = response.json()["itinerary"]
-        itinerary["trip_type"] = trip_type.value
-        itinerary["country"] = country
-        itinerary["city"] = city
-        
-        # Store original location data for regeneration
-        itinerary["original_place_data"] = forms.data_type.model_dump()
-        
-        # Extract and store coordinates based on trip type
-        if trip_type.value == "zone":
-            itinerary["center_coordinates"] = {
-                "latitude": forms.data_type.center.latitude,
-                "longitude": forms.data_type.center.longitude
-            }
-        elif trip_type.value == "place":
-            itinerary["place_coordinates"] = {
-                "latitude": forms.data_type.coordinates.latitude,
-                "longitude": forms.data_type.coordinates.longitude
-            }
-        elif trip_type.value == "road":
-            itinerary["origin_coordinates"] = {
-                "latitude": forms.data_type.origin.location.latitude,
-                "longitude": forms.data_type.origin.location.longitude
-            }
-            itinerary["destination_coordinates"] = {
-                "latitude": forms.data_type.destination.location.latitude,
-                "longitude": forms.data_type.destination.location.longitude
-            }
-        
-        current_trip = dict()
-        current_trip["itinerary"] = RoadItinerary(**itinerary).model_dump() if trip_type.value == "road" else Trip(**itinerary).model_dump()
-        current_trip["tripId"] = trip_id
-        
-        await websocket.send_json({
-            "type": "progress",
-            "message": "Saving to cache...",
-            "progress": 80
-        })
-        
-        await redis_client.set(
-            trip_id, json.dumps(current_trip["itinerary"]), expire=3600
-        )
-        
-        await websocket.send_json({
-            "type": "progress",
-            "message": "Adding creator as participant...",
-            "progress": 90
-        })
-        
-        voyage_cookie = None
-        cookie_header = None
-        for header_name, header_value in websocket.headers.items():
-            if header_name.lower() == 'cookie':
-                cookie_header = header_value
-                break
-        if cookie_header:
-            cookies = {}
-            for cookie in cookie_header.split(';'):
-                if '=' in cookie:
-                    key, value = cookie.strip().split('=', 1)
-                    cookies[key] = value
-            voyage_cookie = cookies.get('voyage_at')
-        
-        # save preferences if user is logged in
-        preference_id = None
-        if not guest:
-            # Check if an existing preference_id was provided (for reused preferences)
-            if hasattr(forms, 'preference_id') and forms.preference_id:
-                preference_id = forms.preference_id
-                current_trip["preference_id"] = preference_id
-            else:
-                # Create new preferences
-                preferences={"name":forms.preferences.preferencesName,"answers":[{"answer":{"value":q["value"]},"question_id":q["question_id"]} for q in questionnaire]}
-
-                response = request.post(
-                    "http://user-management:8080/preferences", 
-                    json=preferences,
-                    timeout=10,
-                    cookies={"voyage_at": voyage_cookie} if voyage_cookie else None,
-                )
-                if response.status_code != 200 and response.status_code != 409:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Couldn't save the preferences of the user for this trip.",
-                    })
-                    return
-                preference_id = response.json()["response"]["id"]
-                current_trip["preference_id"] = preference_id
-            
-        if voyage_cookie and not guest:
-            try:
-                user_trip_data = {
-                    "trip_id": trip_id,
-                    "is_group": bool(forms.is_group)
-                }
-                # Add preference_id if it exists
-                if preference_id:
-                    user_trip_data["preference_id"] = preference_id
-                    
-                user_trip_response = request.post(
-                    f"{USER_MANAGEMENT_URL}/trips/save",
-                    json=user_trip_data,
-                    cookies={"voyage_at": voyage_cookie},
-                    timeout=10,
-                )
-                if user_trip_response.status_code != 200:
-                    print(f"Failed to add creator as participant: {user_trip_response.text}")
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": user_trip_response.text,
-                    })
-            except Exception as e:
-                print(f"Error adding creator as participant: {str(e)}")
-                await websocket.send_json({
-                    "type": "error",
-                    "message": str(e),
-                })
-        
-        await websocket.send_json({
-            "type": "success",
-            "message": "Trip created successfully!",
-            "progress": 100,
-            "trip_id": trip_id,
-            "data": TripResponse(**current_trip).model_dump()
-        })
+        except JobQueueFull:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Too many trips are being created, retry later",
+                "progress": 20
+            })
+            return
+        deadline = asyncio.get_running_loop().time() + WS_CREATION_TIMEOUT
+        try:
+            await asyncio.wait_for(subscriber.finished.wait(), WS_CREATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        if not subscriber.final_sent:
+            # the final event was lost (Redis, relay) or is late
+            await send_job_outcome(subscriber, job, deadline)
         
     except WebSocketDisconnect:
-        if trip_id:
-            manager.disconnect(trip_id)
         print("WebSocket disconnected")
     except Exception as e:
         print(f"Error in WebSocket trip creation: {str(e)}")
@@ -297,8 +291,77 @@ async def websocket_trip_creation(websocket: WebSocket):
             })
         except:
             pass
-        if trip_id:
-            manager.disconnect(trip_id) 
+    finally:
+        if subscriber is not None:
+            manager.disconnect(subscriber)
+
+async def send_job_outcome(subscriber: Subscriber, job: dict, deadline: float):
+    """Send a creation socket the final event of its job, read from the job
+    record until ``deadline``; then where to poll the job if it is not done."""
+    # a late event must not follow this one
+    manager.disconnect(subscriber)
+    if subscriber.websocket.application_state == WebSocketState.DISCONNECTED:
+        return  # dropped as too slow
+    loop = asyncio.get_running_loop()
+    while True:
+        record = await trip_jobs.get(job["job_id"])
+        event = trip_jobs.final_event(orjson.loads(record)) if record is not None else None
+        if event is not None or loop.time() >= deadline:
+            break
+        await asyncio.sleep(WS_JOB_POLL_INTERVAL)
+    if event is None:
+        event = {
+            "type": "error",
+            "message": "Lost track of the trip creation, poll its job",
+            "progress": job["progress"],
+            "trip_id": job["trip_id"],
+            "job_id": job["job_id"],
+            "status_url": f"/api/jobs/{job['job_id']}",
+        }
+    await subscriber.websocket.send_text(orjson.dumps(event).decode())
+
+
+@router.websocket("/trip/{trip_id}/watch")
+async def websocket_trip_watch(websocket: WebSocket, trip_id: str):
+    """Receive every event published for a trip, e.g. by each participant
+    of a group trip: a snapshot of the trip first, then its updates as
+    patches (see trip_updates). Sending ``{"type": "sync"}`` asks for a new
+    snapshot."""
+    subscriber = None
+    try:
+        await websocket.accept()
+        # subscribed before the snapshot is read, so no later update is missed
+        subscriber = await manager.connect(websocket, trip_id)
+        snapshot = await trip_updates.snapshot(trip_id)
+        if snapshot is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Trip not found",
+                "progress": 0
+            })
+            return
+        # queued like the events, so they are sent first
+        subscriber.offer("connection", orjson.dumps({
+            "type": "connection",
+            "message": "Watching trip",
+            "progress": 0,
+            "trip_id": trip_id
+        }).decode())
+        subscriber.offer("snapshot", orjson.dumps(snapshot).decode())
+        while not subscriber.finished.is_set():
+            message = await websocket.receive_json()
+            # a client that missed a version asks for the whole trip again
+            if isinstance(message, dict) and message.get("type") == "sync":
+                snapshot = await trip_updates.snapshot(trip_id)
+                if snapshot is not None and not subscriber.offer("snapshot", orjson.dumps(snapshot).decode()):
+                    break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error watching trip {trip_id}: {str(e)}")
+    finally:
+        if subscriber is not None:
+            manager.disconnect(subscriber)
 
 @router.websocket("/trip-regeneration/{trip_id}")
 async def websocket_trip_regeneration(websocket: WebSocket, trip_id: str):
@@ -341,28 +404,14 @@ async def websocket_trip_regeneration(websocket: WebSocket, trip_id: str):
         })
         
         # Get trip data (from Redis or database)
-        client = DBClient()
-        current_trip = await redis_client.get(str(trip_id))
-        
-        if not current_trip:
-            db_trip = client.get_trip_by_id(trip_id)
-            if db_trip is not None:
-                if isinstance(db_trip, (Trip, RoadItinerary)):
-                    current_trip = json.dumps(db_trip.model_dump())
-                elif isinstance(db_trip, str):
-                    current_trip = db_trip
-                else:
-                    current_trip = json.dumps(db_trip.model_dump())
-                await redis_client.set(str(trip_id), current_trip, expire=3600)
-            else:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": "Trip not found",
-                    "progress": 20
-                })
-                return
-        
-        current_trip_data = json.loads(current_trip)
+        current_trip_data = await trip_repository.get(str(trip_id))
+        if current_trip_data is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Trip not found",
+                "progress": 20
+            })
+            return
         
         print(f"DEBUG: Current trip data keys: {list(current_trip_data.keys())}")
         print(f"DEBUG: Current trip data: {json.dumps(current_trip_data, indent=2)[:1000]}...")
@@ -575,11 +624,29 @@ async def websocket_trip_regeneration(websocket: WebSocket, trip_id: str):
         })
         
         # Call recommendations service
-        response = request.post(
-            "http://recommendations:8080/trip", 
-            json=requestBody, 
-            timeout=120
-        )
+        try:
+            async with upstream_admission.admit():
+                response = await http_clients.recommendations.post(
+                    "/trip",
+                    json=requestBody,
+                    timeout=120
+                )
+        except AdmissionRejected as e:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Too many requests, retry later",
+                "progress": 40,
+                "retry_after": e.retry_after
+            })
+            return
+        except CircuitOpenError as e:
+            await websocket.send_json({
+                "type": "error",
+                "message": f"{upstream_name(e.upstream)} service unavailable, retry later",
+                "progress": 40,
+                "retry_after": math.ceil(e.retry_after)
+            })
+            return
         
         if response.status_code != 200:
             await websocket.send_json({
@@ -601,9 +668,8 @@ async def websocket_trip_regeneration(websocket: WebSocket, trip_id: str):
         itinerary["country"] = country
         itinerary["city"] = city
         
-        # Update the trip in cache
-        updated_trip = RoadItinerary(**itinerary).model_dump() if trip_type == "road" else Trip(**itinerary).model_dump()
-        await redis_client.set(trip_id, json.dumps(updated_trip), expire=3600)
+        trip = parse_itinerary(itinerary)
+        updated_trip = trip.model_dump()
         
         await websocket.send_json({
             "type": "progress",
@@ -611,15 +677,15 @@ async def websocket_trip_regeneration(websocket: WebSocket, trip_id: str):
             "progress": 90
         })
         
-        # Update in database
+        # Update in database and cache
         try:
-            if trip_type == "road":
-                client.put_trip_by_doc_id(trip_id, RoadItinerary(**itinerary))
-            else:
-                client.put_trip_by_doc_id(trip_id, Trip(**itinerary))
+            await trip_repository.update(trip_id, trip)
         except Exception as db_error:
             print(f"Database update error: {db_error}")
-            # Continue even if database update fails
+            # Continue even if database update fails, keeping the new trip in the
+            # cache; marked dirty, so it is retried and never used as a diff base
+            await trip_repository.update_later(trip_id, trip)
+        await trip_updates.publish(trip_id, current_trip_data, trip.model_dump(mode="json"))
         
         # Send success response
         await websocket.send_json({
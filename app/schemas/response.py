@@ -1,8 +1,17 @@
 from typing import Dict, Any
 from fastapi.responses import JSONResponse
 from fastapi import status 
+import orjson
 
-class ResponseBody(JSONResponse):
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, which also serializes datetimes natively."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ResponseBody(FastJSONResponse):
     def __init__(self, response: Dict[str, Any], message: str = "", status_code: int = status.HTTP_200_OK):
         content = {
             "status_code": status_code,
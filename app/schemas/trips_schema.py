@@ -111,3 +111,14 @@ class TripSaveRequest(BaseModel):
     is_group: bool
     preference_id: Optional[int] = None
 
+class TripSummary(BaseModel):
+    """What list and preview screens need, without days, activities or photos."""
+    id: str
+    name: str
+    start_date: datetime | str | None = None
+    end_date: datetime | str | None = None
+    trip_type: Optional[str] = None
+    country: str | None = None
+    city: str | None = None
+    is_group: bool = False
+    day_count: int = 0
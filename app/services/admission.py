@@ -0,0 +1,158 @@
+"""Admission control for work that ends up on the recommendations service.
+
+Trip creations and regenerations take a slot of ``upstream_admission``
+for as long as they wait on the recommendations service. At most
+ADMISSION_LIMIT of them run at once; up to ADMISSION_QUEUE_SIZE more wait
+for a slot, in arrival order, for at most ADMISSION_MAX_WAIT seconds.
+Anything beyond that is rejected at once with AdmissionRejected, which
+tells the client when to retry, rather than piling onto a saturated
+upstream until everyone times out.
+
+Background trip jobs take their slot in the worker, so they share the same
+bound; their submission is refused up front while the limiter is
+saturated. ``stats()`` exports the queue depth and wait times
+(GET /api/admission).
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional
+import asyncio
+import math
+import os
+import time
+
+ADMISSION_LIMIT = int(os.getenv("ADMISSION_LIMIT", 20))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 50))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 10))
+# wait times kept for the percentiles in stats()
+ADMISSION_WAIT_SAMPLES = 500
+
+
+class AdmissionRejected(Exception):
+    """No slot is free and the wait queue is full, or the wait timed out."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"{reason}, retry in {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    def __init__(
+        self,
+        limit: int = ADMISSION_LIMIT,
+        max_queue: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._waits: Deque[float] = deque(maxlen=ADMISSION_WAIT_SAMPLES)
+        # moving average of how long a slot is held, for Retry-After
+        self._hold = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queued = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        """Every slot is taken and the wait queue is full."""
+        return self.active >= self.limit and len(self._waiters) >= self.max_queue
+
+    def check(self):
+        """Raise AdmissionRejected if a request arriving now would be."""
+        if self.saturated:
+            self.rejected += 1
+            raise AdmissionRejected("Too many requests", self.retry_after())
+
+    def retry_after(self) -> int:
+        """Seconds until the work queued now is likely to be done."""
+        return max(1, math.ceil(self._hold * (self.queued + 1) / max(1, self.limit)))
+
+    @asynccontextmanager
+    async def admit(self, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block, waiting at most
+        ``max_wait`` seconds (default ADMISSION_MAX_WAIT) for it; raises
+        AdmissionRejected."""
+        await self._acquire(self.max_wait if max_wait is None else max_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold += (time.monotonic() - started - self._hold) * 0.1
+            self._release()
+
+    async def _acquire(self, max_wait: float):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._admit(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("Too many requests", self.retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        started = time.monotonic()
+        try:
+            # the slot is handed over by _release, active is not decremented
+            await asyncio.wait_for(asyncio.shield(waiter), max_wait)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise AdmissionRejected("Timed out waiting for a free slot", self.retry_after())
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self._admit(time.monotonic() - started)
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # the slot was handed over just as the wait ended, pass it on
+            self._release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _admit(self, waited: float):
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _wait_quantile(self, q: float) -> float:
+        if not self._waits:
+            return 0.0
+        ordered = sorted(self._waits)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_p50": self._wait_quantile(0.5),
+            "wait_p99": self._wait_quantile(0.99),
+            "retry_after": self.retry_after(),
+        }
+
+
+upstream_admission = AdmissionLimiter()
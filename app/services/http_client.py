@@ -0,0 +1,86 @@
+from app.services.resilience import CircuitBreaker, LatencyTracker, ResilientTransport
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Optional
+import httpx
+import os
+
+RECOMMENDATIONS_URL = os.getenv("RECOMMENDATIONS_URL", "http://recommendations:8080")
+USER_MANAGEMENT_URL = os.getenv("USER_MANAGEMENT_URL", "http://user-management:8080")
+
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", 10))
+
+
+def _limits(prefix: str, max_connections: int, max_keepalive: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", max_connections)),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", max_keepalive)),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _no_cookie_jar() -> CookieJar:
+    # The clients are shared by every user, so Set-Cookie headers coming back
+    # from upstreams must never be stored and replayed on someone else's call.
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+def auth_headers(voyage_cookie: Optional[str]) -> Optional[dict]:
+    """Forward the caller's authentication cookie to an upstream service."""
+    return {"Cookie": f"voyage_at={voyage_cookie}"} if voyage_cookie else None
+
+
+class HTTPClients:
+    """Application-wide keep-alive HTTP clients, one connection pool per upstream.
+
+    Created and closed through the FastAPI lifespan; handlers use
+    ``http_clients.recommendations`` and ``http_clients.user_management``.
+    Each client goes through a ResilientTransport (circuit breaker and
+    adaptive timeouts), whose state outlives a restart of the clients.
+    """
+
+    def __init__(self):
+        self.recommendations: Optional[httpx.AsyncClient] = None
+        self.user_management: Optional[httpx.AsyncClient] = None
+        self.breakers = {"recommendations": CircuitBreaker(), "user_management": CircuitBreaker()}
+        self.latencies = {"recommendations": LatencyTracker(), "user_management": LatencyTracker()}
+
+    def _transport(self, upstream: str, limits: httpx.Limits) -> ResilientTransport:
+        return ResilientTransport(
+            upstream,
+            httpx.AsyncHTTPTransport(limits=limits),
+            self.breakers[upstream],
+            self.latencies[upstream],
+        )
+
+    async def start(self):
+        # the limits belong to the transport once one is given
+        self.recommendations = httpx.AsyncClient(
+            base_url=RECOMMENDATIONS_URL,
+            transport=self._transport("recommendations", _limits("RECOMMENDATIONS", 50, 20)),
+            timeout=HTTP_DEFAULT_TIMEOUT,
+            cookies=_no_cookie_jar(),
+        )
+        self.user_management = httpx.AsyncClient(
+            base_url=USER_MANAGEMENT_URL,
+            transport=self._transport("user_management", _limits("USER_MANAGEMENT", 100, 20)),
+            timeout=HTTP_DEFAULT_TIMEOUT,
+            cookies=_no_cookie_jar(),
+        )
+
+    def stats(self) -> dict:
+        """Circuit state and observed latencies of each upstream."""
+        return {
+            upstream: {**breaker.stats(), "operations": self.latencies[upstream].stats()}
+            for upstream, breaker in self.breakers.items()
+        }
+
+    async def close(self):
+        for client in (self.recommendations, self.user_management):
+            if client is not None:
+                await client.aclose()
+        self.recommendations = None
+        self.user_management = None
+
+
+http_clients = HTTPClients()
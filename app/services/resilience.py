@@ -0,0 +1,244 @@
+"""Circuit breaking and adaptive timeouts for calls to an upstream service.
+
+``ResilientTransport`` wraps the transport of an upstream's httpx client:
+
+* a ``CircuitBreaker`` counts consecutive failures (transport errors,
+  timeouts and 5xx answers). After UPSTREAM_FAILURE_THRESHOLD of them the
+  circuit opens and calls fail at once with CircuitOpenError, instead of
+  each waiting out its timeout. After UPSTREAM_OPEN_SECONDS one trial call
+  is let through (half-open); it closes the circuit again or re-opens it.
+* ``LatencyTracker`` keeps the latest latencies of each operation (method
+  and path, ids left out) and caps the read timeout of a call at
+  UPSTREAM_TIMEOUT_FACTOR times their UPSTREAM_TIMEOUT_PERCENTILE. The
+  timeout the caller asked for remains the upper bound.
+
+Their ``stats()`` are reported for monitoring by GET /api/upstreams.
+"""
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+import asyncio
+import math
+import os
+import re
+import time
+
+import httpx
+
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", 5))
+UPSTREAM_OPEN_SECONDS = float(os.getenv("UPSTREAM_OPEN_SECONDS", 30))
+UPSTREAM_LATENCY_SAMPLES = int(os.getenv("UPSTREAM_LATENCY_SAMPLES", 200))
+# latencies observed before the timeout of an operation adapts
+UPSTREAM_MIN_SAMPLES = int(os.getenv("UPSTREAM_MIN_SAMPLES", 20))
+UPSTREAM_TIMEOUT_PERCENTILE = float(os.getenv("UPSTREAM_TIMEOUT_PERCENTILE", 0.99))
+UPSTREAM_TIMEOUT_FACTOR = float(os.getenv("UPSTREAM_TIMEOUT_FACTOR", 2))
+UPSTREAM_MIN_TIMEOUT = float(os.getenv("UPSTREAM_MIN_TIMEOUT", 2))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+# path segments that identify a resource (ObjectIds, numbers, user tags)
+_ID_SEGMENT = re.compile(r"^(?:[0-9a-f]{24}|\d+|@.*)$")
+
+
+class CircuitOpenError(httpx.TransportError):
+    """The upstream's circuit is open, the call was not made."""
+
+    def __init__(self, upstream: str, retry_after: float, request: Optional[httpx.Request] = None):
+        super().__init__(f"{upstream} is unavailable, retry in {retry_after:.0f} s", request=request)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def upstream_name(upstream: str) -> str:
+    """How messages name an upstream: "user_management" -> "User-management"."""
+    return upstream.replace("_", "-").capitalize()
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = UPSTREAM_FAILURE_THRESHOLD,
+        open_seconds: float = UPSTREAM_OPEN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+        self._trial_running = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; a True in half-open state is the trial."""
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def release(self):
+        """A call was abandoned (cancelled) without an outcome."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = self.clock()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_after": round(self.retry_after(), 3) if self.state == OPEN else 0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """The latest latencies of each operation and the timeouts derived from them."""
+
+    def __init__(
+        self,
+        samples: int = UPSTREAM_LATENCY_SAMPLES,
+        min_samples: int = UPSTREAM_MIN_SAMPLES,
+        percentile: float = UPSTREAM_TIMEOUT_PERCENTILE,
+        factor: float = UPSTREAM_TIMEOUT_FACTOR,
+        min_timeout: float = UPSTREAM_MIN_TIMEOUT,
+    ):
+        self.samples = samples
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    @staticmethod
+    def operation(request: httpx.Request) -> str:
+        segments = ["{id}" if _ID_SEGMENT.match(s) else s for s in request.url.path.split("/")]
+        return f"{request.method} {'/'.join(segments)}"
+
+    def record(self, operation: str, latency: float):
+        self._latencies.setdefault(operation, deque(maxlen=self.samples)).append(latency)
+
+    def quantile(self, operation: str, q: float) -> Optional[float]:
+        latencies = self._latencies.get(operation)
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def timeout(self, operation: str) -> Optional[float]:
+        """The adapted timeout of the operation, None until enough calls were seen."""
+        latencies = self._latencies.get(operation)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return max(self.min_timeout, self.quantile(operation, self.percentile) * self.factor)
+
+    def stats(self) -> dict:
+        return {
+            operation: {
+                "samples": len(latencies),
+                "p50": self.quantile(operation, 0.5),
+                "p99": self.quantile(operation, 0.99),
+                "timeout": self.timeout(operation),
+            }
+            for operation, latencies in self._latencies.items()
+        }
+
+
+class _ObservedStream(httpx.AsyncByteStream):
+    """A response body that reports when it was read to the end, or failed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[bool], None]):
+        self.stream = stream
+        self.done = done
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        except Exception:
+            self.done(False)
+            raise
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.done(True)
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        upstream: str,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        latency: Optional[LatencyTracker] = None,
+    ):
+        self.upstream = upstream
+        self.transport = transport
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.upstream, self.breaker.retry_after(), request)
+        operation = self.latency.operation(request)
+        adapted = self.latency.timeout(operation)
+        timeouts = request.extensions.get("timeout")
+        if adapted is not None and timeouts is not None:
+            read = timeouts.get("read")
+            request.extensions["timeout"] = {**timeouts, "read": adapted if read is None else min(read, adapted)}
+        started = time.monotonic()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            return response
+        finished = False
+
+        def done(succeeded: bool):
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            if succeeded:
+                self.latency.record(operation, time.monotonic() - started)
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        if isinstance(response.stream, httpx.ByteStream):
+            done(True)  # the body is already in memory
+        else:
+            # measured to the end of the body, a streamed itinerary included
+            response.stream = _ObservedStream(response.stream, done)
+        return response
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
@@ -0,0 +1,124 @@
+"""Per-key request coalescing ("single flight").
+
+When many callers miss the cache for the same key at once, only the first
+one loads it; the others await that load and share its result:
+
+    itinerary = await single_flight.do(trip_id, lambda: load_from_mongo(trip_id))
+
+Within a process the callers share an asyncio task. Given a RedisClient,
+``do`` also takes a short-lived lock (SET NX) so that only one replica
+loads a key; the other replicas poll ``recheck`` (usually a cache read)
+until the lock holder has stored the result, and only load it themselves
+if the lock expires or is released without a result.
+"""
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from uuid import uuid4
+import asyncio
+import os
+
+from redis.exceptions import RedisError, WatchError
+
+from app.database.CacheClient import RedisClient
+
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", 10))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", 0.05))
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent loads of the same key; ``loads`` and ``shared``
+    count the loads run and the callers that reused another one's result."""
+
+    def __init__(
+        self,
+        cache: Optional[RedisClient] = None,
+        lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL,
+        poll_interval: float = SINGLE_FLIGHT_POLL_INTERVAL,
+        prefix: str = "single-flight:",
+    ):
+        self.cache = cache
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.loads = 0
+        self.shared = 0
+
+    async def do(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[T]],
+        recheck: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+    ) -> T:
+        """Return ``load()``, running it at most once at a time per key.
+
+        ``recheck`` enables the Redis lock: it returns the result once another
+        replica has stored it, or None.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(self._load(key, load, recheck))
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self.shared += 1
+        # a cancelled caller must not cancel the load the others are waiting for
+        return await asyncio.shield(call)
+
+    def _done(self, key: str, call: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            call.exception()  # retrieved here in case every caller was cancelled
+
+    async def _load(self, key, load, recheck):
+        if self.cache is None or recheck is None:
+            self.loads += 1
+            return await load()
+
+        lock_key = self.prefix + key
+        token = uuid4().hex
+        try:
+            # SET NX answers None when another replica holds the lock
+            acquired = bool(
+                await self.cache.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            )
+        except RedisError as e:
+            print(f"Single-flight lock unavailable, loading {key} without it: {e}")
+            self.loads += 1
+            return await load()
+        if acquired:
+            self.loads += 1
+            try:
+                return await load()
+            finally:
+                await self._release(lock_key, token)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            released = not await self.cache.redis.exists(lock_key)
+            result = await recheck()
+            if result is not None:
+                self.shared += 1
+                return result
+            if released:
+                break
+        self.loads += 1
+        return await load()
+
+    async def _release(self, lock_key: str, token: str):
+        # delete the lock only if it is still ours, it may have expired and
+        # been taken by another replica in the meantime
+        try:
+            async with self.cache.pipeline(transaction=True) as pipe:
+                await pipe.watch(lock_key)
+                current = await pipe.get(lock_key)
+                if current in (token, token.encode()):
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    await pipe.execute()
+        except (RedisError, WatchError) as e:
+            print(f"Could not release single-flight lock {lock_key}: {e}")
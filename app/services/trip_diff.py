@@ -0,0 +1,158 @@
+"""Structural diff of itinerary documents into MongoDB update operators.
+
+Editing one activity should not rewrite the whole trip. ``partial_update``
+compares the previous version of a trip with the new one and returns a
+``$set``/``$unset`` update touching only the changed paths, for example::
+
+    {"$set": {"days.2.morning_activities.1.start_time": "2025-07-12T10:00:00"}}
+
+Lists of the same length are compared element by element; a list that
+grew or shrank is set as a whole, since MongoDB has no way to truncate an
+array through a path.
+
+``json_patch`` describes the same change as an RFC 6902 JSON Patch, for
+clients holding a copy of the itinerary. It has no such restriction on
+lists, so an activity inserted or removed is a single ``add``/``remove``.
+"""
+from typing import Any, List, Optional, Tuple, Union
+
+import orjson
+
+Path = Tuple[Union[str, int], ...]
+
+
+def _same(old: Any, new: Any) -> bool:
+    # True == 1 and 1 == 1.0 in Python, but not in BSON, so containers are
+    # always walked instead of compared with ==
+    if isinstance(old, (dict, list)):
+        return old is new
+    return type(old) is type(new) and old == new
+
+
+def _is_path_safe(value: dict) -> bool:
+    """Keys with dots or a leading $ cannot be addressed by a dotted path."""
+    return all(isinstance(k, str) and k and "." not in k and not k.startswith("$") for k in value)
+
+
+def diff_paths(old: Any, new: Any, path: Path = ()) -> Tuple[List[Path], List[Path]]:
+    """Paths to set and paths to unset to turn ``old`` into ``new``."""
+    if _same(old, new):
+        return [], []
+    if isinstance(old, dict) and isinstance(new, dict) and _is_path_safe(old) and _is_path_safe(new):
+        set_paths, unset_paths = [], []
+        for key, value in new.items():
+            if key not in old:
+                set_paths.append(path + (key,))
+            else:
+                child_set, child_unset = diff_paths(old[key], value, path + (key,))
+                set_paths += child_set
+                unset_paths += child_unset
+        unset_paths += [path + (key,) for key in old if key not in new]
+        return set_paths, unset_paths
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        set_paths, unset_paths = [], []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            child_set, child_unset = diff_paths(old_item, new_item, path + (index,))
+            set_paths += child_set
+            unset_paths += child_unset
+        return set_paths, unset_paths
+    return [path], []
+
+
+def _dotted(path: Path) -> str:
+    return ".".join(str(part) for part in path)
+
+
+def _value_at(document: Any, path: Path) -> Any:
+    for part in path:
+        document = document[part]
+    return document
+
+
+def _size(document: dict) -> int:
+    return len(orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS))
+
+
+def partial_update(previous: dict, current: dict, values: Optional[dict] = None) -> Optional[dict]:
+    """Update operators turning ``previous`` into ``current``.
+
+    ``previous`` and ``current`` are compared as JSON-mode dumps (as cached);
+    ``values`` is the document that will be stored (``model_dump()``, with
+    datetimes) and provides the values to set, defaulting to ``current``.
+    Returns ``{}`` when nothing changed and None when the update would be
+    larger than ``values`` itself, in which case a full rewrite is cheaper.
+    """
+    values = current if values is None else values
+    set_paths, unset_paths = diff_paths(previous, current)
+    if set_paths == [()]:
+        return None  # the documents have nothing in common
+    update = {}
+    if set_paths:
+        update["$set"] = {_dotted(p): _value_at(values, p) for p in set_paths}
+    if unset_paths:
+        update["$unset"] = {_dotted(p): "" for p in unset_paths}
+    if update and _size(update) >= _size(values):
+        return None
+    return update
+
+
+def _equal(old: Any, new: Any) -> bool:
+    """Deep equality that, like BSON and JSON, tells True from 1 and 1 from 1.0."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        return old.keys() == new.keys() and all(_equal(old[k], new[k]) for k in old)
+    if isinstance(old, list) and isinstance(new, list):
+        return len(old) == len(new) and all(_equal(a, b) for a, b in zip(old, new))
+    return type(old) is type(new) and old == new
+
+
+def _pointer(pointer: str, key: Union[str, int]) -> str:
+    return f"{pointer}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def _list_patch(old: list, new: list, pointer: str) -> List[dict]:
+    # only the middle that differs is patched, so an element inserted or
+    # removed does not shift every following one into a replace
+    start = 0
+    while start < min(len(old), len(new)) and _equal(old[start], new[start]):
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and _equal(old[old_end - 1], new[new_end - 1]):
+        old_end -= 1
+        new_end -= 1
+    common = min(old_end, new_end) - start
+    ops = []
+    for index in range(start, start + common):
+        ops += _patch(old[index], new[index], _pointer(pointer, index))
+    # removed from the last, so the indices of the others stay valid
+    for index in reversed(range(start + common, old_end)):
+        ops.append({"op": "remove", "path": _pointer(pointer, index)})
+    for index in range(start + common, new_end):
+        ops.append({"op": "add", "path": _pointer(pointer, index), "value": new[index]})
+    return ops
+
+
+def _patch(old: Any, new: Any, pointer: str) -> List[dict]:
+    if _equal(old, new):
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": _pointer(pointer, key)} for key in old if key not in new]
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(pointer, key), "value": value})
+            else:
+                ops += _patch(old[key], value, _pointer(pointer, key))
+    elif isinstance(old, list) and isinstance(new, list):
+        ops = _list_patch(old, new, pointer)
+    else:
+        return [{"op": "replace", "path": pointer, "value": new}]
+    # an activity that changed everywhere is smaller replaced as a whole
+    replace = [{"op": "replace", "path": pointer, "value": new}]
+    if len(ops) > 1 and _size(ops) >= _size(replace):
+        return replace
+    return ops
+
+
+def json_patch(previous: Any, current: Any) -> List[dict]:
+    """JSON Patch operations turning ``previous`` into ``current`` (both
+    JSON-mode documents), ``[]`` when they are equal."""
+    return _patch(previous, current, "")
@@ -0,0 +1,59 @@
+"""Trip creation events delivered through Redis pub/sub.
+
+Whichever process runs a trip's pipeline publishes its progress, success
+and error events (the JSON messages the websocket clients receive) on the
+trip's channel; the process holding the client's websocket subscribes to
+it and relays them. The two need not be the same worker or replica.
+
+Pub/sub does not keep messages, so the relaying side subscribes before the
+pipeline is started.
+"""
+from app.database.CacheClient import RedisClient
+from contextlib import asynccontextmanager
+from redis.exceptions import RedisError
+from typing import AsyncIterator
+import orjson
+
+# the events that end a trip creation
+FINAL_EVENTS = ("success", "error")
+
+
+class TripEvents:
+    def __init__(self, cache: RedisClient = None, prefix: str = "trip-events:"):
+        self.cache = cache or RedisClient(decode_responses=False)
+        self.prefix = prefix
+
+    def channel(self, trip_id: str) -> str:
+        return self.prefix + trip_id
+
+    async def publish(self, trip_id: str, event: dict) -> bool:
+        """Send an event to whoever relays the trip; False if Redis failed."""
+        try:
+            await self.cache.redis.publish(self.channel(trip_id), orjson.dumps(event))
+            return True
+        except RedisError as e:
+            print(f"Could not publish {event.get('type')} event of trip {trip_id}: {e}")
+            return False
+
+    @asynccontextmanager
+    async def subscribe(self, trip_id: str, until_final: bool = True) -> AsyncIterator[AsyncIterator[bytes]]:
+        """Subscribed to the trip's channel, the events as they arrive (JSON),
+        up to and including the final one unless ``until_final`` is False."""
+        pubsub = self.cache.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel(trip_id))
+            yield self._events(pubsub, until_final)
+        finally:
+            await pubsub.aclose()
+
+    @staticmethod
+    async def _events(pubsub, until_final: bool) -> AsyncIterator[bytes]:
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            yield message["data"]
+            if until_final and orjson.loads(message["data"]).get("type") in FINAL_EVENTS:
+                return
+
+
+trip_events = TripEvents()
@@ -0,0 +1,231 @@
+"""Trip creation as background jobs.
+
+``POST /api/trips?job=true`` answers 202 with a job id instead of holding
+the request open for the recommendations call. The job waits in a bounded
+queue for one of TRIP_JOB_WORKERS workers, which run the same pipeline as
+the synchronous endpoint (trip_pipeline.create_trip). Each job's status is
+a JSON record in Redis, kept TRIP_JOB_TTL seconds:
+
+    {"job_id", "trip_id", "status": queued|running|succeeded|failed,
+     "stage", "progress", "result", "error", "message", "updated_at"}
+
+so any replica can answer ``GET /api/jobs/{id}``. ``result`` is what the
+synchronous endpoint would have answered with. Every change is also
+published as a websocket event on the trip's channel (see trip_events),
+including a ``day`` event for each day of the itinerary as the
+recommendations service streams it.
+
+Workers hold a slot of the upstream admission limiter (see admission)
+while they run the pipeline, and jobs are not accepted while it is
+saturated.
+"""
+from app.database.CacheClient import RedisClient
+from app.schemas.forms_schema import Form
+from app.services.admission import AdmissionLimiter, AdmissionRejected, upstream_admission
+from app.services.trip_events import TripEvents, trip_events
+from app.services.trip_pipeline import RecommendationsError, UserManagementError, create_trip
+from redis.exceptions import RedisError
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+import asyncio
+import orjson
+import os
+
+TRIP_JOB_WORKERS = int(os.getenv("TRIP_JOB_WORKERS", 4))
+TRIP_JOB_QUEUE_SIZE = int(os.getenv("TRIP_JOB_QUEUE_SIZE", 100))
+TRIP_JOB_TTL = int(os.getenv("TRIP_JOB_TTL", 3600))
+# no client connection waits on a job, so it can wait longer than POST /trips
+TRIP_JOB_TIMEOUT = float(os.getenv("TRIP_JOB_TIMEOUT", 60))
+
+# what websocket clients are told about each stage
+STAGE_MESSAGES = {
+    "recommendations": "Calling recommendations service...",
+    "caching": "Saving to cache...",
+    "preferences": "Adding creator as participant...",
+}
+
+# (job record, form, recommendation request, caller's voyage_at cookie)
+QueuedJob = Tuple[dict, Form, dict, Optional[str]]
+
+
+class JobQueueFull(Exception):
+    """Every worker is busy and the queue is full (or not started)."""
+
+
+class TripJobs:
+    """Bounded pool of trip creation workers, started and closed by the
+    FastAPI lifespan."""
+
+    def __init__(
+        self,
+        cache: Optional[RedisClient] = None,
+        workers: int = TRIP_JOB_WORKERS,
+        queue_size: int = TRIP_JOB_QUEUE_SIZE,
+        ttl: int = TRIP_JOB_TTL,
+        timeout: float = TRIP_JOB_TIMEOUT,
+        events: TripEvents = trip_events,
+        admission: AdmissionLimiter = upstream_admission,
+    ):
+        self.cache = cache or RedisClient(decode_responses=False)
+        self.events = events
+        self.admission = admission
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.timeout = timeout
+        self._queue: Optional["asyncio.Queue[QueuedJob]"] = None
+        self._tasks: List[asyncio.Task] = []
+        # jobs taken by a worker, by job id
+        self._running: Dict[str, dict] = {}
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    async def submit(self, forms: Form, request_body: dict, voyage_cookie: Optional[str]) -> dict:
+        """Queue the creation of the trip ``request_body`` asks for; the
+        job's first record. Raises AdmissionRejected or JobQueueFull."""
+        self.admission.check()
+        if self._queue is None or self._queue.full():
+            raise JobQueueFull()
+        job = {
+            "job_id": uuid4().hex,
+            "trip_id": request_body["trip_id"],
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0,
+            "result": None,
+            "error": None,
+            "message": "",
+        }
+        # stored first, so the job can be polled as soon as its id is known;
+        # if that fails the job is not run, nobody could poll it
+        await self.cache.set(self.key(job["job_id"]), self._encode(job), expire=self.ttl)
+        # the cookie is only kept in memory, never written to Redis
+        self._queue.put_nowait((job, forms, request_body, voyage_cookie))
+        return job
+
+    async def get(self, job_id: str) -> Optional[bytes]:
+        """The job's JSON record, None once it has expired."""
+        return await self.cache.get(self.key(job_id))
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers; jobs they did not finish are recorded as failed."""
+        unfinished = list(self._running.values())
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            unfinished.append(self._queue.get_nowait()[0])
+        self._queue = None
+        for job in unfinished:
+            await self._fail(job, "Service shutting down", "The service restarted before the trip was created")
+        self._running.clear()
+
+    def __len__(self) -> int:
+        """Jobs queued or running."""
+        return len(self._running) + (self._queue.qsize() if self._queue is not None else 0)
+
+    async def _work(self):
+        while True:
+            job, forms, request_body, voyage_cookie = await self._queue.get()
+            self._running[job["job_id"]] = job
+            try:
+                await self._run(job, forms, request_body, voyage_cookie)
+            finally:
+                self._running.pop(job["job_id"], None)
+                self._queue.task_done()
+
+    async def _run(self, job: dict, forms: Form, request_body: dict, voyage_cookie: Optional[str]):
+        async def progress(stage: str, percent: int):
+            job.update(status="running", stage=stage, progress=percent)
+            await self._save(job)
+            await self.events.publish(job["trip_id"], {
+                "type": "progress",
+                "message": STAGE_MESSAGES.get(stage, stage),
+                "progress": percent,
+                "trip_id": job["trip_id"],
+            })
+
+        async def on_day(index: int, day: dict):
+            # the days fill the progress between the request and caching
+            percent = min(79, 30 + 50 * (index + 1) // max(1, forms.duration))
+            job.update(status="running", stage="days", progress=percent)
+            await self._save(job)
+            await self.events.publish(job["trip_id"], {
+                "type": "day",
+                "message": f"Day {index + 1} is ready",
+                "progress": percent,
+                "trip_id": job["trip_id"],
+                "index": index,
+                "day": day,
+            })
+
+        try:
+            async with self.admission.admit(max_wait=self.timeout):
+                result = await create_trip(forms, request_body, voyage_cookie, self.timeout, progress, on_day)
+        except AdmissionRejected as e:
+            await self._fail(job, str(e), "Too many trips are being created")
+        except RecommendationsError as e:
+            print(f"Error from recommendations service: {e.text}")
+            await self._fail(job, e.text, "Error from recommendations service")
+        except UserManagementError as e:
+            print(f"Error from user-management service: {e.text}")
+            await self._fail(job, e.text, "User-management service error")
+        except Exception as e:
+            print(f"Error making request to recommendations service: {str(e)}")
+            await self._fail(job, str(e), "Error connecting to recommendations service")
+        else:
+            job.update(status="succeeded", stage="done", progress=100, result=result)
+            await self._save(job)
+            await self.events.publish(job["trip_id"], self.final_event(job))
+
+    async def _fail(self, job: dict, error: str, message: str):
+        # the stage is kept, it tells where the job failed
+        job.update(status="failed", error=error, message=message)
+        await self._save(job)
+        await self.events.publish(job["trip_id"], self.final_event(job))
+
+    @staticmethod
+    def final_event(job: dict) -> Optional[dict]:
+        """The success or error event of a finished job (record), None while
+        it is queued or running."""
+        if job["status"] == "succeeded":
+            return {
+                "type": "success",
+                "message": "Trip created successfully!",
+                "progress": 100,
+                "trip_id": job["trip_id"],
+                "data": job["result"],
+            }
+        if job["status"] == "failed":
+            return {
+                "type": "error",
+                "message": f"{job['message']}: {job['error']}",
+                "progress": job["progress"],
+                "trip_id": job["trip_id"],
+            }
+        return None
+
+    async def _save(self, job: dict):
+        try:
+            await self.cache.set(self.key(job["job_id"]), self._encode(job), expire=self.ttl)
+        except RedisError as e:
+            print(f"Could not record job {job['job_id']}: {e}")
+
+    @staticmethod
+    def _encode(job: dict) -> bytes:
+        # the result's itinerary is an orjson.Fragment, embedded as is
+        return orjson.dumps({**job, "updated_at": datetime.now(timezone.utc)})
+
+
+trip_jobs = TripJobs()
@@ -0,0 +1,325 @@
+from app.database.TripRepository import trip_repository
+from app.schemas.forms_schema import Form
+from app.schemas.trips_schema import Day, LatLong, RoadItinerary, Trip
+from app.services.http_client import auth_headers, http_clients
+from pydantic import BaseModel
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Union
+import orjson
+
+
+class RecommendationsError(Exception):
+    """The recommendations service answered with a non-200 status."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(text)
+        self.status_code = status_code
+        self.text = text
+
+
+class UserManagementError(Exception):
+    """User-management refused to store the trip's preferences."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(text)
+        self.status_code = status_code
+        self.text = text
+
+
+# called with the stage a trip creation has reached and its progress in %
+Progress = Callable[[str, int], Awaitable[None]]
+# called with the index and the JSON of each day as the itinerary streams in
+OnDay = Callable[[int, dict], Awaitable[None]]
+
+NDJSON = "application/x-ndjson"
+
+
+# The recommendations service does not send the fields this service fills in
+# itself (trip_type, ...), so its itineraries are validated against
+# variants where they are optional.
+class UpstreamTrip(Trip):
+    trip_type: Optional[str] = None
+
+
+class UpstreamRoadItinerary(RoadItinerary):
+    trip_type: Optional[str] = None
+
+
+class TripEnvelope(BaseModel):
+    itinerary: UpstreamTrip
+
+
+class RoadItineraryEnvelope(BaseModel):
+    itinerary: UpstreamRoadItinerary
+
+
+class GeneratedTrip:
+    """A validated itinerary and its JSON encoding, produced exactly once."""
+
+    def __init__(self, trip_id: str, itinerary: Union[Trip, RoadItinerary]):
+        self.trip_id = trip_id
+        self.itinerary = itinerary
+        self.itinerary_json: bytes = itinerary.model_dump_json().encode()
+
+
+def parse_start_date(start_date: str) -> datetime:
+    """Parse the form's ISO start date, accepting a trailing Z for UTC."""
+    if start_date.endswith('Z'):
+        return datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+    return datetime.fromisoformat(start_date)
+
+
+def build_recommendation_request(forms: Form, trip_id: str) -> dict:
+    """Request body for POST /trip on the recommendations service.
+
+    Raises ValueError/TypeError when the form's start date can't be parsed.
+    """
+    questionnaire = [
+        {"question_id": q.question_id, "value": q.value, "type": "scale"}
+        for q in forms.preferences.questions
+    ]
+    start_date = parse_start_date(forms.startDate)
+    # Ensure duration is at least 1 day
+    end_date = start_date + timedelta(days=max(1, forms.duration))
+    return {
+        "trip_id": trip_id,
+        "questionnaire": questionnaire,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "budget": forms.budget,
+        # adding the display name as attribute to the trip
+        "name": forms.display_name,
+        "must_visit_places": [mvp.model_dump() for mvp in forms.must_visit_places],
+        "keywords": forms.keywords,
+        "country": forms.country,
+        "city": forms.city,
+        "is_group": forms.is_group,
+        "data": forms.data_type.model_dump(),
+        "tripType": forms.tripType.value,
+    }
+
+
+def parse_itinerary_json(trip_type: str, content: bytes) -> Union[Trip, RoadItinerary]:
+    """Validate a recommendations response body straight from its bytes."""
+    envelope = RoadItineraryEnvelope if trip_type == "road" else TripEnvelope
+    return envelope.model_validate_json(content).itinerary
+
+
+def apply_form_overrides(itinerary: Union[Trip, RoadItinerary], forms: Form):
+    """Fill in what this service knows better than the recommendations service."""
+    trip_type = forms.tripType.value
+    itinerary.trip_type = trip_type
+    itinerary.country = forms.country
+    itinerary.city = forms.city
+    # Store original location data for regeneration
+    itinerary.original_place_data = forms.data_type.model_dump()
+
+    # Extract and store coordinates based on trip type
+    data = forms.data_type
+    if trip_type == "zone":
+        itinerary.center_coordinates = LatLong(
+            latitude=data.center.latitude, longitude=data.center.longitude
+        )
+    elif trip_type == "place":
+        itinerary.place_coordinates = LatLong(
+            latitude=data.coordinates.latitude, longitude=data.coordinates.longitude
+        )
+    elif trip_type == "road":
+        itinerary.origin_coordinates = LatLong(
+            latitude=data.origin.location.latitude, longitude=data.origin.location.longitude
+        )
+        itinerary.destination_coordinates = LatLong(
+            latitude=data.destination.location.latitude,
+            longitude=data.destination.location.longitude,
+        )
+
+
+# what this service keeps about a trip that the recommendations service
+# does not send back when it edits one (see apply_form_overrides)
+SERVICE_FIELDS = (
+    "name",
+    "trip_type",
+    "country",
+    "city",
+    "is_group",
+    "original_place_data",
+    "center_coordinates",
+    "place_coordinates",
+    "origin_coordinates",
+    "destination_coordinates",
+)
+
+
+def restore_service_fields(itinerary: dict, current: dict) -> dict:
+    """Copy the fields this service owns from the stored version of a trip
+    (``current``) onto an itinerary the recommendations service edited."""
+    for field in SERVICE_FIELDS:
+        if field in current:
+            itinerary[field] = current[field]
+    return itinerary
+
+
+async def request_recommendations(request_body: dict, timeout: float, on_day: Optional[OnDay] = None) -> bytes:
+    """POST /trip on the recommendations service; the response body.
+
+    With ``on_day`` the itinerary is asked for as a stream, see
+    stream_recommendations.
+    """
+    if on_day is not None:
+        return await stream_recommendations(request_body, timeout, on_day)
+    response = await http_clients.recommendations.post(
+        "/trip", json=request_body, timeout=timeout
+    )
+    if response.status_code != 200:
+        raise RecommendationsError(response.status_code, response.text)
+    return response.content
+
+
+async def stream_recommendations(request_body: dict, timeout: float, on_day: OnDay) -> bytes:
+    """POST /trip accepting an NDJSON stream of the itinerary, one line per
+    day as it is generated and the itinerary last:
+
+        {"day": {...}}
+        {"day": {...}}
+        {"itinerary": {...}}        (its "days" may be left out)
+
+    Each day is validated and passed to ``on_day`` as soon as its line
+    arrives. An upstream that answers with plain JSON is read as a single
+    response. Returns the itinerary as request_recommendations does.
+    """
+    async with http_clients.recommendations.stream(
+        "POST",
+        "/trip",
+        json=request_body,
+        timeout=timeout,
+        headers={"Accept": f"{NDJSON}, application/json"},
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()
+            raise RecommendationsError(response.status_code, response.text)
+        if not response.headers.get("content-type", "").startswith(NDJSON):
+            # the upstream does not stream
+            return await response.aread()
+        days = []
+        itinerary = None
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = orjson.loads(line)
+            if "day" in chunk:
+                day = Day.model_validate(chunk["day"])
+                days.append(chunk["day"])
+                await on_day(len(days) - 1, day.model_dump(mode="json"))
+            elif "itinerary" in chunk:
+                itinerary = chunk["itinerary"]
+            elif "error" in chunk:
+                raise RecommendationsError(response.status_code, str(chunk["error"]))
+    if itinerary is None:
+        raise RecommendationsError(response.status_code, "The itinerary stream ended without the itinerary")
+    if not itinerary.get("days"):
+        itinerary["days"] = days
+    return orjson.dumps({"itinerary": itinerary})
+
+
+async def generate_trip(
+    forms: Form, request_body: dict, timeout: float, on_day: Optional[OnDay] = None
+) -> GeneratedTrip:
+    """Ask the recommendations service for an itinerary matching the form.
+
+    The response is validated once from its raw bytes, the form overrides are
+    applied to the resulting model, and it is serialized once; the encoding
+    is shared by the cache and the client response. ``on_day`` streams the
+    days of a (non-road) itinerary as they are generated.
+
+    Every trip is requested under its own trip id, even when an identical
+    request was made moments ago: the recommendations service keeps each
+    itinerary by trip id for the activity edits, so an itinerary it
+    generated for another trip could not be edited.
+    """
+    if forms.tripType.value == "road":
+        on_day = None  # road itineraries have stops, not days
+    content = await request_recommendations(request_body, timeout, on_day)
+    itinerary = parse_itinerary_json(forms.tripType.value, content)
+    apply_form_overrides(itinerary, forms)
+    itinerary.name = request_body["name"]
+    return GeneratedTrip(request_body["trip_id"], itinerary)
+
+
+async def save_preferences(forms: Form, questionnaire: list, voyage_cookie: str) -> Optional[int]:
+    """The preference id to attach to a logged-in user's new trip, reusing
+    the one given in the form or creating it in user-management."""
+    # Check if an existing preference_id was provided (for reused preferences)
+    if getattr(forms, "preference_id", None):
+        print(f"Using existing preference ID: {forms.preference_id}")
+        return forms.preference_id
+    preferences = {
+        "name": forms.preferences.preferencesName,
+        "answers": [
+            {"answer": {"value": q["value"]}, "question_id": q["question_id"]}
+            for q in questionnaire
+        ],
+    }
+    response = await http_clients.user_management.post(
+        "/preferences",
+        json=preferences,
+        timeout=10,
+        headers=auth_headers(voyage_cookie),
+    )
+    if response.status_code != 200 and response.status_code != 409:
+        raise UserManagementError(response.status_code, response.text)
+    preference_id = response.json()["response"]["id"]
+    print(f"Created new preference ID: {preference_id}")
+    return preference_id
+
+
+async def add_creator(trip_id: str, forms: Form, preference_id: Optional[int], voyage_cookie: str):
+    """Add the logged-in user as the first participant of the trip."""
+    user_trip_data = {"trip_id": trip_id, "is_group": bool(forms.is_group)}
+    if preference_id:
+        user_trip_data["preference_id"] = preference_id
+    response = await http_clients.user_management.post(
+        "/trips/save",
+        json=user_trip_data,
+        headers=auth_headers(voyage_cookie),
+        timeout=10,
+    )
+    if response.status_code != 200:
+        print(f"Failed to add creator as participant: {response.text}")
+
+
+async def create_trip(
+    forms: Form,
+    request_body: dict,
+    voyage_cookie: Optional[str],
+    timeout: float,
+    progress: Optional[Progress] = None,
+    on_day: Optional[OnDay] = None,
+) -> dict:
+    """Generate a trip, cache it as a draft and, for a logged-in user, save
+    the preferences and the user as participant.
+
+    Returns the body POST /trips answers with. Raises RecommendationsError
+    and UserManagementError; ``progress`` is told about each stage and
+    ``on_day`` about each day as it streams in (see generate_trip).
+    """
+    async def report(stage: str, percent: int):
+        if progress is not None:
+            await progress(stage, percent)
+
+    await report("recommendations", 30)
+    generated = await generate_trip(forms, request_body, timeout, on_day)
+    await report("caching", 80)
+    await trip_repository.cache_draft(
+        generated.trip_id, generated.itinerary, generated.itinerary_json
+    )
+    preference_id = None
+    if voyage_cookie:
+        await report("preferences", 90)
+        preference_id = await save_preferences(forms, request_body["questionnaire"], voyage_cookie)
+        await add_creator(generated.trip_id, forms, preference_id, voyage_cookie)
+    # the itinerary is sent as the JSON it was cached with, not re-serialized
+    return {
+        "itinerary": orjson.Fragment(generated.itinerary_json),
+        "tripId": generated.trip_id,
+        "preference_id": preference_id,
+    }
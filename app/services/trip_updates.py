@@ -0,0 +1,126 @@
+"""Versioned itinerary updates for the websockets watching a trip.
+
+When a trip changes, its watchers receive either a JSON Patch against the
+version they hold or, when a patch cannot be trusted or is not smaller, a
+full snapshot:
+
+    {"type": "patch", "trip_id", "version": 8, "base_version": 7, "patch": [...]}
+    {"type": "snapshot", "trip_id", "version": 8, "itinerary": {...}}
+
+Redis keeps each trip's current version and a digest of the itinerary it
+names (``trip-version:<trip_id>``). A patch is only published when the
+itinerary it was computed from is that version, so a client that applied
+``base_version`` can apply it; a client that sees any other
+``base_version`` has missed an update and asks for a snapshot.
+"""
+from app.database.CacheClient import RedisClient
+from app.database.TripRepository import trip_repository
+from app.services.trip_diff import json_patch
+from app.services.trip_events import TripEvents, trip_events
+from redis.exceptions import RedisError, WatchError
+from typing import Optional
+import hashlib
+import orjson
+import os
+
+TRIP_VERSION_TTL = int(os.getenv("TRIP_VERSION_TTL", 604800))
+
+
+def itinerary_digest(itinerary: dict) -> str:
+    return hashlib.sha256(orjson.dumps(itinerary, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class TripUpdates:
+    def __init__(self, cache: Optional[RedisClient] = None, events: TripEvents = trip_events, attempts: int = 3):
+        self.cache = cache or RedisClient(decode_responses=False)
+        self.events = events
+        self.attempts = attempts
+
+    @staticmethod
+    def key(trip_id: str) -> str:
+        return f"trip-version:{trip_id}"
+
+    async def publish(self, trip_id: str, previous: Optional[dict], current: dict) -> Optional[dict]:
+        """Tell the trip's watchers it changed from ``previous`` to ``current``
+        (JSON-mode dumps); the published event, None if Redis failed."""
+        try:
+            event = await self._next_version(trip_id, previous, current)
+        except (RedisError, WatchError) as e:
+            print(f"Could not version the update of trip {trip_id}: {e}")
+            return None
+        await self.events.publish(trip_id, event)
+        return event
+
+    async def snapshot(self, trip_id: str) -> Optional[dict]:
+        """The trip as a snapshot event, None if it does not exist. Versions
+        the cached itinerary first if it changed without an update being
+        published (e.g. through PUT /api/trip/{id})."""
+        itinerary = await trip_repository.get(trip_id)
+        if itinerary is None:
+            return None
+        try:
+            version = await self._versioned(trip_id, itinerary)
+        except (RedisError, WatchError) as e:
+            print(f"Could not read the version of trip {trip_id}: {e}")
+            version = None
+        return self._snapshot_event(trip_id, version, itinerary)
+
+    async def _next_version(self, trip_id: str, previous: Optional[dict], current: dict) -> dict:
+        digest = itinerary_digest(current)
+        base_digest = itinerary_digest(previous) if previous is not None else None
+        key = self.key(trip_id)
+        for attempt in range(self.attempts):
+            try:
+                async with self.cache.pipeline(transaction=True) as pipe:
+                    await pipe.watch(key)
+                    stored_version, stored_digest = await pipe.hmget(key, "version", "digest")
+                    version = int(stored_version or 0) + 1
+                    event = None
+                    if base_digest is not None and stored_digest == base_digest.encode():
+                        patch = json_patch(previous, current)
+                        event = {
+                            "type": "patch",
+                            "trip_id": trip_id,
+                            "version": version,
+                            "base_version": version - 1,
+                            "patch": patch,
+                        }
+                        if len(orjson.dumps(patch)) >= len(orjson.dumps(current)):
+                            event = None
+                    if event is None:
+                        event = self._snapshot_event(trip_id, version, current)
+                    pipe.multi()
+                    pipe.hset(key, mapping={"version": version, "digest": digest})
+                    pipe.expire(key, TRIP_VERSION_TTL)
+                    await pipe.execute()
+                    return event
+            except WatchError:
+                # another update of the trip was versioned in between
+                if attempt == self.attempts - 1:
+                    raise
+
+    async def _versioned(self, trip_id: str, itinerary: dict) -> int:
+        """The version naming ``itinerary``, bumped if the stored one names
+        another."""
+        digest = itinerary_digest(itinerary)
+        key = self.key(trip_id)
+        async with self.cache.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            stored_version, stored_digest = await pipe.hmget(key, "version", "digest")
+            version = int(stored_version or 0)
+            if stored_digest == digest.encode():
+                return version
+            if stored_digest is not None:
+                version += 1
+            pipe.multi()
+            pipe.hset(key, mapping={"version": version, "digest": digest})
+            pipe.expire(key, TRIP_VERSION_TTL)
+            await pipe.execute()
+            return version
+
+    @staticmethod
+    def _snapshot_event(trip_id: str, version: Optional[int], itinerary: dict) -> dict:
+        return {"type": "snapshot", "trip_id": trip_id, "version": version, "itinerary": itinerary}
+
+
+trip_updates = TripUpdates()
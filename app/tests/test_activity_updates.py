@@ -0,0 +1,159 @@
+import asyncio
+
+import fakeredis
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+from pymongo import UpdateOne
+
+from app.database import ActivityUpdates
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.schemas.trips_schema import Trip
+from app.services.http_client import http_clients
+
+trip_id = str(ObjectId())
+
+
+def activity(id: int) -> dict:
+    return {
+        "id": id,
+        "place": {"id": f"place-{id}", "name": f"Place {id}", "location": {"latitude": 38.7, "longitude": -9.1}, "types": []},
+        "start_time": "2025-07-10T09:00:00",
+        "end_time": "2025-07-10T10:00:00",
+        "activity_type": "visit",
+        "duration": 60,
+    }
+
+
+stored_trip = Trip(
+    name="Lisbon",
+    start_date="2025-07-10",
+    end_date="2025-07-12",
+    trip_type="place",
+    country="Portugal",
+    city="Lisbon",
+    place_coordinates={"latitude": 38.72, "longitude": -9.14},
+    original_place_data={"type": "place", "coordinates": {"latitude": 38.72, "longitude": -9.14}},
+    is_group=False,
+    days=[
+        {"date": "2025-07-10", "morning_activities": [activity(1), activity(2)], "afternoon_activities": [activity(3)]},
+        {"date": "2025-07-11", "morning_activities": [activity(4)]},
+    ],
+)
+
+
+def test_edits_address_one_activity():
+    replace = ActivityUpdates.replace_activity(trip_id, "3", activity(3))
+    assert replace["filter"] == {"_id": ObjectId(trip_id)}
+    assert set(replace["update"]["$set"]) == {
+        "days.$[].morning_activities.$[a]",
+        "days.$[].afternoon_activities.$[a]",
+    }
+    assert replace["array_filters"] == [{"a.id": 3}]
+
+    delete = ActivityUpdates.delete_activity(trip_id, "2")
+    assert delete["update"] == {"$pull": {
+        "days.$[].morning_activities": {"id": 2},
+        "days.$[].afternoon_activities": {"id": 2},
+    }}
+
+    insert = ActivityUpdates.insert_activity(trip_id, 1, "afternoon_activities", activity(5), position=0)
+    assert insert["update"]["$push"]["days.1.afternoon_activities"]["$position"] == 0
+
+    reorder = ActivityUpdates.reorder_activities(trip_id, 0, "morning_activities", [2, 1])
+    assert reorder["filter"]["days.0.morning_activities"] == {"$size": 2}
+    assert isinstance(reorder["update"], list)  # an update pipeline
+
+
+def test_local_equivalents_leave_the_input_untouched():
+    itinerary = stored_trip.model_dump(mode="json")
+    removed = ActivityUpdates.without_activity(itinerary, "2")
+    assert [a["id"] for a in removed["days"][0]["morning_activities"]] == [1]
+    assert len(itinerary["days"][0]["morning_activities"]) == 2
+
+    replaced = ActivityUpdates.with_activity(itinerary, 4, {**activity(4), "duration": 90})
+    assert ActivityUpdates.find_activity(replaced, 4)["duration"] == 90
+    assert ActivityUpdates.find_activity(itinerary, 4)["duration"] == 60
+
+
+# Local stand-in for the recommendations service, which edits the activity;
+# like the real one it only knows (and answers with) what it generated
+recommendations = FastAPI()
+UPSTREAM_FIELDS = ("start_date", "end_date", "name", "days", "is_group")
+
+
+def upstream_itinerary(itinerary: dict) -> dict:
+    return {field: itinerary[field] for field in UPSTREAM_FIELDS}
+
+
+@recommendations.delete("/trip/{trip_id}/delete-activity/{activity_id}")
+async def fake_delete(trip_id: str, activity_id: str):
+    itinerary = ActivityUpdates.without_activity(stored_trip.model_dump(mode="json"), activity_id)
+    return {"response": {"itinerary": upstream_itinerary(itinerary)}}
+
+
+@recommendations.post("/trip/{trip_id}/regenerate-activity")
+async def fake_regenerate(trip_id: str, body: dict):
+    replacement = {**activity(body["id"]), "duration": 90}
+    itinerary = ActivityUpdates.with_activity(stored_trip.model_dump(mode="json"), body["id"], replacement)
+    return {"response": {"itinerary": upstream_itinerary(itinerary)}}
+
+
+def edit_activity(monkeypatch, request):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    writes = []
+
+    async def fake_bulk_write(self, operations, ordered=False):
+        writes.append(operations)
+
+    monkeypatch.setattr(AsyncDBClient, "bulk_write", fake_bulk_write)
+
+    async def edit():
+        monkeypatch.setattr(
+            http_clients,
+            "recommendations",
+            httpx.AsyncClient(
+                base_url="http://recommendations",
+                transport=httpx.ASGITransport(app=recommendations),
+            ),
+        )
+        await trip_repository.cache_draft(trip_id, stored_trip)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await request(client)
+        await http_clients.recommendations.aclose()
+        cached = await trip_repository.get(trip_id)
+        # the edit is written behind, by the next flush
+        assert writes == []
+        await trip_repository.write_behind.flush()
+        return response, cached
+
+    response, cached = asyncio.run(edit())
+    return response, cached, writes
+
+
+def test_delete_activity_pulls_it_in_place(monkeypatch):
+    response, cached, writes = edit_activity(
+        monkeypatch, lambda client: client.delete(f"/api/trip/{trip_id}/activity/3")
+    )
+
+    assert response.status_code == 200
+    assert cached["days"][0]["afternoon_activities"] == []
+    assert cached["city"] == "Lisbon" and cached["place_coordinates"] is not None
+    assert writes == [[UpdateOne(**ActivityUpdates.delete_activity(trip_id, 3))]]
+
+
+def test_regenerated_activity_is_replaced_in_place(monkeypatch):
+    response, cached, writes = edit_activity(
+        monkeypatch,
+        lambda client: client.post(f"/api/trip/{trip_id}/regenerate-activity", json={"id": 2}),
+    )
+
+    assert response.status_code == 200
+    regenerated = ActivityUpdates.find_activity(cached, 2)
+    assert regenerated["duration"] == 90
+    assert cached["original_place_data"]["type"] == "place"
+    assert writes == [[UpdateOne(**ActivityUpdates.replace_activity(trip_id, 2, regenerated))]]
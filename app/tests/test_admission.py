@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionLimiter, AdmissionRejected, upstream_admission
+from app.tests.test_http_client import mock_form_data
+from app.tests.test_trip_jobs import concurrency, run_jobs
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def run():
+        limiter = AdmissionLimiter(limit=1, max_queue=5, max_wait=1)
+        order = []
+
+        async def work(name: str):
+            async with limiter.admit():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(work(name) for name in "abcd"))
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(run())
+
+    assert order == list("abcd")
+    assert stats["admitted"] == 4 and stats["max_queued"] == 3
+    assert stats["active"] == stats["queued"] == 0
+    assert stats["wait_p99"] > 0
+
+
+def test_requests_beyond_the_queue_are_rejected_at_once():
+    async def run():
+        limiter = AdmissionLimiter(limit=1, max_queue=1, max_wait=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.saturated
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with limiter.admit():
+                pass
+        with pytest.raises(AdmissionRejected):
+            limiter.check()
+        release.set()
+        await asyncio.gather(*holders)
+        return rejected.value, limiter.stats()
+
+    rejected, stats = asyncio.run(run())
+
+    assert rejected.retry_after >= 1
+    assert stats["rejected"] == 2 and stats["admitted"] == 2
+    assert stats["active"] == 0
+
+
+def test_timed_out_and_cancelled_waiters_give_up_their_place():
+    async def run():
+        limiter = AdmissionLimiter(limit=1, max_queue=5, max_wait=0.01)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            async with limiter.admit():
+                pass
+        cancelled = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        queued = limiter.queued
+        release.set()
+        await holder
+        # the slot went back to the pool, not to an abandoned waiter
+        async with limiter.admit(max_wait=0):
+            pass
+        return queued, limiter.stats()
+
+    queued, stats = asyncio.run(run())
+
+    assert queued == 0
+    assert stats["timed_out"] == 1
+    assert stats["active"] == stats["queued"] == 0
+
+
+def test_trip_creation_beyond_the_limit_is_refused_with_retry_after(monkeypatch):
+    monkeypatch.setattr(upstream_admission, "limit", 1)
+    monkeypatch.setattr(upstream_admission, "max_queue", 1)
+
+    async def scenario(client):
+        form = mock_form_data
+        responses = await asyncio.gather(*(client.post("/api/trips", json=form) for _ in range(3)))
+        job = await client.post("/api/trips", params={"job": "true"}, json=form)
+        stats = (await client.get("/api/admission")).json()
+        return responses, job, stats
+
+    responses, job, stats = run_jobs(monkeypatch, scenario)
+
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200, 200, 429]
+    refused = next(r for r in responses if r.status_code == 429)
+    assert int(refused.headers["Retry-After"]) >= 1
+    assert refused.json()["response"]["retry_after"] == int(refused.headers["Retry-After"])
+    assert concurrency["max"] == 1
+    # the slots are free again, background jobs are accepted
+    assert job.status_code == 202
+    assert stats["limit"] == 1 and stats["rejected"] >= 1
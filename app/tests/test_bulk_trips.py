@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+import fakeredis
+from fastapi.testclient import TestClient
+
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripCodec import TripCodec
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.routes import trip_router
+from app.schemas.trips_schema import Trip
+
+client = TestClient(app)
+
+cached_trip = {"name": "Cached trip", "end_date": "2025-07-17", "trip_type": "place", "is_group": False}
+stored_trip = Trip(name="Stored trip", end_date="2025-08-03", trip_type="place", is_group=True)
+
+
+def test_bulk_fetch_reads_cache_then_mongo_and_backfills(monkeypatch):
+    fake_redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(trip_repository.cache, "redis", fake_redis)
+    # entries written before the codec existed are plain JSON
+    asyncio.run(fake_redis.set("cached", json.dumps(cached_trip)))
+
+    mongo_queries = []
+
+    async def fake_get_trips_by_ids(self, ids):
+        mongo_queries.append(ids)
+        return {"stored": stored_trip} if "stored" in ids else {}
+
+    async def no_participants(id, voyage_cookie):
+        return []
+
+    monkeypatch.setattr(AsyncDBClient, "get_trips_by_ids", fake_get_trips_by_ids)
+    monkeypatch.setattr(trip_router, "fetch_participants", no_participants)
+
+    response = client.get("/api/trips", params={"ids": "cached,stored,unknown"})
+
+    assert response.status_code == 200
+    body = response.json()["response"]
+    assert [t["tripId"] for t in body["trips"]] == ["cached", "stored"]
+    assert body["trips"][0]["itinerary"] == cached_trip
+    assert body["trips"][1]["itinerary"]["name"] == "Stored trip"
+    assert body["missing"] == ["unknown"]
+    # one $in query for every cache miss, and the hit is backfilled
+    assert mongo_queries == [["stored", "unknown"]]
+    assert TripCodec.decode(asyncio.run(fake_redis.get("stored")))["name"] == "Stored trip"
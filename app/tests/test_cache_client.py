@@ -0,0 +1,46 @@
+import asyncio
+
+import fakeredis
+
+from app.database.CacheClient import RedisClient
+
+
+def make_client() -> RedisClient:
+    client = RedisClient()
+    client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return client
+
+
+def test_batch_reads_and_writes():
+    client = make_client()
+
+    async def scenario():
+        await client.mset({"a": "1", "b": "2"}, expire=60)
+        values = await client.mget(["a", "missing", "b"])
+        ttl = await client.redis.ttl("a")
+        await client.delete_many(["a", "b"])
+        return values, ttl, await client.mget(["a", "b"])
+
+    values, ttl, after_delete = asyncio.run(scenario())
+
+    assert values == ["1", None, "2"]
+    assert 0 < ttl <= 60
+    assert after_delete == [None, None]
+
+
+def test_pipeline_runs_commands_together():
+    client = make_client()
+
+    async def scenario():
+        async with client.pipeline() as pipe:
+            pipe.set("trip", "{}", ex=60)
+            pipe.incr("trip:version")
+            results = await pipe.execute()
+        refreshed = await client.getex("trip", expire=120)
+        return results, refreshed, await client.redis.ttl("trip")
+
+    results, refreshed, ttl = asyncio.run(scenario())
+
+    assert results == [True, 1]
+    assert refreshed == "{}"
+    assert 60 < ttl <= 120
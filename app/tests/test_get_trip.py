@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.routes import trip_router
+from app.services.http_client import http_clients
+
+LOOKUP_DELAY = 0.3
+
+# Local stand-in for the user-management service
+user_management = FastAPI()
+count_calls = []
+
+
+@user_management.get("/trips/participants-count/{trip_id}")
+async def fake_participants_count(trip_id: str):
+    count_calls.append(trip_id)
+    await asyncio.sleep(LOOKUP_DELAY)
+    return {"has_participants": True}
+
+
+async def slow_itinerary(id: str):
+    await asyncio.sleep(LOOKUP_DELAY)
+    return {"name": "Trip to Lisbon", "days": []}
+
+
+def test_guest_view_runs_lookups_concurrently_and_caches_count(monkeypatch):
+    monkeypatch.setattr(trip_repository, "get", slow_itinerary)
+    trip_router.participant_count_cache.clear()
+
+    async def view_twice():
+        monkeypatch.setattr(
+            http_clients,
+            "user_management",
+            httpx.AsyncClient(
+                base_url="http://user-management",
+                transport=httpx.ASGITransport(app=user_management),
+            ),
+        )
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            started = time.perf_counter()
+            first = await client.get("/api/trips/trip-1")
+            first_elapsed = time.perf_counter() - started
+            second = await client.get("/api/trips/trip-1")
+        await http_clients.user_management.aclose()
+        return first, first_elapsed, second
+
+    first, first_elapsed, second = asyncio.run(view_twice())
+
+    assert first.status_code == 200
+    assert first.json()["response"]["participants"] == [{"user_id": "hidden"}]
+    assert second.json()["response"] == first.json()["response"]
+    # max(itinerary, participants) rather than their sum
+    assert first_elapsed < LOOKUP_DELAY * 1.8
+    assert count_calls == ["trip-1"]
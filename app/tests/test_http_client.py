@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+from fastapi import FastAPI
+
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.services.http_client import http_clients
+
+UPSTREAM_DELAY = 0.5
+CONCURRENT_TRIPS = 10
+
+# Local stand-in for the recommendations service
+recommendations = FastAPI()
+in_flight = {"current": 0, "peak": 0}
+
+
+@recommendations.post("/trip")
+async def fake_trip(body: dict):
+    in_flight["current"] += 1
+    in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+    await asyncio.sleep(UPSTREAM_DELAY)
+    in_flight["current"] -= 1
+    return {
+        "itinerary": {
+            "start_date": body["start_date"],
+            "end_date": body["end_date"],
+            "name": body["name"],
+            "days": [],
+            "trip_type": body["tripType"],
+            "is_group": body["is_group"],
+        }
+    }
+
+
+mock_form_data = {
+    "budget": 500,
+    "startDate": "2025-07-10T00:00:00Z",
+    "duration": 3,
+    "preferences": {"questions": [{"question_id": 1, "value": 3, "type": "scale"}]},
+    "tripType": "place",
+    "display_name": "Trip to Lisbon",
+    "country": "Portugal",
+    "city": "Lisbon",
+    "data_type": {
+        "type": "place",
+        "coordinates": {"latitude": 38.72, "longitude": -9.14},
+        "place_name": "Lisbon",
+    },
+    "is_group": False,
+}
+
+
+def test_concurrent_trip_creations_overlap(monkeypatch):
+    monkeypatch.setattr(
+        trip_repository.cache, "redis", fakeredis.FakeAsyncRedis()
+    )
+
+    async def create_trips():
+        monkeypatch.setattr(
+            http_clients,
+            "recommendations",
+            httpx.AsyncClient(
+                base_url="http://recommendations",
+                transport=httpx.ASGITransport(app=recommendations),
+            ),
+        )
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *(client.post("/api/trips", json=mock_form_data) for _ in range(CONCURRENT_TRIPS))
+            )
+            elapsed = time.perf_counter() - started
+        await http_clients.recommendations.aclose()
+        return responses, elapsed
+
+    responses, elapsed = asyncio.run(create_trips())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.json()["response"]["tripId"] for r in responses}) == CONCURRENT_TRIPS
+    # serial upstream calls would take CONCURRENT_TRIPS * UPSTREAM_DELAY
+    assert in_flight["peak"] == CONCURRENT_TRIPS
+    assert elapsed < UPSTREAM_DELAY * CONCURRENT_TRIPS / 2
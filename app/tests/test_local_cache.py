@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import fakeredis
+
+from app.database.CacheClient import RedisClient
+from app.database.TripRepository import TripRepository
+from app.schemas.trips_schema import Trip
+from app.services.ttl_cache import TTLCache
+
+
+def test_lru_bounded_by_entries_and_bytes():
+    cache = TTLCache(ttl=60, max_entries=3, max_bytes=100)
+    cache.set("a", 1, size=40)
+    cache.set("b", 2, size=40)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3, size=40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.size_bytes == 80
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_write_on_one_replica_invalidates_the_other():
+    server = fakeredis.FakeServer()
+
+    def replica() -> TripRepository:
+        cache = RedisClient()
+        cache.redis = fakeredis.FakeAsyncRedis(server=server)
+        return TripRepository(cache)
+
+    first, second = replica(), replica()
+    trip = Trip(name="Lisbon", end_date="2025-08-03", trip_type="place", is_group=False)
+
+    async def scenario():
+        listeners = [
+            asyncio.create_task(r.listen_for_invalidations()) for r in (first, second)
+        ]
+        while not (first.local_enabled and second.local_enabled):
+            await asyncio.sleep(0.01)
+
+        await first.cache_draft("trip-1", trip)
+        await second.get("trip-1")
+        await second.get("trip-1")
+        local_hits = second.local.hits
+
+        # the listener on the second replica drops its copy
+        await first.cache_draft("trip-1", trip.model_copy(update={"name": "Porto"}))
+        for _ in range(100):
+            if len(second.local) == 0:
+                break
+            await asyncio.sleep(0.01)
+        renamed = await second.get("trip-1")
+
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        return local_hits, renamed
+
+    local_hits, renamed = asyncio.run(scenario())
+
+    assert local_hits == 1
+    assert renamed["name"] == "Porto"
@@ -0,0 +1,165 @@
+import asyncio
+
+import fakeredis
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.services.http_client import http_clients
+from app.services.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, LatencyTracker, ResilientTransport,
+)
+from app.tests.test_activity_updates import stored_trip, trip_id
+from app.tests.test_http_client import mock_form_data
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=30, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 30
+    assert breaker.allow()  # the trial call
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.retry_after() == 30
+
+    clock.now = 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+    assert (breaker.times_opened, breaker.rejected) == (2, 2)
+
+
+def resilient_client(handler, breaker=None, latency=None) -> httpx.AsyncClient:
+    transport = ResilientTransport("recommendations", httpx.MockTransport(handler), breaker, latency)
+    return httpx.AsyncClient(base_url="http://recommendations", transport=transport)
+
+
+def test_open_circuit_fails_fast_without_calling_the_upstream():
+    calls = []
+
+    async def failing(request):
+        calls.append(request.url.path)
+        return httpx.Response(503, text="overloaded")
+
+    async def scenario():
+        async with resilient_client(failing, CircuitBreaker(failure_threshold=2)) as client:
+            answers = [(await client.post("/trip", json={})).status_code for _ in range(2)]
+            with pytest.raises(CircuitOpenError) as raised:
+                await client.post("/trip", json={})
+            return answers, raised.value
+
+    answers, error = asyncio.run(scenario())
+
+    assert answers == [503, 503]
+    assert len(calls) == 2
+    assert error.upstream == "recommendations" and error.retry_after > 0
+
+
+def test_timeouts_adapt_to_observed_latency():
+    read_timeouts = []
+
+    async def fast(request):
+        read_timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(200, json={})
+
+    latency = LatencyTracker(min_samples=5, min_timeout=0.5)
+
+    async def scenario():
+        async with resilient_client(fast, latency=latency) as client:
+            for _ in range(6):
+                await client.post("/trip/65f0c0ffee0000000000abcd/regenerate-activity", timeout=40)
+            await client.get("/trips", timeout=40)
+
+    asyncio.run(scenario())
+
+    # the caller's 40 s until enough calls were seen, then at most the floor
+    assert read_timeouts[:5] == [40] * 5
+    assert read_timeouts[5] == 0.5
+    # other operations keep their own latencies
+    assert read_timeouts[6] == 40
+    assert list(latency.stats()) == ["POST /trip/{id}/regenerate-activity", "GET /trips"]
+
+
+def test_trip_creation_answers_503_while_the_circuit_is_open(monkeypatch):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+
+    async def unreachable(request):
+        raise AssertionError("the upstream must not be called")
+
+    async def scenario():
+        monkeypatch.setattr(http_clients, "recommendations", resilient_client(unreachable, breaker))
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            created = await client.post("/api/trips", json=mock_form_data)
+            stats = await client.get("/api/upstreams")
+        await http_clients.recommendations.aclose()
+        return created, stats
+
+    created, stats = asyncio.run(scenario())
+
+    assert created.status_code == 503
+    assert int(created.headers["Retry-After"]) > 0
+    assert set(stats.json()) == {"recommendations", "user_management"}
+    assert stats.json()["recommendations"]["state"] in (CLOSED, OPEN, HALF_OPEN)
+
+
+def test_trip_edits_answer_503_while_the_circuit_is_open(monkeypatch):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+
+    async def unreachable(request):
+        raise AssertionError("the upstream must not be called")
+
+    async def scenario():
+        monkeypatch.setattr(http_clients, "recommendations", resilient_client(unreachable, breaker))
+        await trip_repository.cache_draft(trip_id, stored_trip)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test", cookies={"voyage_at": "token"}
+        ) as client:
+            responses = [
+                await client.post(f"/api/trip/{trip_id}/regenerate-activity", json={"id": 2}),
+                await client.delete(f"/api/trip/{trip_id}/activity/3"),
+                await client.put(
+                    f"/api/trip/{trip_id}/preferences",
+                    json={"preference_id": "p1", "answers": [{"question_id": "q1", "value": 3}]},
+                ),
+            ]
+        return responses
+
+    responses = asyncio.run(scenario())
+
+    for response in responses:
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) > 0
+        assert response.json()["message"] == "Recommendations service unavailable"
+        assert response.json()["response"]["retry_after"] == int(response.headers["Retry-After"])
+
+    with TestClient(app).websocket_connect(f"/ws/trip-regeneration/{trip_id}") as websocket:
+        websocket.send_json({"preference_id": "p1", "answers": [{"question_id": "q1", "value": 3}]})
+        events = [websocket.receive_json()]
+        while events[-1]["type"] not in ("error", "success"):
+            events.append(websocket.receive_json())
+
+    assert events[-1]["type"] == "error"
+    assert events[-1]["message"].startswith("Recommendations service unavailable")
+    assert events[-1]["retry_after"] > 0
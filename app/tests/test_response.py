@@ -0,0 +1,23 @@
+import json
+from datetime import datetime
+
+from fastapi import status
+
+from app.schemas.response import ResponseBody
+
+
+def test_envelope_matches_stdlib_rendering():
+    response = ResponseBody({"itinerary": {"name": "Trip to Lisbon", "days": []}}, "ok", status.HTTP_201_CREATED)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert json.loads(response.body) == {
+        "status_code": 201,
+        "message": "ok",
+        "response": {"itinerary": {"name": "Trip to Lisbon", "days": []}},
+    }
+
+
+def test_datetimes_render_as_iso_strings():
+    response = ResponseBody({"start_date": datetime(2025, 7, 10, 9, 30)})
+
+    assert json.loads(response.body)["response"]["start_date"] == "2025-07-10T09:30:00"
@@ -0,0 +1,173 @@
+import asyncio
+
+import fakeredis
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI, Response
+from pymongo.errors import BulkWriteError
+
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripCodec import TripCodec
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.schemas.trips_schema import Trip
+from app.services.http_client import http_clients
+
+# Local stand-in for user-management
+user_management = FastAPI()
+registered = []
+refused = set()
+
+
+@user_management.post("/trips/save")
+async def fake_register(body: dict):
+    if body["trip_id"] in refused:
+        return Response("not allowed", status_code=403)
+    registered.append(body["trip_id"])
+    return {}
+
+
+def save_request(trip_id: str) -> dict:
+    return {
+        "id": trip_id,
+        "itinerary": {"name": "Lisbon", "start_date": "2025-07-10", "end_date": "2025-07-12", "trip_type": None, "is_group": False},
+        "trip_type": "place",
+        "is_group": True,
+    }
+
+
+def run_with_services(monkeypatch, requests):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    registered.clear()
+
+    async def scenario():
+        monkeypatch.setattr(
+            http_clients,
+            "user_management",
+            httpx.AsyncClient(
+                base_url="http://user-management",
+                transport=httpx.ASGITransport(app=user_management),
+            ),
+        )
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            responses = [await request(client) for request in requests]
+        await http_clients.user_management.aclose()
+        return responses
+
+    return asyncio.run(scenario())
+
+
+def test_save_is_an_upsert_registered_once(monkeypatch):
+    stored = set()
+
+    async def fake_upsert_trip(self, id, trip):
+        created = id not in stored
+        stored.add(id)
+        return created
+
+    monkeypatch.setattr(AsyncDBClient, "upsert_trip", fake_upsert_trip)
+    trip_id = str(ObjectId())
+
+    first, again = run_with_services(monkeypatch, [
+        lambda client: client.post("/api/save", json=save_request(trip_id)),
+        lambda client: client.post("/api/save", json=save_request(trip_id)),
+    ])
+
+    assert first.json()["response"] == {"trip_id": trip_id, "created": True}
+    assert again.status_code == 200
+    assert again.json()["response"] == {"trip_id": trip_id, "created": False}
+    assert registered == [trip_id]
+    cached = TripCodec.decode(asyncio.run(trip_repository.cache.redis.get(trip_id)))
+    assert (cached["trip_type"], cached["is_group"]) == ("place", True)
+
+
+def test_refused_registration_keeps_the_draft(monkeypatch):
+    deleted = []
+
+    async def fake_upsert_trip(self, id, trip):
+        return True
+
+    async def fake_delete_trip(self, id):
+        deleted.append(id)
+
+    monkeypatch.setattr(AsyncDBClient, "upsert_trip", fake_upsert_trip)
+    monkeypatch.setattr(AsyncDBClient, "delete_trip", fake_delete_trip)
+    trip_id = str(ObjectId())
+    refused.add(trip_id)
+
+    (response,) = run_with_services(monkeypatch, [
+        lambda client: client.post("/api/save", json=save_request(trip_id)),
+    ])
+
+    assert response.status_code == 500
+    assert deleted == [trip_id]
+    # the generated trip is not lost, the save can be retried
+    cached = TripCodec.decode(asyncio.run(trip_repository.cache.redis.get(trip_id)))
+    assert cached["name"] == "Lisbon"
+
+
+def test_bulk_save_reports_each_trip(monkeypatch):
+    new, existing, broken = str(ObjectId()), str(ObjectId()), "not-an-object-id"
+    writes = []
+
+    async def fake_upsert_trips(self, trips):
+        writes.append(list(trips))
+        return {new: True, existing: False, broken: "Invalid trip id: not-an-object-id"}
+
+    monkeypatch.setattr(AsyncDBClient, "upsert_trips", fake_upsert_trips)
+
+    (response,) = run_with_services(monkeypatch, [
+        lambda client: client.post(
+            "/api/save/bulk", json=[save_request(id) for id in (new, existing, broken)]
+        ),
+    ])
+
+    assert response.status_code == 200
+    assert response.json()["response"] == {
+        "created": [new],
+        "updated": [existing],
+        "failed": {broken: "Invalid trip id: not-an-object-id"},
+    }
+    assert writes == [[new, existing, broken]]
+    assert registered == [new]
+
+
+def test_upsert_trips_maps_bulk_results_to_trip_ids(monkeypatch):
+    created, failing, overwritten = str(ObjectId()), str(ObjectId()), str(ObjectId())
+
+    class FakeCollection:
+        async def bulk_write(self, operations, ordered=True):
+            assert ordered is False and len(operations) == 3
+            raise BulkWriteError({
+                "writeErrors": [{"index": 1, "errmsg": "document too large"}],
+                "upserted": [{"index": 0, "_id": ObjectId(created)}],
+            })
+
+    monkeypatch.setattr(AsyncDBClient(), "collection", FakeCollection())
+    trip = Trip(name="Lisbon", start_date="2025-07-10", end_date="2025-07-12", trip_type="place", is_group=False)
+
+    results = asyncio.run(AsyncDBClient().upsert_trips(
+        {created: trip, "bad-id": trip, failing: trip, overwritten: trip}
+    ))
+
+    assert results == {
+        created: True,
+        "bad-id": "Invalid trip id: bad-id",
+        failing: "Error saving trip: document too large",
+        overwritten: False,
+    }
+
+
+def test_failed_update_reports_the_mongo_error(monkeypatch):
+    async def failing_put(self, id, trip, previous=None):
+        return "Error updating trip: connection refused"
+
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", failing_put)
+    trip = save_request("abc")["itinerary"]
+
+    [response] = run_with_services(monkeypatch, [lambda client: client.put("/api/trip/abc", json=trip)])
+
+    assert response.status_code == 400
+    assert response.json()["response"]["error"] == "Error updating trip: connection refused"
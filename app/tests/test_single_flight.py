@@ -0,0 +1,104 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.database.CacheClient import RedisClient
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import TripRepository
+from app.schemas.trips_schema import Trip
+from app.services.single_flight import SingleFlight
+
+stored_trip = Trip(name="Group trip", end_date="2025-08-03", trip_type="place", is_group=True)
+
+
+def make_repository(server: fakeredis.FakeServer) -> TripRepository:
+    cache = RedisClient(decode_responses=False)
+    cache.redis = fakeredis.FakeAsyncRedis(server=server)
+    repository = TripRepository(cache)
+    repository.single_flight.poll_interval = 0.01
+    return repository
+
+
+def slow_mongo(monkeypatch, reads: list):
+    async def fake_get_trip_by_id(self, id):
+        reads.append(id)
+        await asyncio.sleep(0.1)
+        return stored_trip.model_copy()
+
+    monkeypatch.setattr(AsyncDBClient, "get_trip_by_id", fake_get_trip_by_id)
+
+
+def test_concurrent_misses_read_mongo_once(monkeypatch):
+    reads = []
+    slow_mongo(monkeypatch, reads)
+    repository = make_repository(fakeredis.FakeServer())
+
+    async def stampede():
+        return await asyncio.gather(*(repository.get("trip-1") for _ in range(50)))
+
+    results = asyncio.run(stampede())
+
+    assert reads == ["trip-1"]
+    assert all(r["name"] == "Group trip" for r in results)
+    assert repository.single_flight.shared == 49
+
+
+def test_replicas_share_one_load_through_the_redis_lock(monkeypatch):
+    reads = []
+    slow_mongo(monkeypatch, reads)
+    server = fakeredis.FakeServer()
+    replicas = [make_repository(server) for _ in range(3)]
+
+    async def stampede():
+        return await asyncio.gather(*(r.get("trip-1") for r in replicas for _ in range(10)))
+
+    results = asyncio.run(stampede())
+
+    assert reads == ["trip-1"]
+    assert len(results) == 30 and all(r["name"] == "Group trip" for r in results)
+    # the lock is released once the result is cached
+    assert asyncio.run(replicas[0].cache.redis.exists("single-flight:trip-1")) == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_load():
+    flight = SingleFlight()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("key", load))
+        second = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "value"
+    assert loads == [1]
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    flight = SingleFlight()
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("mongo down")
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        retry = await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(scenario())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert attempts == [1]
+    assert retry == "ok"
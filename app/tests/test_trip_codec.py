@@ -0,0 +1,43 @@
+import json
+
+import orjson
+import pytest
+
+from app.database.TripCodec import FORMAT_MSGPACK, SERIALIZERS, TripCodec
+
+itinerary = {
+    "name": "Trip to Lisbon",
+    "days": [{"date": "2025-07-10", "morning_activities": [{"id": i, "photos": ["p"] * 20}]} for i in range(7)],
+    "is_group": False,
+}
+
+
+@pytest.mark.parametrize("threshold", [None, 0, 10**6])
+def test_round_trip_with_and_without_compression(threshold):
+    codec = TripCodec(compress_threshold=threshold)
+    encoded = codec.encode(itinerary)
+
+    assert TripCodec.decode(encoded) == itinerary
+    assert TripCodec.decoded_size(encoded) == len(orjson.dumps(itinerary))
+
+
+def test_compression_kicks_in_above_threshold():
+    small = TripCodec(compress_threshold=None).encode(itinerary)
+    compressed = TripCodec(compress_threshold=0).encode(itinerary)
+
+    assert len(compressed) < len(small)
+    assert TripCodec.decoded_size(compressed) == TripCodec.decoded_size(small)
+
+
+def test_legacy_plain_json_entries_stay_readable():
+    legacy = json.dumps(itinerary).encode()
+
+    assert TripCodec.decode(legacy) == itinerary
+    assert TripCodec.decoded_size(legacy) == len(legacy)
+
+
+@pytest.mark.skipif(FORMAT_MSGPACK not in SERIALIZERS, reason="msgpack not installed")
+def test_msgpack_format():
+    encoded = TripCodec(format="msgpack").encode(itinerary)
+
+    assert TripCodec.decode(encoded) == itinerary
@@ -0,0 +1,163 @@
+import asyncio
+import copy
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.database.MongoClient import AsyncDBClient
+from app.schemas.trips_schema import Trip
+from app.services.trip_diff import diff_paths, json_patch, partial_update
+
+
+def activity(id: int, hour: int) -> dict:
+    return {
+        "id": id,
+        "place": {"name": f"Place {id}", "location": {"latitude": 38.7, "longitude": -9.1}, "types": []},
+        "start_time": f"2025-07-12T{hour:02d}:00:00",
+        "end_time": f"2025-07-12T{hour + 1:02d}:00:00",
+        "activity_type": "visit",
+        "duration": 60,
+    }
+
+
+def make_trip(**changes) -> Trip:
+    trip = {
+        "name": "Lisbon",
+        "start_date": datetime(2025, 7, 10),
+        "end_date": datetime(2025, 7, 13),
+        "trip_type": "place",
+        "is_group": False,
+        "days": [
+            {"date": f"2025-07-1{d}", "morning_activities": [activity(d * 10 + i, 9 + i) for i in range(3)]}
+            for d in range(3)
+        ],
+        "original_place_data": {"type": "place", "place_name": "Lisbon"},
+    }
+    trip.update(changes)
+    return Trip(**trip)
+
+
+def test_one_changed_activity_is_one_path():
+    before = make_trip()
+    after = before.model_copy(deep=True)
+    after.days[2].morning_activities[1].start_time = "2025-07-12T10:30:00"
+
+    update = partial_update(before.model_dump(mode="json"), after.model_dump(mode="json"), after.model_dump())
+
+    assert update == {"$set": {"days.2.morning_activities.1.start_time": "2025-07-12T10:30:00"}}
+
+
+def test_values_keep_their_stored_types():
+    before = make_trip()
+    after = make_trip(start_date=datetime(2025, 7, 11))
+
+    update = partial_update(before.model_dump(mode="json"), after.model_dump(mode="json"), after.model_dump())
+
+    assert update == {"$set": {"start_date": datetime(2025, 7, 11)}}
+
+
+def test_removed_keys_are_unset_and_resized_lists_are_set_whole():
+    before = {"a": {"b": 1, "c": 2}, "items": [1, 2, 3]}
+    after = {"a": {"b": 1}, "items": [1, 2]}
+
+    assert diff_paths(before, after) == ([("items",)], [("a", "c")])
+    # 1 == True in Python, not in the database
+    assert diff_paths({"x": 1}, {"x": True}) == ([("x",)], [])
+
+
+def test_no_change_and_full_rewrite():
+    trip = make_trip().model_dump(mode="json")
+    assert partial_update(trip, trip) == {}
+
+    # replacing every field costs more than writing the document again
+    assert partial_update({"a": 1, "b": 2}, {"c": 3, "d": 4}) is None
+    assert partial_update([1], {"name": "Other"}) is None
+
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, filter, update):
+        self.updates.append(update)
+
+        class Result:
+            modified_count = 1
+
+        return Result()
+
+
+def test_put_trip_by_doc_id_writes_only_changed_paths(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(AsyncDBClient(), "collection", collection)
+    before = make_trip()
+    after = make_trip(name="Lisbon in July")
+    trip_id = str(ObjectId())
+
+    async def scenario():
+        db = AsyncDBClient()
+        partial = await db.put_trip_by_doc_id(trip_id, after, before.model_dump(mode="json"))
+        unchanged = await db.put_trip_by_doc_id(trip_id, after, after.model_dump(mode="json"))
+        full = await db.put_trip_by_doc_id(trip_id, after)
+        return partial, unchanged, full
+
+    partial, unchanged, full = asyncio.run(scenario())
+
+    assert (partial, unchanged, full) == (True, False, True)
+    assert collection.updates == [
+        {"$set": {"name": "Lisbon in July"}},
+        {"$set": after.model_dump()},
+    ]
+
+
+def apply_patch(document, patch):
+    """Minimal RFC 6902 add/remove/replace, as a client applies them."""
+    document = copy.deepcopy(document)
+    for op in patch:
+        if op["path"] == "":
+            document = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [p.replace("~1", "/").replace("~0", "~") for p in op["path"][1:].split("/")]
+        target = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        key = int(last) if isinstance(target, list) else last
+        if op["op"] == "remove":
+            del target[key]
+        elif op["op"] == "add" and isinstance(target, list):
+            target.insert(key, op["value"])
+        else:
+            target[key] = op["value"]
+    return document
+
+
+def test_json_patch_removes_and_inserts_single_activities():
+    before = make_trip().model_dump(mode="json")
+    after = copy.deepcopy(before)
+    removed = after["days"][1]["morning_activities"].pop(0)
+    after["days"][2]["morning_activities"].insert(1, removed)
+
+    patch = json_patch(before, after)
+
+    assert patch == [
+        {"op": "remove", "path": "/days/1/morning_activities/0"},
+        {"op": "add", "path": "/days/2/morning_activities/1", "value": removed},
+    ]
+    assert apply_patch(before, patch) == after
+
+
+def test_json_patch_round_trips():
+    before = make_trip().model_dump(mode="json")
+    after = copy.deepcopy(before)
+    after["days"][0]["morning_activities"][2]["start_time"] = "2025-07-10T12:30:00"
+    after["days"][2]["morning_activities"][0] = {"id": 99, "place": {"name": "Tram 28"}}
+    after["days"].append({"date": "2025-07-13", "morning_activities": []})
+    after["original_place_data"] = {"a/b": True, "~": 1}
+    del after["is_group"]
+
+    patch = json_patch(before, after)
+
+    assert apply_patch(before, patch) == after
+    assert json_patch(after, after) == []
+    # 1 == True in Python, not in JSON
+    assert json_patch({"x": 1}, {"x": True}) == [{"op": "replace", "path": "/x", "value": True}]
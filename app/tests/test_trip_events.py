@@ -0,0 +1,119 @@
+import asyncio
+
+import fakeredis
+import httpx
+import orjson
+from fastapi.testclient import TestClient
+
+from app.database.CacheClient import RedisClient
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.routes import websocket_router
+from app.schemas.forms_schema import Form
+from app.services.http_client import http_clients
+from app.services.trip_events import TripEvents, trip_events
+from app.services.trip_jobs import TripJobs, trip_jobs
+from app.services.trip_pipeline import build_recommendation_request
+from app.tests.test_http_client import mock_form_data
+from app.tests.test_trip_jobs import recommendations
+
+form = mock_form_data
+
+
+def replica_cache(server: fakeredis.FakeServer) -> RedisClient:
+    cache = RedisClient(decode_responses=False)
+    cache.redis = fakeredis.FakeAsyncRedis(server=server)
+    return cache
+
+
+def use_stand_in():
+    http_clients.recommendations = httpx.AsyncClient(
+        base_url="http://recommendations",
+        transport=httpx.ASGITransport(app=recommendations),
+    )
+
+
+def test_events_of_a_job_reach_another_replica(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis(server=server))
+    # the job runs on one replica, the websocket is held by another
+    worker = TripJobs(replica_cache(server), workers=1, events=TripEvents(replica_cache(server)))
+    relay = TripEvents(replica_cache(server))
+
+    async def scenario():
+        use_stand_in()
+        worker.start()
+        forms = Form(**form)
+        request_body = build_recommendation_request(forms, "trip-1")
+        async with relay.subscribe("trip-1") as events:
+            await worker.submit(forms, request_body, None)
+            received = [orjson.loads(event) async for event in events]
+        await worker.close()
+        await http_clients.recommendations.aclose()
+        return received
+
+    received = asyncio.run(scenario())
+
+    assert [(e["type"], e["progress"]) for e in received] == [
+        ("progress", 30), ("progress", 80), ("success", 100),
+    ]
+    assert all(e["trip_id"] == "trip-1" for e in received)
+    assert received[-1]["data"]["tripId"] == "trip-1"
+    assert received[-1]["data"]["itinerary"]["city"] == "Lisbon"
+
+
+def use_lifespan_stand_ins(monkeypatch):
+    server = fakeredis.FakeServer()
+    for cache in (trip_repository.cache, trip_jobs.cache, trip_events.cache):
+        monkeypatch.setattr(cache, "redis", fakeredis.FakeAsyncRedis(server=server))
+
+    async def start_stand_in():
+        use_stand_in()
+
+    async def no_indexes(self):
+        pass
+
+    monkeypatch.setattr(http_clients, "start", start_stand_in)
+    monkeypatch.setattr(AsyncDBClient, "ensure_indexes", no_indexes)
+
+
+def test_websocket_relays_the_trip_creation(monkeypatch):
+    use_lifespan_stand_ins(monkeypatch)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/trip-creation") as websocket:
+            assert websocket.receive_json()["type"] == "connection"
+            websocket.send_json({**form, "guest": True})
+            messages = [websocket.receive_json() for _ in range(5)]
+
+    assert [(m["type"], m["progress"]) for m in messages] == [
+        ("progress", 10), ("progress", 20), ("progress", 30), ("progress", 80), ("success", 100),
+    ]
+    trip_id = messages[0]["trip_id"]
+    assert messages[-1]["data"]["tripId"] == trip_id
+    assert messages[-1]["data"]["preference_id"] is None
+
+
+def test_lost_final_event_is_read_from_the_job_record(monkeypatch):
+    use_lifespan_stand_ins(monkeypatch)
+    publish = trip_events.publish
+
+    async def lossy_publish(trip_id, event):
+        if event["type"] == "success":
+            return False  # as if Redis failed
+        return await publish(trip_id, event)
+
+    monkeypatch.setattr(trip_events, "publish", lossy_publish)
+    monkeypatch.setattr(websocket_router, "WS_CREATION_TIMEOUT", 0.5)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/trip-creation") as websocket:
+            websocket.receive_json()
+            websocket.send_json({**form, "guest": True})
+            messages = [websocket.receive_json() for _ in range(5)]
+
+    success = messages[-1]
+    assert (success["type"], success["progress"]) == ("success", 100)
+    assert success["data"]["tripId"] == messages[0]["trip_id"]
+    assert success["data"]["itinerary"]["city"] == "Lisbon"
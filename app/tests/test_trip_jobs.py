@@ -0,0 +1,145 @@
+import asyncio
+
+import fakeredis
+import httpx
+from fastapi import FastAPI, Response
+
+from app.database.TripCodec import TripCodec
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.services.http_client import http_clients
+from app.services.trip_jobs import trip_jobs
+from app.tests.test_http_client import mock_form_data
+
+# Local stand-in for the recommendations service that records how many
+# requests it serves at once
+recommendations = FastAPI()
+concurrency = {"now": 0, "max": 0}
+
+
+@recommendations.post("/trip")
+async def fake_trip(body: dict):
+    if body["budget"] < 0:
+        return Response("budget must be positive", status_code=422)
+    concurrency["now"] += 1
+    concurrency["max"] = max(concurrency["max"], concurrency["now"])
+    await asyncio.sleep(0.05)
+    concurrency["now"] -= 1
+    return {
+        "itinerary": {
+            "start_date": body["start_date"],
+            "end_date": body["end_date"],
+            "name": body["name"],
+            "days": [],
+            "is_group": body["is_group"],
+        }
+    }
+
+
+def run_jobs(monkeypatch, scenario, workers: int = 2, queue_size: int = 10):
+    concurrency.update(now=0, max=0)
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(trip_jobs.cache, "redis", fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(trip_jobs, "workers", workers)
+    monkeypatch.setattr(trip_jobs, "queue_size", queue_size)
+
+    async def run():
+        monkeypatch.setattr(
+            http_clients,
+            "recommendations",
+            httpx.AsyncClient(
+                base_url="http://recommendations",
+                transport=httpx.ASGITransport(app=recommendations),
+            ),
+        )
+        trip_jobs.start()
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                return await scenario(client)
+        finally:
+            await trip_jobs.close()
+            await http_clients.recommendations.aclose()
+
+    return asyncio.run(run())
+
+
+def create_trip_job(client, **changes):
+    form = {**mock_form_data, **changes}
+    return client.post("/api/trips", params={"job": "true"}, json=form)
+
+
+async def wait_for(client, job_id: str) -> dict:
+    while True:
+        job = (await client.get(f"/api/jobs/{job_id}")).json()["response"]
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+
+
+def test_job_creates_the_trip_in_the_background(monkeypatch):
+    async def scenario(client):
+        accepted = await create_trip_job(client)
+        job_id = accepted.json()["response"]["job_id"]
+        queued = (await client.get(f"/api/jobs/{job_id}")).json()["response"]
+        job = await wait_for(client, job_id)
+        cached = await trip_repository.cache.redis.get(job["trip_id"])
+        return accepted, queued, job, cached
+
+    accepted, queued, job, cached = run_jobs(monkeypatch, scenario)
+
+    assert accepted.status_code == 202
+    body = accepted.json()["response"]
+    assert accepted.headers["Location"] == body["status_url"] == f"/api/jobs/{body['job_id']}"
+    assert queued["status"] in ("queued", "running")
+    assert (job["status"], job["stage"], job["progress"]) == ("succeeded", "done", 100)
+    assert job["trip_id"] == body["trip_id"] == job["result"]["tripId"]
+    assert job["result"]["itinerary"]["trip_type"] == "place"
+    assert TripCodec.decode(cached) == job["result"]["itinerary"]
+
+
+def test_workers_bound_the_upstream_concurrency(monkeypatch):
+    async def scenario(client):
+        accepted = await asyncio.gather(*(create_trip_job(client) for _ in range(6)))
+        return await asyncio.gather(
+            *(wait_for(client, r.json()["response"]["job_id"]) for r in accepted)
+        )
+
+    jobs = run_jobs(monkeypatch, scenario, workers=2)
+
+    assert all(job["status"] == "succeeded" for job in jobs)
+    assert concurrency["max"] == 2
+
+
+def test_full_queue_is_refused_with_retry_after(monkeypatch):
+    async def scenario(client):
+        return [await create_trip_job(client) for _ in range(3)]
+
+    # no worker takes the jobs off the queue
+    first, second, refused = run_jobs(monkeypatch, scenario, workers=0, queue_size=2)
+
+    assert first.status_code == second.status_code == 202
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == "5"
+
+
+def test_failed_job_reports_the_upstream_error(monkeypatch):
+    async def scenario(client):
+        accepted = await create_trip_job(client, budget=-1)
+        return await wait_for(client, accepted.json()["response"]["job_id"])
+
+    job = run_jobs(monkeypatch, scenario)
+
+    assert job["status"] == "failed"
+    assert job["stage"] == "recommendations"
+    assert job["message"] == "Error from recommendations service"
+    assert job["error"] == "budget must be positive"
+    assert job["result"] is None
+
+
+def test_unknown_job_is_not_found(monkeypatch):
+    async def scenario(client):
+        return await client.get("/api/jobs/missing")
+
+    assert run_jobs(monkeypatch, scenario).status_code == 404
@@ -0,0 +1,81 @@
+import orjson
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.database.MongoClient import AsyncDBClient
+from app.main import app
+
+client = TestClient(app)
+
+documents = [
+    {"_id": ObjectId(), "name": f"Trip {i}", "end_date": "2025-07-17", "is_group": False}
+    for i in range(7)
+]
+
+
+class FakeCursor:
+    def __init__(self, docs, batch_size=None):
+        self.docs = docs
+        self.batch_size = batch_size
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, limit):
+        self.docs = self.docs[:limit]
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def find(self, filter, batch_size=None):
+        self.batch_sizes.append(batch_size)
+        after = filter.get("_id", {}).get("$gt")
+        return FakeCursor([doc for doc in documents if after is None or doc["_id"] > after])
+
+
+def test_keyset_pages_cover_the_collection_once(monkeypatch):
+    monkeypatch.setattr(AsyncDBClient(), "collection", FakeCollection())
+
+    seen, after, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"after": after} if after else {})}
+        response = client.get("/api/trips/all", params=params)
+        assert response.status_code == 200
+        page = response.json()["response"]
+        assert len(page["trips"]) <= 3
+        seen += [trip["_id"] for trip in page["trips"]]
+        pages += 1
+        after = page["next"]
+        if after is None:
+            break
+
+    assert seen == sorted(str(doc["_id"]) for doc in documents)
+    assert pages == 3
+
+
+def test_page_size_and_cursor_are_validated():
+    assert client.get("/api/trips/all", params={"limit": 0}).status_code == 422
+    assert client.get("/api/trips/all", params={"limit": 10_000}).status_code == 422
+    assert client.get("/api/trips/all", params={"after": "not-an-id"}).status_code == 400
+
+
+def test_stream_writes_one_trip_per_line(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(AsyncDBClient(), "collection", collection)
+
+    response = client.get("/api/trips/all/stream")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    assert [orjson.loads(line)["name"] for line in lines] == [doc["name"] for doc in documents]
+    # the cursor is read in bounded batches
+    assert collection.batch_sizes[0] is not None
@@ -0,0 +1,148 @@
+import asyncio
+
+import fakeredis
+import httpx
+import orjson
+from fastapi import FastAPI, Response
+
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripCodec import TripCodec
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.schemas.forms_schema import Form
+from app.schemas.trips_schema import Trip
+from app.services.http_client import http_clients
+from app.services.trip_pipeline import build_recommendation_request, generate_trip
+from app.tests.test_http_client import mock_form_data
+
+# Local stand-in for the recommendations service; like the real one it does
+# not know the trip_type or the coordinates of the trip, and it keeps each
+# itinerary by trip id for the activity edits
+recommendations = FastAPI()
+upstream_calls = []
+upstream_trips = {}
+
+activity = {
+    "id": 1,
+    "place": {"name": "Belém Tower", "location": {"latitude": 38.69, "longitude": -9.22}, "types": ["museum"]},
+    "start_time": "09:00",
+    "end_time": "10:30",
+    "activity_type": "visit",
+    "duration": 90,
+}
+
+
+@recommendations.post("/trip")
+async def fake_trip(body: dict):
+    upstream_calls.append(body["trip_id"])
+    await asyncio.sleep(0.05)
+    itinerary = {
+        "start_date": body["start_date"],
+        "end_date": body["end_date"],
+        "name": body["name"],
+        "days": [{"date": body["start_date"][:10], "morning_activities": [activity]}],
+        "is_group": body["is_group"],
+    }
+    upstream_trips[body["trip_id"]] = itinerary
+    return {"itinerary": itinerary}
+
+
+@recommendations.delete("/trip/{trip_id}/delete-activity/{activity_id}")
+async def fake_delete_activity(trip_id: str, activity_id: int):
+    if trip_id not in upstream_trips:
+        return Response("trip not found", status_code=404)
+    itinerary = upstream_trips[trip_id]
+    for day in itinerary["days"]:
+        day["morning_activities"] = [a for a in day["morning_activities"] if a["id"] != activity_id]
+    return {"response": {"itinerary": itinerary}}
+
+
+def use_stand_in(monkeypatch):
+    monkeypatch.setattr(
+        http_clients,
+        "recommendations",
+        httpx.AsyncClient(
+            base_url="http://recommendations",
+            transport=httpx.ASGITransport(app=recommendations),
+        ),
+    )
+
+
+def test_generate_trip_validates_once_and_applies_form(monkeypatch):
+    forms = Form(**mock_form_data)
+
+    async def generate():
+        use_stand_in(monkeypatch)
+        request_body = build_recommendation_request(forms, "trip-1")
+        generated = await generate_trip(forms, request_body, timeout=5)
+        await http_clients.recommendations.aclose()
+        return generated
+
+    generated = asyncio.run(generate())
+
+    assert isinstance(generated.itinerary, Trip)
+    assert generated.itinerary.trip_type == "place"
+    assert generated.itinerary.place_coordinates.latitude == 38.72
+    itinerary = orjson.loads(generated.itinerary_json)
+    assert itinerary == generated.itinerary.model_dump(mode="json")
+    assert itinerary["city"] == "Lisbon"
+
+
+def test_created_trip_is_cached_as_returned(monkeypatch):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+
+    async def create_trip():
+        use_stand_in(monkeypatch)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post("/api/trips", json=mock_form_data)
+        await http_clients.recommendations.aclose()
+        body = response.json()["response"]
+        cached = await trip_repository.cache.redis.get(body["tripId"])
+        return response, body, cached
+
+    response, body, cached = asyncio.run(create_trip())
+
+    assert response.status_code == 200
+    assert body["preference_id"] is None
+    assert body["itinerary"]["trip_type"] == "place"
+    assert TripCodec.decode(cached) == body["itinerary"]
+
+
+def test_identical_trips_can_each_be_edited(monkeypatch):
+    monkeypatch.setattr(trip_repository.cache, "redis", fakeredis.FakeAsyncRedis())
+    upstream_calls.clear()
+    upstream_trips.clear()
+
+    async def fake_bulk_write(self, operations, ordered=False):
+        pass
+
+    monkeypatch.setattr(AsyncDBClient, "bulk_write", fake_bulk_write)
+
+    async def scenario():
+        use_stand_in(monkeypatch)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            first, second = [
+                (await client.post("/api/trips", json=mock_form_data)).json()["response"]["tripId"]
+                for _ in range(2)
+            ]
+            deleted = await client.delete(f"/api/trip/{second}/activity/1")
+            edited = await trip_repository.get(second)
+            untouched = await trip_repository.get(first)
+        await http_clients.recommendations.aclose()
+        await trip_repository.write_behind.flush()
+        return first, second, deleted, edited, untouched
+
+    first, second, deleted, edited, untouched = asyncio.run(scenario())
+
+    # the recommendations service generated and holds both trips
+    assert upstream_calls == [first, second]
+    assert deleted.status_code == 200
+    assert edited["days"][0]["morning_activities"] == []
+    # what this service keeps about the trip survives the upstream's edit
+    for field in ("trip_type", "country", "city", "original_place_data", "place_coordinates"):
+        assert edited[field] == untouched[field] is not None
+    assert untouched["days"][0]["morning_activities"][0]["id"] == 1
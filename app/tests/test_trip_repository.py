@@ -0,0 +1,205 @@
+import asyncio
+
+import fakeredis
+
+from app.database.CacheClient import RedisClient
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import TripRepository
+from app.schemas.trips_schema import Trip
+
+stored_trip = Trip(name="Stored trip", end_date="2025-08-03", trip_type="place", is_group=False)
+
+
+def make_repository() -> TripRepository:
+    cache = RedisClient()
+    cache.redis = fakeredis.FakeAsyncRedis()
+    return TripRepository(cache)
+
+
+def test_read_through_hits_mongo_once(monkeypatch):
+    mongo_reads = []
+
+    async def fake_get_trip_by_id(self, id):
+        mongo_reads.append(id)
+        return stored_trip.model_copy()
+
+    monkeypatch.setattr(AsyncDBClient, "get_trip_by_id", fake_get_trip_by_id)
+    repository = make_repository()
+
+    async def read_twice():
+        return await repository.get("trip-1"), await repository.get("trip-1")
+
+    first, second = asyncio.run(read_twice())
+
+    assert first == second
+    assert first["name"] == "Stored trip"
+    assert mongo_reads == ["trip-1"]
+
+
+def test_update_writes_through_to_the_cache(monkeypatch):
+    async def fake_get_trip_by_id(self, id):
+        return stored_trip.model_copy()
+
+    async def fake_put_trip_by_doc_id(self, id, trip, previous=None):
+        return True
+
+    monkeypatch.setattr(AsyncDBClient, "get_trip_by_id", fake_get_trip_by_id)
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", fake_put_trip_by_doc_id)
+    repository = make_repository()
+
+    async def read_update_read():
+        await repository.get("trip-1")
+        updated = stored_trip.model_copy(update={"name": "Renamed trip"})
+        assert await repository.update("trip-1", updated) is True
+        return await repository.get("trip-1")
+
+    assert asyncio.run(read_update_read())["name"] == "Renamed trip"
+
+
+def test_failed_mongo_write_leaves_cache_untouched(monkeypatch):
+    async def failing_put(self, id, trip, previous=None):
+        return "Error updating trip: connection refused"
+
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", failing_put)
+    repository = make_repository()
+
+    async def scenario():
+        await repository.cache_draft("trip-1", stored_trip)
+        try:
+            await repository.update("trip-1", stored_trip.model_copy(update={"name": "Lost"}))
+        except RuntimeError:
+            pass
+        return await repository.get("trip-1")
+
+    assert asyncio.run(scenario())["name"] == "Stored trip"
+
+
+def test_write_through_supersedes_pending_write_behind(monkeypatch):
+    puts = []
+
+    async def fake_put_trip_by_doc_id(self, id, trip, previous=None):
+        puts.append(previous)
+        return True
+
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", fake_put_trip_by_doc_id)
+    repository = make_repository()
+    trip_id = "64b7f0c2a1b2c3d4e5f60718"
+
+    async def scenario():
+        await repository.update_later(trip_id, stored_trip.model_copy(update={"name": "Edited"}))
+        assert trip_id in repository.write_behind
+        await repository.update(trip_id, stored_trip.model_copy(update={"name": "Saved"}))
+        return await repository.get(trip_id)
+
+    assert asyncio.run(scenario())["name"] == "Saved"
+    # MongoDB was behind the cache, so the whole trip was written
+    assert puts == [None]
+    assert trip_id not in repository.write_behind
+
+
+def test_slow_read_does_not_overwrite_a_newer_update(monkeypatch):
+    read_started = asyncio.Event()
+    update_done = asyncio.Event()
+
+    async def slow_get_trip_by_id(self, id):
+        read_started.set()
+        await update_done.wait()
+        return stored_trip.model_copy()  # the version before the update
+
+    async def slow_get_trips_by_ids(self, ids):
+        read_started.set()
+        await update_done.wait()
+        return {id: stored_trip.model_copy() for id in ids}
+
+    async def fake_put_trip_by_doc_id(self, id, trip, previous=None):
+        return True
+
+    monkeypatch.setattr(AsyncDBClient, "get_trip_by_id", slow_get_trip_by_id)
+    monkeypatch.setattr(AsyncDBClient, "get_trips_by_ids", slow_get_trips_by_ids)
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", fake_put_trip_by_doc_id)
+
+    async def race(read):
+        repository = make_repository()
+        read_started.clear()
+        update_done.clear()
+        reading = asyncio.create_task(read(repository))
+        await read_started.wait()
+        await repository.update("trip-1", stored_trip.model_copy(update={"name": "Renamed trip"}))
+        update_done.set()
+        await reading
+        return await repository.get("trip-1")
+
+    async def scenario():
+        return (
+            await race(lambda repository: repository.get("trip-1")),
+            await race(lambda repository: repository.get_many(["trip-1"])),
+        )
+
+    after_get, after_get_many = asyncio.run(scenario())
+
+    assert after_get["name"] == after_get_many["name"] == "Renamed trip"
+
+
+def test_version_mongo_did_not_take_is_not_a_diff_base(monkeypatch):
+    puts = []
+    mongo_up = False
+
+    async def flaky_put(self, id, trip, previous=None):
+        puts.append(previous)
+        return True if mongo_up else "Error updating trip: connection refused"
+
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", flaky_put)
+    repository = make_repository()
+    trip_id = "64b7f0c2a1b2c3d4e5f60718"
+
+    async def scenario():
+        nonlocal mongo_up
+        await repository.cache_draft(trip_id, stored_trip)
+        regenerated = stored_trip.model_copy(update={"name": "Regenerated"})
+        try:
+            await repository.update(trip_id, regenerated)
+        except RuntimeError:
+            # what the regeneration endpoints do when MongoDB fails
+            await repository.update_later(trip_id, regenerated)
+        mongo_up = True
+        await repository.update(trip_id, regenerated.model_copy(update={"budget": 10}))
+
+    asyncio.run(scenario())
+
+    # the first write diffed against the stored version; the cache then held
+    # a version MongoDB never got, so the next one was a full write
+    assert puts[0]["name"] == "Stored trip"
+    assert puts[1] is None
+
+
+def test_write_behind_waits_for_a_write_through_in_progress(monkeypatch):
+    writing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_put(self, id, trip, previous=None):
+        writing.set()
+        await release.wait()
+        return True
+
+    monkeypatch.setattr(AsyncDBClient, "put_trip_by_doc_id", slow_put)
+    repository = make_repository()
+    trip_id = "64b7f0c2a1b2c3d4e5f60718"
+
+    async def scenario():
+        saving = asyncio.create_task(
+            repository.update(trip_id, stored_trip.model_copy(update={"name": "Saved"}))
+        )
+        await writing.wait()
+        editing = asyncio.create_task(
+            repository.update_later(trip_id, stored_trip.model_copy(update={"name": "Edited"}))
+        )
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(saving, editing)
+        return await repository.get(trip_id)
+
+    cached = asyncio.run(scenario())
+
+    # the cache and the write still pending for MongoDB agree
+    assert cached["name"] == "Edited"
+    assert repository.write_behind._pending[trip_id][1].name == "Edited"
@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+import orjson
+from fastapi.testclient import TestClient
+
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.services.http_client import http_clients
+from app.services.trip_events import trip_events
+from app.services.trip_jobs import trip_jobs
+from app.services.trip_pipeline import NDJSON, build_recommendation_request, request_recommendations
+from app.schemas.forms_schema import Form
+from app.tests.test_http_client import mock_form_data
+
+DAY_DELAY = 0.1
+
+# Local stand-in for a recommendations service that generates the itinerary
+# one day at a time, and streams it when asked to. A transport rather than
+# an ASGI app, since httpx's ASGITransport buffers the whole response.
+upstream = {"streams": True}
+
+
+def day(index: int) -> dict:
+    return {
+        "date": f"2025-07-1{index}",
+        "morning_activities": [{
+            "id": index,
+            "place": {"name": f"Place {index}", "location": {"latitude": 38.7, "longitude": -9.1}, "types": []},
+            "start_time": f"2025-07-1{index}T09:00:00",
+            "end_time": f"2025-07-1{index}T10:00:00",
+            "activity_type": "visit",
+            "duration": 60,
+        }],
+    }
+
+
+def itinerary(body: dict) -> dict:
+    return {
+        "start_date": body["start_date"],
+        "end_date": body["end_date"],
+        "name": body["name"],
+        "is_group": body["is_group"],
+    }
+
+
+async def fake_trip(request: httpx.Request) -> httpx.Response:
+    body = orjson.loads(request.content)
+    if not (upstream["streams"] and NDJSON in request.headers.get("accept", "")):
+        await asyncio.sleep(DAY_DELAY * 3)
+        return httpx.Response(200, json={"itinerary": {**itinerary(body), "days": [day(i) for i in range(3)]}})
+
+    async def lines():
+        for index in range(3):
+            await asyncio.sleep(DAY_DELAY)
+            yield orjson.dumps({"day": day(index)}) + b"\n"
+        yield orjson.dumps({"itinerary": itinerary(body)}) + b"\n"
+
+    return httpx.Response(200, headers={"content-type": NDJSON}, content=lines())
+
+
+def use_stand_in():
+    http_clients.recommendations = httpx.AsyncClient(
+        base_url="http://recommendations", transport=httpx.MockTransport(fake_trip)
+    )
+
+
+def request_with_days(monkeypatch, streams: bool):
+    monkeypatch.setitem(upstream, "streams", streams)
+    request_body = build_recommendation_request(Form(**mock_form_data), "trip-1")
+    days = []
+
+    async def on_day(index: int, day: dict):
+        days.append((index, day["date"], time.perf_counter() - started))
+
+    async def scenario():
+        use_stand_in()
+        content = await request_recommendations(request_body, 5, on_day)
+        await http_clients.recommendations.aclose()
+        return content
+
+    started = time.perf_counter()
+    content = asyncio.run(scenario())
+    return orjson.loads(content)["itinerary"], days, time.perf_counter() - started
+
+
+def test_days_are_passed_on_as_they_arrive(monkeypatch):
+    itinerary, days, elapsed = request_with_days(monkeypatch, streams=True)
+
+    assert [(index, date) for index, date, _ in days] == [
+        (0, "2025-07-10"), (1, "2025-07-11"), (2, "2025-07-12"),
+    ]
+    # the first day is seen after one day's generation, not the whole trip's
+    assert days[0][2] < DAY_DELAY * 2 < elapsed
+    assert [d["date"] for d in itinerary["days"]] == ["2025-07-10", "2025-07-11", "2025-07-12"]
+    assert itinerary["name"] == "Trip to Lisbon"
+
+
+def test_an_upstream_that_does_not_stream_is_read_whole(monkeypatch):
+    itinerary, days, _ = request_with_days(monkeypatch, streams=False)
+
+    assert days == []
+    assert len(itinerary["days"]) == 3
+
+
+def test_websocket_receives_each_day_before_the_trip(monkeypatch):
+    server = fakeredis.FakeServer()
+    for cache in (trip_repository.cache, trip_jobs.cache, trip_events.cache):
+        monkeypatch.setattr(cache, "redis", fakeredis.FakeAsyncRedis(server=server))
+
+    async def start_stand_in():
+        use_stand_in()
+
+    async def no_indexes(self):
+        pass
+
+    monkeypatch.setattr(http_clients, "start", start_stand_in)
+    monkeypatch.setattr(AsyncDBClient, "ensure_indexes", no_indexes)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/trip-creation") as websocket:
+            websocket.receive_json()
+            websocket.send_json({**mock_form_data, "guest": True})
+            messages = []
+            while not messages or messages[-1]["type"] not in ("success", "error"):
+                messages.append(websocket.receive_json())
+
+    days = [m for m in messages if m["type"] == "day"]
+    assert [d["index"] for d in days] == [0, 1, 2]
+    assert days[0]["day"]["morning_activities"][0]["place"]["name"] == "Place 0"
+    assert [d["progress"] for d in days] == sorted(d["progress"] for d in days)
+    success = messages[-1]
+    assert success["type"] == "success"
+    assert [d["date"] for d in success["data"]["itinerary"]["days"]] == [d["day"]["date"] for d in days]
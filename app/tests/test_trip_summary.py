@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.database.MongoClient import SUMMARY_PROJECTION, TRIP_INDEXES, AsyncDBClient
+from app.main import app
+
+client = TestClient(app)
+
+trip_id = ObjectId()
+# what MongoDB returns for SUMMARY_PROJECTION: no days, a computed day_count
+projected_doc = {
+    "_id": trip_id,
+    "name": "Lisbon",
+    "start_date": datetime(2025, 7, 10),
+    "end_date": datetime(2025, 7, 13),
+    "trip_type": "place",
+    "city": "Lisbon",
+    "country": "Portugal",
+    "is_group": False,
+    "day_count": 3,
+}
+
+
+class FakeCollection:
+    def __init__(self):
+        self.projections = []
+        self.indexes = None
+
+    async def find_one(self, filter, projection=None):
+        self.projections.append(projection)
+        return dict(projected_doc) if filter["_id"] == trip_id else None
+
+    async def create_indexes(self, indexes):
+        self.indexes = indexes
+        return [index.document["name"] for index in indexes]
+
+
+def test_trip_summary_is_projected_server_side(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(AsyncDBClient(), "collection", collection)
+
+    response = client.get(f"/api/trips/{trip_id}/summary")
+
+    assert response.status_code == 200
+    summary = response.json()["response"]
+    assert summary["id"] == str(trip_id)
+    assert summary["day_count"] == 3
+    assert summary["start_date"] == "2025-07-10T00:00:00"
+    assert "days" not in summary
+    assert collection.projections == [SUMMARY_PROJECTION]
+    assert "days" not in SUMMARY_PROJECTION
+
+    assert client.get(f"/api/trips/{ObjectId()}/summary").status_code == 404
+
+
+def test_summaries_route_is_not_taken_for_a_trip_id(monkeypatch):
+    async def fake_summaries(self, ids):
+        return {}
+
+    monkeypatch.setattr(AsyncDBClient, "get_trip_summaries", fake_summaries)
+
+    response = client.get("/api/trips/summaries", params={"ids": "a,b"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == {"summaries": [], "missing": ["a", "b"]}
+
+
+def test_ensure_indexes(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(AsyncDBClient(), "collection", collection)
+
+    created = asyncio.run(AsyncDBClient().ensure_indexes())
+
+    assert created == ["trip_type", "city", "country", "start_date"]
+    assert collection.indexes is TRIP_INDEXES
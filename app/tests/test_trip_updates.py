@@ -0,0 +1,101 @@
+import asyncio
+import copy
+
+import fakeredis
+import httpx
+import orjson
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database.CacheClient import RedisClient
+from app.database.MongoClient import AsyncDBClient
+from app.database.TripRepository import trip_repository
+from app.main import app
+from app.services.http_client import http_clients
+from app.services.trip_events import TripEvents, trip_events
+from app.services.trip_updates import TripUpdates, trip_updates
+from app.tests.test_trip_diff import apply_patch, make_trip
+
+
+def fake_cache(server: fakeredis.FakeServer) -> RedisClient:
+    cache = RedisClient(decode_responses=False)
+    cache.redis = fakeredis.FakeAsyncRedis(server=server)
+    return cache
+
+
+def test_patches_chain_versions_and_fall_back_to_snapshots():
+    server = fakeredis.FakeServer()
+    updates = TripUpdates(fake_cache(server), TripEvents(fake_cache(server)))
+    v0 = make_trip().model_dump(mode="json")
+    v1 = copy.deepcopy(v0)
+    v1["days"][0]["morning_activities"].pop(1)
+    v2 = copy.deepcopy(v1)
+    v2["name"] = "Lisbon in July"
+
+    async def scenario():
+        first = await updates.publish("trip-1", v0, v1)
+        second = await updates.publish("trip-1", v1, v2)
+        # computed from a version that is no longer the current one
+        stale = await updates.publish("trip-1", v0, v1)
+        return first, second, stale
+
+    first, second, stale = asyncio.run(scenario())
+
+    # nothing was versioned yet, so no client can hold the base
+    assert (first["type"], first["version"]) == ("snapshot", 1)
+    assert first["itinerary"] == v1
+    assert (second["type"], second["version"], second["base_version"]) == ("patch", 2, 1)
+    assert second["patch"] == [{"op": "replace", "path": "/name", "value": "Lisbon in July"}]
+    assert (stale["type"], stale["version"]) == ("snapshot", 3)
+
+
+# Local stand-in for the recommendations service
+recommendations = FastAPI()
+
+
+@recommendations.delete("/trip/{trip_id}/delete-activity/{activity_id}")
+async def fake_delete_activity(trip_id: str, activity_id: str):
+    itinerary = make_trip().model_dump(mode="json")
+    itinerary["days"][1]["morning_activities"] = [
+        a for a in itinerary["days"][1]["morning_activities"] if str(a["id"]) != activity_id
+    ]
+    return {"response": {"itinerary": itinerary}}
+
+
+def test_watchers_receive_a_small_patch_after_an_edit(monkeypatch):
+    server = fakeredis.FakeServer()
+    for cache in (trip_repository.cache, trip_events.cache, trip_updates.cache):
+        monkeypatch.setattr(cache, "redis", fakeredis.FakeAsyncRedis(server=server))
+
+    async def start_stand_in():
+        http_clients.recommendations = httpx.AsyncClient(
+            base_url="http://recommendations",
+            transport=httpx.ASGITransport(app=recommendations),
+        )
+
+    async def no_indexes(self):
+        pass
+
+    monkeypatch.setattr(http_clients, "start", start_stand_in)
+    monkeypatch.setattr(AsyncDBClient, "ensure_indexes", no_indexes)
+    trip = make_trip()
+
+    with TestClient(app) as client:
+        client.portal.call(trip_repository.cache_draft, "trip-1", trip)
+        with client.websocket_connect("/ws/trip/trip-1/watch") as websocket:
+            assert websocket.receive_json()["type"] == "connection"
+            snapshot = websocket.receive_json()
+            response = client.delete("/api/trip/trip-1/activity/11")
+            raw = websocket.receive_text()
+            # a client that lost track asks for the trip again
+            websocket.send_json({"type": "sync"})
+            resync = websocket.receive_json()
+
+    assert response.status_code == 200
+    assert (snapshot["type"], snapshot["version"]) == ("snapshot", 0)
+    patch = orjson.loads(raw)
+    assert (patch["type"], patch["version"], patch["base_version"]) == ("patch", 1, 0)
+    assert patch["patch"] == [{"op": "remove", "path": "/days/1/morning_activities/1"}]
+    assert len(raw) < 200 < len(orjson.dumps(snapshot))
+    assert (resync["type"], resync["version"]) == ("snapshot", 1)
+    assert apply_patch(snapshot["itinerary"], patch["patch"]) == resync["itinerary"]
@@ -0,0 +1,84 @@
+import asyncio
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database import ActivityUpdates
+from app.database.WriteBehind import WriteBehindQueue
+from app.schemas.trips_schema import Trip
+
+first, second = str(ObjectId()), str(ObjectId())
+
+
+def trip(name: str) -> Trip:
+    return Trip(name=name, start_date="2025-07-10", end_date="2025-07-12", trip_type="place", is_group=False)
+
+
+def snapshot(trip_id: str, name: str) -> UpdateOne:
+    return UpdateOne({"_id": ObjectId(trip_id)}, {"$set": trip(name).model_dump()})
+
+
+class FakeMongo:
+    def __init__(self, fail=None):
+        self.batches = []
+        self.fail = fail
+
+    async def bulk_write(self, operations):
+        self.batches.append(operations)
+        if self.fail:
+            error, self.fail = self.fail, None
+            raise error
+
+
+def test_edits_to_one_trip_are_coalesced():
+    mongo = FakeMongo()
+    queue = WriteBehindQueue(mongo.bulk_write, batch_size=10)
+    edit = ActivityUpdates.delete_activity(first, 1)
+
+    queue.mark(first, trip("once"), edit)
+    queue.mark(second, trip("v1"), ActivityUpdates.delete_activity(second, 1))
+    queue.mark(second, trip("v2"), ActivityUpdates.delete_activity(second, 2))
+    queue.mark("draft-without-object-id", trip("draft"))
+    asyncio.run(queue.flush())
+
+    assert mongo.batches == [[UpdateOne(**edit), snapshot(second, "v2")]]
+    assert len(queue) == 0
+
+
+def test_failed_writes_are_retried_as_snapshots():
+    failure = BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "boom"}]})
+    mongo = FakeMongo(fail=failure)
+    queue = WriteBehindQueue(mongo.bulk_write, batch_size=10)
+
+    queue.mark(first, trip("a"), ActivityUpdates.delete_activity(first, 1))
+    queue.mark(second, trip("b"), ActivityUpdates.delete_activity(second, 1))
+
+    async def flush_twice():
+        return await queue.flush(), await queue.flush()
+
+    assert asyncio.run(flush_twice()) == (False, True)
+    # only the failed write is retried, as a $set of the trip
+    assert mongo.batches[1] == [snapshot(second, "b")]
+
+
+def test_worker_flushes_in_batches_and_close_drains():
+    mongo = FakeMongo()
+    queue = WriteBehindQueue(mongo.bulk_write, batch_size=2, flush_interval=60)
+
+    async def scenario():
+        queue.start()
+        for i in range(3):
+            queue.mark(str(ObjectId()), trip(f"trip {i}"))
+        # a full batch wakes the worker before the interval
+        await asyncio.sleep(0.05)
+        flushed_early = len(mongo.batches)
+        await queue.close()
+        return flushed_early
+
+    flushed_early = asyncio.run(scenario())
+
+    assert flushed_early >= 1
+    assert sum(len(batch) for batch in mongo.batches) == 3
+    assert all(len(batch) <= 2 for batch in mongo.batches)
+    assert len(queue) == 0
@@ -0,0 +1,151 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import fakeredis
+import orjson
+from fastapi import status
+from fastapi.websockets import WebSocketState
+
+from app.database.CacheClient import RedisClient
+from app.routes.websocket_router import ConnectionManager
+from app.services.trip_events import TripEvents
+
+
+class FakeSocket:
+    """Stands in for a client's websocket; a stuck one never finishes a send."""
+
+    def __init__(self, stuck: bool = False):
+        self.client_state = WebSocketState.CONNECTED
+        self.sent = []
+        self.closed = None
+        self.stuck = stuck
+
+    async def send_text(self, text: str):
+        if self.stuck:
+            await asyncio.Event().wait()
+        self.sent.append(orjson.loads(text))
+
+    async def close(self, code: int):
+        self.closed = code
+
+
+def replica_events(server: fakeredis.FakeServer) -> TripEvents:
+    cache = RedisClient(decode_responses=False)
+    cache.redis = fakeredis.FakeAsyncRedis(server=server)
+    return TripEvents(cache)
+
+
+def event(type: str, progress: int) -> bytes:
+    return orjson.dumps({"type": type, "progress": progress})
+
+
+def test_published_events_reach_every_watcher_of_the_trip():
+    server = fakeredis.FakeServer()
+    manager = ConnectionManager(replica_events(server))
+    # e.g. an edit made through another replica
+    publisher = replica_events(server)
+    sockets = [FakeSocket() for _ in range(3)]
+
+    async def scenario():
+        subscribers = [await manager.connect(s, "trip-1") for s in sockets]
+        other_trip = FakeSocket()
+        await manager.connect(other_trip, "trip-2")
+        for progress in (30, 80):
+            await publisher.publish("trip-1", {"type": "progress", "progress": progress})
+        await publisher.publish("trip-1", {"type": "success", "progress": 100})
+        await asyncio.sleep(0.05)
+        for subscriber in subscribers:
+            manager.disconnect(subscriber)
+        return other_trip
+
+    other_trip = asyncio.run(scenario())
+
+    for socket in sockets:
+        assert [e["progress"] for e in socket.sent] == [30, 80, 100]
+    assert other_trip.sent == []
+    assert "trip-1" not in manager.subscribers
+
+
+def test_a_stuck_socket_does_not_delay_the_others():
+    manager = ConnectionManager(replica_events(fakeredis.FakeServer()), max_queue=4)
+    fast, stuck = FakeSocket(), FakeSocket(stuck=True)
+
+    async def scenario():
+        await manager.connect(fast, "trip-1")
+        slow = await manager.connect(stuck, "trip-1")
+        for progress in range(10):
+            manager.broadcast("trip-1", event("progress", progress))
+            await asyncio.sleep(0)
+        return slow
+
+    slow = asyncio.run(scenario())
+
+    assert [e["progress"] for e in fast.sent] == list(range(10))
+    # superseded progress events were dropped from the stuck socket's queue
+    assert [text for _, text in slow.pending][-1] == event("progress", 9).decode()
+    assert len(slow.pending) <= 4 and slow.coalesced > 0
+    assert stuck.closed is None
+
+
+def test_a_socket_that_cannot_keep_up_is_dropped():
+    manager = ConnectionManager(replica_events(fakeredis.FakeServer()), max_queue=4)
+    stuck = FakeSocket(stuck=True)
+
+    async def scenario():
+        slow = await manager.connect(stuck, "trip-1")
+        # not coalesced, every one of them has to be delivered
+        for version in range(6):
+            manager.broadcast("trip-1", event("update", version))
+        await asyncio.sleep(0.01)
+        return slow
+
+    slow = asyncio.run(scenario())
+
+    assert slow.finished.is_set()
+    assert stuck.closed == status.WS_1013_TRY_AGAIN_LATER
+    assert manager.dropped == 1
+    assert "trip-1" not in manager.subscribers
+
+
+class DroppingEvents(TripEvents):
+    """Its first subscription drops right after it was made."""
+
+    def __init__(self, cache):
+        super().__init__(cache)
+        self.drops = 1
+
+    @asynccontextmanager
+    async def subscribe(self, trip_id: str, until_final: bool = True):
+        if self.drops:
+            self.drops -= 1
+            yield self._dropped()
+        else:
+            async with super().subscribe(trip_id, until_final) as events:
+                yield events
+
+    @staticmethod
+    async def _dropped():
+        raise ConnectionError("Connection closed by server.")
+        yield
+
+
+def test_a_dropped_subscription_ends_its_watchers_and_is_made_again():
+    server = fakeredis.FakeServer()
+    manager = ConnectionManager(DroppingEvents(replica_events(server).cache))
+    publisher = replica_events(server)
+    first, second = FakeSocket(), FakeSocket()
+
+    async def scenario():
+        dropped = await manager.connect(first, "trip-1")
+        await asyncio.sleep(0.01)
+        assert dropped.finished.is_set() and "trip-1" not in manager._relays
+        watcher = await manager.connect(second, "trip-1")
+        await publisher.publish("trip-1", {"type": "progress", "progress": 30})
+        await asyncio.sleep(0.05)
+        manager.disconnect(watcher)
+
+    asyncio.run(scenario())
+
+    # told to reconnect, and resynced by the new subscription
+    assert first.closed == status.WS_1013_TRY_AGAIN_LATER
+    assert [e["progress"] for e in second.sent] == [30]
@@ -0,0 +1,142 @@
+"""Bytes stored and encode/decode time of the itinerary cache formats.
+
+Builds realistic itineraries (activities with photos, opening hours and
+accessibility options on every place) and compares the legacy
+``json.dumps`` entries with each TripCodec configuration.
+
+    python -m benchmarks.codec_bench --days 3 7 14
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.database.TripCodec import FORMAT_MSGPACK, SERIALIZERS, TripCodec
+from app.schemas.trips_schema import Trip
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def token(length: int) -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def place(index: int) -> dict:
+    return {
+        "id": f"ChIJ{token(23)}",
+        "name": f"Place {index}",
+        "location": {"latitude": 38.7 + random.random() / 10, "longitude": -9.1 - random.random() / 10},
+        "types": ["tourist_attraction", "museum", "point_of_interest", "establishment"],
+        "photos": [
+            {
+                "name": f"places/ChIJ{token(23)}/photos/{token(180)}",
+                "widthPx": 4032,
+                "heightPx": 3024,
+                "authorAttributions": [
+                    {
+                        "displayName": f"Author {token(6)}",
+                        "uri": f"https://maps.google.com/maps/contrib/{token(21)}",
+                        "photoUri": f"https://lh3.googleusercontent.com/a-/{token(60)}",
+                    }
+                ],
+            }
+            for _ in range(10)
+        ],
+        "accessibility_options": {
+            "wheelchairAccessibleParking": True,
+            "wheelchairAccessibleEntrance": True,
+            "wheelchairAccessibleRestroom": False,
+            "wheelchairAccessibleSeating": True,
+        },
+        "opening_hours": {
+            "openNow": True,
+            "periods": [
+                {"open": {"day": d, "hour": 9, "minute": 0}, "close": {"day": d, "hour": 18, "minute": 0}}
+                for d in range(7)
+            ],
+            "weekdayDescriptions": [f"{day}: 9:00 AM – 6:00 PM" for day in WEEKDAYS],
+        },
+        "price_level": "PRICE_LEVEL_MODERATE",
+        "rating": round(random.uniform(3, 5), 1),
+        "user_ratings_total": random.randint(10, 50000),
+        "international_phone_number": "+351 21 000 0000",
+        "good_for_children": True,
+        "good_for_groups": True,
+    }
+
+
+def activity(index: int, day: int, hour: int) -> dict:
+    return {
+        "id": index,
+        "place": place(index),
+        "start_time": f"2025-07-{10 + day:02d}T{hour:02d}:00:00",
+        "end_time": f"2025-07-{10 + day:02d}T{hour + 2:02d}:00:00",
+        "activity_type": "visit",
+        "duration": 120,
+    }
+
+
+def trip(days: int) -> dict:
+    return Trip(
+        start_date="2025-07-10T00:00:00",
+        end_date=f"2025-07-{10 + days:02d}T00:00:00",
+        name=f"{days}-day trip",
+        trip_type="place",
+        city="Lisbon",
+        country="Portugal",
+        is_group=False,
+        days=[
+            {
+                "date": f"2025-07-{10 + d:02d}",
+                "morning_activities": [activity(d * 10 + i, d, 9 + 2 * i) for i in range(3)],
+                "afternoon_activities": [activity(d * 10 + 5 + i, d, 14 + 2 * i) for i in range(3)],
+            }
+            for d in range(days)
+        ],
+    ).model_dump(mode="json")
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(day_counts, repeat: int):
+    codecs = {
+        "json (uncompressed)": TripCodec("json", compress_threshold=None),
+        "json + zlib": TripCodec("json", compress_threshold=4096),
+    }
+    if FORMAT_MSGPACK in SERIALIZERS:
+        codecs["msgpack (uncompressed)"] = TripCodec("msgpack", compress_threshold=None)
+        codecs["msgpack + zlib"] = TripCodec("msgpack", compress_threshold=4096)
+
+    for days in day_counts:
+        itinerary = trip(days)
+        print(f"\n{days}-day itinerary")
+        print(f"{'format':<24} {'bytes':>10} {'encode µs':>12} {'decode µs':>12}")
+
+        legacy = json.dumps(itinerary).encode()
+        print(
+            f"{'legacy json.dumps':<24} {len(legacy):>10} "
+            f"{timed(lambda: json.dumps(itinerary).encode(), repeat):>12.1f} "
+            f"{timed(lambda: json.loads(legacy), repeat):>12.1f}"
+        )
+        for name, codec in codecs.items():
+            encoded = codec.encode(itinerary)
+            print(
+                f"{name:<24} {len(encoded):>10} "
+                f"{timed(lambda: codec.encode(itinerary), repeat):>12.1f} "
+                f"{timed(lambda: TripCodec.decode(encoded), repeat):>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(7)
+    main(args.days, args.repeat)
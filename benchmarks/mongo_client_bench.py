@@ -0,0 +1,95 @@
+"""Compare the blocking DBClient with AsyncDBClient under concurrent load.
+
+Each run seeds one trip document, then fires ``--requests`` concurrent
+``get_trip_by_id`` calls from async handlers (the way the routers issue
+them) while a heartbeat task measures how late the event loop wakes it up.
+
+Usage (needs a reachable MongoDB, configured with the usual MONGO_* vars):
+
+    python -m benchmarks.mongo_client_bench --requests 500
+"""
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+
+from app.database.MongoClient import AsyncDBClient, DBClient
+from app.schemas.trips_schema import Trip
+
+HEARTBEAT_INTERVAL = 0.001
+
+
+def sample_trip() -> Trip:
+    return Trip(
+        start_date="2025-07-10T00:00:00",
+        end_date="2025-07-17T00:00:00",
+        name="Benchmark trip",
+        trip_type="place",
+        city="Lisbon",
+        country="Portugal",
+        is_group=False,
+    )
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    """Record how far past its deadline each 1 ms tick is scheduled."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(name: str, fetch, trip_id: str, requests: int):
+    stop = asyncio.Event()
+    lags: list = []
+    ticker = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(trip_id) for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    stall = sum(lags)
+    worst = max(lags, default=0.0)
+    print(
+        f"{name:<14} {requests / elapsed:>10.1f} req/s  "
+        f"elapsed {elapsed * 1000:>8.1f} ms  "
+        f"loop stall {stall * 1000:>8.1f} ms (worst tick {worst * 1000:.1f} ms)"
+    )
+
+
+async def main(requests: int):
+    sync_client = DBClient()
+    async_client = AsyncDBClient()
+
+    trip_id = str(ObjectId())
+    sync_client.post_trip([sample_trip()], [trip_id])
+
+    async def blocking_fetch(id: str):
+        # what the routers did before: a sync call inside an async handler
+        return sync_client.get_trip_by_id(id)
+
+    async def async_fetch(id: str):
+        return await async_client.get_trip_by_id(id)
+
+    try:
+        # warm up both pools so connection setup is not measured
+        await blocking_fetch(trip_id)
+        await async_fetch(trip_id)
+
+        await run("DBClient", blocking_fetch, trip_id, requests)
+        await run("AsyncDBClient", async_fetch, trip_id, requests)
+    finally:
+        sync_client.delete_trip(trip_id)
+        await async_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,43 @@
+"""Rendering cost of itinerary responses: stdlib JSONResponse vs ResponseBody.
+
+    python -m benchmarks.response_bench --days 7 14
+"""
+import argparse
+import random
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas.response import FastJSONResponse, ResponseBody
+from app.schemas.trips_schema import Trip, TripResponse
+from benchmarks.codec_bench import timed, trip
+
+
+def main(day_counts, repeat: int):
+    for days in day_counts:
+        itinerary = Trip(**trip(days))
+        content = {"itinerary": itinerary.model_dump(), "participants": []}
+        regenerated = TripResponse(itinerary=itinerary, tripId="6650f1c2a3b4c5d6e7f80912")
+
+        envelope = {"status_code": 200, "message": "", "response": content}
+        stdlib = timed(lambda: JSONResponse(envelope), repeat)
+        fast = timed(lambda: ResponseBody(content), repeat)
+        # what FastAPI does with a returned dict: jsonable_encoder, then JSONResponse
+        encoded_dict = timed(lambda: JSONResponse(jsonable_encoder(regenerated.model_dump())), repeat)
+        fast_dict = timed(lambda: FastJSONResponse(regenerated.model_dump()), repeat)
+
+        size = len(ResponseBody(content).body)
+        print(f"\n{days}-day itinerary ({size} bytes)")
+        print(f"{'ResponseBody via stdlib json':<40} {stdlib:>10.1f} µs")
+        print(f"{'ResponseBody via orjson':<40} {fast:>10.1f} µs")
+        print(f"{'regenerate-activity via jsonable_encoder':<40} {encoded_dict:>10.1f} µs")
+        print(f"{'regenerate-activity via orjson':<40} {fast_dict:>10.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 14])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    random.seed(7)
+    main(args.days, args.repeat)
@@ -0,0 +1,119 @@
+"""Peak memory of reading the whole trips collection: list vs pages vs stream.
+
+Seeds ``--trips`` generated itineraries into a scratch collection, then
+reads all of them back three ways while tracemalloc records the peak:
+
+* ``get_all_trips``   builds one list of every document (the old behaviour)
+* ``get_trips_page``  keyset pages of ``--page-size`` documents on _id
+* ``iter_trips``      the cursor behind /api/trips/all/stream, each document
+                      encoded to an NDJSON line and dropped
+
+Usage (needs a reachable MongoDB, configured with the usual MONGO_* vars):
+
+    python -m benchmarks.trip_stream_bench --trips 100000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import orjson
+
+from app.database.MongoClient import AsyncDBClient
+
+INSERT_BATCH = 1000
+
+
+def document(index: int) -> dict:
+    day = index % 28 + 1
+    return {
+        "name": f"Generated trip {index}",
+        "start_date": f"2025-07-{day:02d}T00:00:00",
+        "end_date": f"2025-08-{day:02d}T00:00:00",
+        "trip_type": "place",
+        "city": "Lisbon",
+        "country": "Portugal",
+        "is_group": index % 2 == 0,
+        "days": [
+            {
+                "date": f"2025-07-{day:02d}",
+                "morning_activities": [
+                    {
+                        "id": a,
+                        "place": {
+                            "name": f"Place {index}-{a}",
+                            "location": {"latitude": 38.7, "longitude": -9.1},
+                            "types": ["tourist_attraction", "point_of_interest"],
+                        },
+                        "start_time": f"2025-07-{day:02d}T{9 + a:02d}:00:00",
+                        "end_time": f"2025-07-{day:02d}T{10 + a:02d}:00:00",
+                        "activity_type": "visit",
+                        "duration": 60,
+                    }
+                    for a in range(3)
+                ],
+            }
+        ],
+    }
+
+
+async def seed(collection, trips: int):
+    await collection.drop()
+    for start in range(0, trips, INSERT_BATCH):
+        await collection.insert_many(
+            [document(i) for i in range(start, min(start + INSERT_BATCH, trips))]
+        )
+
+
+async def read_list(db: AsyncDBClient, page_size: int) -> int:
+    return len(await db.get_all_trips())
+
+
+async def read_pages(db: AsyncDBClient, page_size: int) -> int:
+    count, after = 0, None
+    while True:
+        trips, after = await db.get_trips_page(after, page_size)
+        count += len(trips)
+        if after is None:
+            return count
+
+
+async def read_stream(db: AsyncDBClient, page_size: int) -> int:
+    count = 0
+    async for trip in db.iter_trips(batch_size=page_size):
+        orjson.dumps(trip) + b"\n"
+        count += 1
+    return count
+
+
+async def measure(name: str, read, db: AsyncDBClient, page_size: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = await read(db, page_size)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<16} {count:>8} trips  {elapsed:>7.2f} s  peak {peak / 2 ** 20:>8.1f} MiB")
+
+
+async def main(trips: int, page_size: int, collection: str):
+    db = AsyncDBClient()
+    db.collection = db.db[collection]
+    try:
+        print(f"seeding {trips} trips into {collection}...")
+        await seed(db.collection, trips)
+        await measure("get_all_trips", read_list, db, page_size)
+        await measure("get_trips_page", read_pages, db, page_size)
+        await measure("iter_trips", read_stream, db, page_size)
+    finally:
+        await db.collection.drop()
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--collection", default="trips_stream_bench")
+    args = parser.parse_args()
+    asyncio.run(main(args.trips, args.page_size, args.collection))
@@ -0,0 +1,89 @@
+"""Broadcast latency of trip events to hundreds of websockets per trip.
+
+Connects ``--sockets`` stand-in websockets to one trip through the
+ConnectionManager, a ``--slow`` fraction of them taking ``--slow-delay``
+seconds per send, then publishes ``--events`` progress events on the
+trip's Redis channel, one every ``--interval`` seconds. Reports the
+latency from publish to send for the fast and the slow sockets, and how
+many events the slow ones had coalesced or were dropped for.
+
+Usage (needs a reachable Redis, configured with the usual REDIS_TRIP_* vars):
+
+    python -m benchmarks.ws_fanout_bench --sockets 500 --slow 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import orjson
+from fastapi.websockets import WebSocketState
+
+from app.database.CacheClient import close_redis_pool
+from app.routes.websocket_router import ConnectionManager
+from app.services.trip_events import TripEvents
+
+TRIP_ID = "ws-fanout-bench"
+
+
+class BenchSocket:
+    def __init__(self, delay: float):
+        self.client_state = WebSocketState.CONNECTED
+        self.delay = delay
+        self.latencies = []
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - orjson.loads(text)["sent_at"])
+
+    async def close(self, code: int):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+def report(name: str, sockets):
+    latencies = sorted(l for s in sockets for l in s.latencies)
+    if not latencies:
+        print(f"{name:<6} no events delivered")
+        return
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{name:<6} {len(sockets):>5} sockets {len(latencies):>8} sends  "
+        f"p50 {statistics.median(latencies) * 1000:>7.2f} ms  p99 {p99 * 1000:>7.2f} ms"
+    )
+
+
+async def main(sockets: int, slow: float, slow_delay: float, events: int, interval: float, max_queue: int):
+    trip_events = TripEvents()
+    manager = ConnectionManager(trip_events, max_queue=max_queue)
+    slow_count = int(sockets * slow)
+    fast_sockets = [BenchSocket(0) for _ in range(sockets - slow_count)]
+    slow_sockets = [BenchSocket(slow_delay) for _ in range(slow_count)]
+    subscribers = [await manager.connect(s, TRIP_ID) for s in fast_sockets + slow_sockets]
+    try:
+        for progress in range(events):
+            await trip_events.publish(
+                TRIP_ID, {"type": "progress", "progress": progress, "sent_at": time.perf_counter()}
+            )
+            await asyncio.sleep(interval)
+        await asyncio.sleep(max(1.0, slow_delay * 2))
+        report("fast", fast_sockets)
+        report("slow", slow_sockets)
+        coalesced = sum(s.coalesced for s in subscribers)
+        print(f"coalesced {coalesced} events, dropped {manager.dropped} sockets")
+    finally:
+        for subscriber in subscribers:
+            manager.disconnect(subscriber)
+        await close_redis_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=500)
+    parser.add_argument("--slow", type=float, default=0.05, help="fraction of slow sockets")
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--max-queue", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.sockets, args.slow, args.slow_delay, args.events, args.interval, args.max_queue))